@@ -1,22 +1,46 @@
 from typing import Dict, Any, List, Optional
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-import json
+from langchain_core.messages import HumanMessage, SystemMessage
 
 # Import from config
 import os
 import sys
-from config import MODEL_NAME_REASONING
+from config import (
+    CRITIC_APPROVAL_SCORE,
+    CRITIC_BORDERLINE_MARGIN,
+    CRITIC_FAST_MODEL,
+    CRITIC_MAX_SCORE_SWING,
+    CRITIC_ROUTING,
+    MODEL_NAME_REASONING,
+)
+from agents.evaluation_budget import average_score
+from utils.llm_factory import get_chat_model
+from utils.llm_usage import tracks_llm_usage
+from utils.metrics import CRITIC_ROUTES
+from utils.prompt_layout import outline_text, story_brief_message
+from utils.structured_output import Evaluation, StructuredOutputError, invoke_structured, json_mode
 
 class CriticAgent:
     """
     Agent responsible for evaluating story drafts and providing feedback for improvements.
     """
     
-    def __init__(self, model_name: str = None):
-        """Initialize the critic agent."""
+    def __init__(self, model_name: str = None, fast_model_name: str = None):
+        """
+        Initialize the critic agent.
+        
+        Args:
+            model_name: Reasoning model, used for every evaluation or only for escalations (see CRITIC_ROUTING)
+            fast_model_name: Model scoring the drafts first when routing is tiered
+        """
         self.model_name = model_name or MODEL_NAME_REASONING
-        self.llm = ChatOpenAI(model=self.model_name, temperature=0.2)
+        self.llm = get_chat_model("openai", self.model_name, temperature=0.2)
+        self.json_llm = json_mode(self.llm, self.model_name)
+        
+        self.fast_model_name = fast_model_name or CRITIC_FAST_MODEL
+        self.routing = CRITIC_ROUTING if self.fast_model_name != self.model_name else "reasoning"
+        if self.routing != "reasoning":
+            self.fast_llm = get_chat_model("openai", self.fast_model_name, temperature=0.2)
+            self.fast_json_llm = json_mode(self.fast_llm, self.fast_model_name)
         
         # Initialize system prompts
         self.system_prompt = """You are a critical editor and historical authenticity expert.
@@ -30,48 +54,214 @@ Provide constructive criticism and specific suggestions for improvement.
 Be thorough but fair in your assessment.
 """
 
+    def _request_evaluation(self, prompt: List, state: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Ask the critic for an evaluation, routing it between the fast and the reasoning model.
+        
+        With tiered routing the fast model scores the draft first, and its
+        evaluation stands unless _escalation_reason finds it doubtful; only
+        then is the same prompt sent to the reasoning model. The model that
+        produced the evaluation and the routing decision are recorded in its
+        "critic_route".
+        
+        Args:
+            prompt: The evaluation prompt messages
+            state: Current state, for the iteration count and the previous scores
+            
+        Returns:
+            Evaluation dictionary
+        """
+        iterations = state.get("iterations", 0)
+        if self.routing == "reasoning":
+            evaluation = self._evaluate_with(self.json_llm, prompt, iterations)
+            evaluation["critic_route"] = {"model": self.model_name, "decision": "reasoning"}
+            return evaluation
+        
+        evaluation = self._evaluate_with(self.fast_json_llm, prompt, iterations)
+        score = average_score(evaluation)
+        reason = self._escalation_reason(evaluation, score, state) if self.routing == "tiered" else None
+        score_text = "n/a" if score is None else f"{score:.1f}"
+        CRITIC_ROUTES.inc(reason or "fast")
+        if reason is None:
+            print(f"🧭 Critic routing: {self.fast_model_name} scored {score_text}, keeping its verdict")
+            evaluation["critic_route"] = {"model": self.fast_model_name, "decision": "fast", "fast_score": score}
+            return evaluation
+        
+        print(f"🧭 Critic routing: {self.fast_model_name} scored {score_text} ({reason}), "
+              f"escalating to {self.model_name}")
+        evaluation = self._evaluate_with(self.json_llm, prompt, iterations)
+        evaluation["critic_route"] = {"model": self.model_name, "decision": reason, "fast_score": score}
+        return evaluation
+
+    @staticmethod
+    def _escalation_reason(evaluation: Dict[str, Any], score: Optional[float],
+                           state: Dict[str, Any]) -> Optional[str]:
+        """
+        Decide whether a fast-model evaluation needs a second opinion from the reasoning model.
+        
+        Args:
+            evaluation: The fast model's evaluation
+            score: Its mean score
+            state: Current state, whose score_history holds the previous iterations' mean scores
+            
+        Returns:
+            The reason to escalate ("unparseable", "borderline", "inconsistent" or "swing"),
+            or None to keep the fast verdict
+        """
+        if evaluation.get("parse_failed") or score is None:
+            return "unparseable"
+        if abs(score - CRITIC_APPROVAL_SCORE) <= CRITIC_BORDERLINE_MARGIN:
+            return "borderline"
+        # Clearly below the threshold but approved, or clearly above it but rejected.
+        # Reviews of revised chapters give their verdict per chapter only.
+        verdicts = evaluation.get("chapters") or []
+        approved = evaluation.get("approved", False) or \
+            bool(verdicts) and all(verdict.get("approved", True) for verdict in verdicts)
+        if approved != (score > CRITIC_APPROVAL_SCORE):
+            return "inconsistent"
+        previous_scores = [s for s in state.get("score_history") or [] if s is not None]
+        if previous_scores and abs(score - previous_scores[-1]) >= CRITIC_MAX_SCORE_SWING:
+            return "swing"
+        return None
+
+    def _evaluate_with(self, llm, prompt: List, iterations: int) -> Dict[str, Any]:
+        """
+        Ask one model for an evaluation, validated against the Evaluation schema.
+        
+        Malformed JSON is repaired, and an unparseable response is re-asked once
+        (see utils.structured_output); only then does it fall back to a neutral evaluation.
+        
+        Args:
+            llm: The critic model, bound with json_mode()
+            prompt: The evaluation prompt messages
+            iterations: Number of drafts written so far
+            
+        Returns:
+            Evaluation dictionary
+        """
+        try:
+            return invoke_structured(llm, prompt, Evaluation, "historical_evaluation").model_dump()
+        except StructuredOutputError:
+            # Create a simple fallback evaluation
+            return {
+                "scores": {
+                    "historical_accuracy": 7,
+                    "narrative_quality": 7,
+                    "style_and_tone": 7,
+                    "character_and_dialogue": 7,
+                    "overall_impact": 7
+                },
+                "strengths": ["Good effort overall"],
+                "weaknesses": ["Needs some refinement"],
+                "feedback": "Consider revising for better historical accuracy and narrative flow.",
+                "approved": iterations >= 2,  # Auto-approve after 2 iterations to prevent endless loops
+                "parse_failed": True
+            }
+
+    def _review_revised_chapters(self, state: Dict[str, Any], revised: List[int]) -> Dict[str, Any]:
+        """
+        Re-check only the chapters regenerated since the last evaluation.
+        
+        Verdicts for the untouched chapters are carried over from the previous
+        evaluation, and the story is approved once every chapter is.
+        
+        Args:
+            state: Current state with the revised chapters and the previous evaluation
+            revised: Indices of the chapters regenerated in the last revision
+            
+        Returns:
+            Merged evaluation
+        """
+        previous_evaluation = state.get("evaluation") or {}
+        chapters = state.get("chapters") or []
+        chapter_texts = state.get("chapter_texts") or []
+        iterations = state.get("iterations", 0)
+        
+        previous_feedback = {
+            verdict["chapter"]: verdict.get("feedback", "")
+            for verdict in previous_evaluation.get("chapter_verdicts") or []
+        }
+        revised_text = "\n\n".join(
+            f"CHAPTER {i + 1}: {chapters[i]['title']}\n"
+            f"FEEDBACK IT HAD TO ADDRESS: {previous_feedback.get(i + 1, '') or previous_evaluation.get('feedback', '')}\n"
+            f"REVISED TEXT:\n{chapter_texts[i]}"
+            for i in revised
+        )
+        
+        # Stable prefix first (brief, instructions, outline); the revised chapters change every iteration
+        review_prompt = [
+            story_brief_message(state),
+            SystemMessage(content=self.system_prompt),
+            HumanMessage(content=f"""STORY OUTLINE:
+{outline_text(chapters)}
+
+The other chapters of this historical story were already approved. Re-evaluate only the revised
+chapters below, checking that they address the feedback and fit the outline and the research.
+
+Provide your evaluation in JSON format with these fields:
+- scores: Object with numerical scores (1-10) for the story as a whole with these revisions
+- strengths: Array of the revisions' strongest points
+- weaknesses: Array of areas still needing improvement
+- feedback: Specific, actionable feedback for any revised chapter that still needs work
+- chapters: Array with one object per revised chapter: "chapter" (its number), "approved" (boolean) and "feedback"
+
+TITLE: {state.get("title", "Untitled")}
+ITERATION: {iterations}
+
+{revised_text}
+""")
+        ]
+        
+        evaluation = self._request_evaluation(review_prompt, state)
+        
+        # Carry over the verdicts of the untouched chapters
+        verdicts = {verdict["chapter"]: verdict for verdict in previous_evaluation.get("chapter_verdicts") or []}
+        for verdict in evaluation.pop("chapters", None) or []:
+            if isinstance(verdict, dict) and verdict.get("chapter") in verdicts:
+                verdicts[verdict["chapter"]] = verdict
+        evaluation["chapter_verdicts"] = [verdicts[number] for number in sorted(verdicts)]
+        evaluation["approved"] = evaluation.get("approved", False) or \
+            all(verdict.get("approved", True) for verdict in evaluation["chapter_verdicts"])
+        evaluation["reviewed_chapters"] = [i + 1 for i in revised]
+        
+        return evaluation
+
+    @tracks_llm_usage
     def evaluate_story(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """
         Evaluate a story draft and provide feedback.
         
+        The evaluation includes a verdict for each chapter so the builder can
+        regenerate only the flagged ones. After such a revision only the
+        revised chapters are re-checked.
+        
         Args:
             state: Current state with story draft and research
             
         Returns:
             Updated state with evaluation results
         """
+        # Re-check only what changed when the builder revised individual chapters
+        revised = state.get("revised_chapters") or []
+        if revised and state.get("chapter_texts") and (state.get("evaluation") or {}).get("chapter_verdicts"):
+            state["evaluation"] = self._review_revised_chapters(state, revised)
+            return state
+        
         # Extract necessary information from state
         title = state.get("title", "Untitled")
         story = state.get("story", "")
-        user_prompt = state.get("prompt", "")
-        story_type = state.get("story_type", "Historical")
-        style = state.get("style", "Classic storytelling")
-        research_results = state.get("research_results", [])
         iterations = state.get("iterations", 0)
+        chapters = state.get("chapters") or []
         
-        # Format research for the prompt
-        research_text = "\n\n".join([
-            f"RESEARCH ON {item['topic'].upper()}:\n{item['result']}" 
-            for item in research_results
-        ])
-        
-        evaluation_prompt = ChatPromptTemplate.from_messages([
-            ("system", self.system_prompt),
-            ("user", f"""Evaluate this historical story draft based on the following criteria:
-
-TITLE: {title}
-
-STORY DRAFT:
-{story}
-
-USER REQUEST: {user_prompt}
-STYLE REQUESTED: {style}
-ITERATION: {iterations}
+        # Built from messages rather than a template so braces in the story are kept verbatim.
+        # The brief, criteria and outline form a prefix shared across iterations; the draft goes last.
+        evaluation_prompt = [
+            story_brief_message(state),
+            SystemMessage(content=self.system_prompt),
+            HumanMessage(content=f"""STORY OUTLINE:
+{outline_text(chapters)}
 
-HISTORICAL RESEARCH USED:
-{research_text}
-
-Evaluate the story on:
+Evaluate the historical story draft below against the story brief on:
 1. Historical accuracy (Does it align with the research? Are there anachronisms?)
 2. Narrative quality (Is it engaging? Does it have a clear structure?)
 3. Style and tone (Does it match the requested style?)
@@ -84,35 +274,24 @@ Provide your evaluation in JSON format with these fields:
 - weaknesses: Array of areas needing improvement
 - feedback: Specific, actionable feedback for improvement
 - approved: Boolean indicating if the story is ready (true) or needs revisions (false)
+- chapters: Array with one object for each chapter of the outline: "chapter" (its number),
+  "approved" (boolean) and "feedback" (what to change in that chapter, empty if approved)
+
+ITERATION: {iterations}
+TITLE: {title}
+
+STORY DRAFT:
+{story}
 """)
-        ])
+        ]
         
-        response = self.llm.invoke(evaluation_prompt)
-        
-        # Parse the response - expecting JSON format
-        try:
-            evaluation = json.loads(response.content)
-        except json.JSONDecodeError:
-            # If the response isn't valid JSON, try to extract it from the text
-            import re
-            json_match = re.search(r'```json\n(.*?)\n```', response.content, re.DOTALL)
-            if json_match:
-                evaluation = json.loads(json_match.group(1))
-            else:
-                # Create a simple fallback evaluation
-                evaluation = {
-                    "scores": {
-                        "historical_accuracy": 7,
-                        "narrative_quality": 7,
-                        "style_and_tone": 7,
-                        "character_and_dialogue": 7,
-                        "overall_impact": 7
-                    },
-                    "strengths": ["Good effort overall"],
-                    "weaknesses": ["Needs some refinement"],
-                    "feedback": "Consider revising for better historical accuracy and narrative flow.",
-                    "approved": iterations >= 2  # Auto-approve after 2 iterations to prevent endless loops
-                }
+        # Validated against the Evaluation schema
+        evaluation = self._request_evaluation(evaluation_prompt, state)
+        evaluation["chapter_verdicts"] = [
+            verdict for verdict in evaluation.pop("chapters", None) or []
+            if isinstance(verdict, dict) and isinstance(verdict.get("chapter"), int)
+        ]
+        evaluation["reviewed_chapters"] = list(range(1, len(chapters) + 1))
         
         # Update the state
         state["evaluation"] = evaluation
@@ -0,0 +1,117 @@
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Import from config
+from config import EVALUATION_DEADLINE_SECONDS, EVALUATION_MAX_ITERATIONS, EVALUATION_MIN_SCORE_IMPROVEMENT
+
+
+def average_score(evaluation: Dict[str, Any]) -> Optional[float]:
+    """
+    Average the numerical criterion scores of an evaluation.
+
+    Args:
+        evaluation: The critic's evaluation
+
+    Returns:
+        Mean score, or None when the evaluation has no numerical scores
+    """
+    scores = [
+        value for value in (evaluation.get("scores") or {}).values()
+        if isinstance(value, (int, float)) and not isinstance(value, bool)
+    ]
+    return sum(scores) / len(scores) if scores else None
+
+
+def get_evaluation_budget(state: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Return the evaluation loop budget for a request, filling in the config defaults.
+
+    Args:
+        state: Current state, optionally with an "evaluation_budget" override
+
+    Returns:
+        Dictionary with max_iterations, deadline_seconds and min_score_improvement
+    """
+    return {
+        "max_iterations": EVALUATION_MAX_ITERATIONS,
+        "deadline_seconds": EVALUATION_DEADLINE_SECONDS,
+        "min_score_improvement": EVALUATION_MIN_SCORE_IMPROVEMENT,
+        **(state.get("evaluation_budget") or {})
+    }
+
+
+def apply_evaluation_budget(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Decide whether the critic loop stops after this evaluation.
+
+    Tracks the best-scoring draft so far. The loop stops when the draft is
+    approved, or when the request runs out of iterations, passes its deadline
+    or stops improving by at least the minimum score. When it stops without
+    approval, the best draft is restored so style adaptation works on it.
+
+    Args:
+        state: Current state right after the critic's evaluation
+
+    Returns:
+        Updated state with best_draft, score_history and, when stopping, stop_reason
+    """
+    budget = get_evaluation_budget(state)
+    evaluation = state.get("evaluation") or {}
+    iterations = state.get("iterations", 0)
+    score = average_score(evaluation)
+
+    started_at = state.get("started_at") or time.time()
+    state["started_at"] = started_at
+
+    previous_scores = [s for s in state.get("score_history") or [] if s is not None]
+    state["score_history"] = (state.get("score_history") or []) + [score]
+
+    best_draft = state.get("best_draft")
+    if best_draft is None or (score is not None and score > (best_draft.get("score") or float("-inf"))):
+        best_draft = {
+            "iteration": iterations,
+            "score": score,
+            "title": state.get("title"),
+            "story": state.get("story"),
+            "chapters": state.get("chapters"),
+            "chapter_texts": list(state.get("chapter_texts") or [])
+        }
+        state["best_draft"] = best_draft
+
+    stop_reason = None
+    if evaluation.get("approved", False):
+        stop_reason = "approved"
+    elif iterations >= budget["max_iterations"]:
+        stop_reason = "max_iterations"
+    elif time.time() - started_at >= budget["deadline_seconds"]:
+        stop_reason = "deadline"
+    elif score is not None and previous_scores and score - previous_scores[-1] < budget["min_score_improvement"]:
+        stop_reason = "no_improvement"
+
+    if stop_reason and stop_reason != "approved" and best_draft.get("iteration") != iterations:
+        # Hand the best draft so far to style adaptation instead of the latest one
+        print(f"↩️ Using draft from iteration {best_draft['iteration']} (score {best_draft['score']})")
+        for key in ("title", "story", "chapters", "chapter_texts"):
+            state[key] = best_draft[key]
+
+    if stop_reason:
+        print(f"🛑 Evaluation loop stopped after {iterations} iteration(s): {stop_reason}")
+    state["stop_reason"] = stop_reason
+
+    return state
+
+
+def evaluation_node(critic) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Build the evaluation node of a workflow around a critic.
+
+    Args:
+        critic: The CriticAgent evaluating the drafts
+
+    Returns:
+        Node running the critic, then deciding whether the loop stops (see apply_evaluation_budget)
+    """
+    def evaluate_within_budget(state: Dict[str, Any]) -> Dict[str, Any]:
+        return apply_evaluation_budget(critic.evaluate_story(state))
+
+    return evaluate_within_budget
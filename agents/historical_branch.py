@@ -1,11 +1,14 @@
+import time
 from typing import Dict, Any, TypedDict, Optional
 from langgraph.graph import StateGraph, END
 
 # Import our agents and tools
 from agents.historical_orchestrator import HistoricalOrchestrator
-from agents.story_builder import StoryBuilder
-from agents.critic_agent import CriticAgent
-from agents.style_adapter import StyleAdapter
+from agents.evaluation_budget import evaluation_node
+from agents.storyteller import get_agents
+from utils.chapter_index import index_story_chapters
+from utils.metrics import get_metrics_callbacks
+from utils.research_context import build_research_context
 from utils.research_tool import generate_research_questions, perplexity_search
 from utils.question_generator import generate_research_questions_dynamic
 
@@ -19,10 +22,8 @@ def create_historical_branch(StoryState):
     Returns:
         Compiled StateGraph for the historical branch
     """
-    # Create agent instances
-    story_builder = StoryBuilder()
-    critic = CriticAgent()
-    style_adapter = StyleAdapter()
+    # Share the agents (and their LLM clients) with the main workflow
+    story_builder, critic, style_adapter = get_agents()
     
     # Create the state graph
     workflow = StateGraph(StoryState)
@@ -30,34 +31,39 @@ def create_historical_branch(StoryState):
     # Add nodes for the research phase
     workflow.add_node("generate_questions", generate_research_questions)
     workflow.add_node("research", perplexity_search)
+    workflow.add_node("research_context", build_research_context)
     
     # Add nodes for story creation and refinement
     workflow.add_node("story_building", story_builder.create_story_draft)
-    workflow.add_node("evaluation", critic.evaluate_story)
+    workflow.add_node("evaluation", evaluation_node(critic))
     workflow.add_node("style_adaptation", style_adapter.adapt_style)
+    workflow.add_node("chapter_index", index_story_chapters)
     
     # Add edges for the workflow
     workflow.add_edge("generate_questions", "research")
-    workflow.add_edge("research", "story_building")
+    workflow.add_edge("research", "research_context")
+    workflow.add_edge("research_context", "story_building")
     workflow.add_edge("story_building", "evaluation")
     
-    # Add conditional edge from evaluation - either continue to style or go back for revisions
+    # Add conditional edge from evaluation - continue to style once approved or out of budget, else revise
     workflow.add_conditional_edges(
         "evaluation",
-        lambda state: "style_adaptation" if state.get("evaluation", {}).get("approved", False) else "story_building",
+        lambda state: "style_adaptation" if state.get("stop_reason") else "story_building",
         {
             "style_adaptation": "style_adaptation",
             "story_building": "story_building"
         }
     )
     
-    # Final edge to end
-    workflow.add_edge("style_adaptation", END)
+    # Index and time the chapters of the styled story, then end
+    workflow.add_edge("style_adaptation", "chapter_index")
+    workflow.add_edge("chapter_index", END)
     
     # Set entry point
     workflow.set_entry_point("generate_questions")
     
-    return workflow.compile()
+    # Record per-node latency, tokens, retries and errors on every run
+    return workflow.compile().with_config(callbacks=get_metrics_callbacks())
 
 def process_historical_story(state: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -71,12 +77,12 @@ def process_historical_story(state: Dict[str, Any]) -> Dict[str, Any]:
     """
     # Create and run the historical branch workflow
     try:
-        # Get the state type from the config or define it here
-        from config import StoryState
+        # Reuse the compiled branch shared by all requests
+        from agents.workflow_registry import get_workflow
         
-        # Build and run the workflow
-        workflow = create_historical_branch(StoryState)
-        final_state = workflow.invoke(state)
+        workflow = get_workflow("historical")
+        # The evaluation budget's deadline counts from here
+        final_state = workflow.invoke({**state, "started_at": state.get("started_at") or time.time()})
         
         # Transfer the final story and title to the main state keys
         state["title"] = final_state.get("final_title", final_state.get("title", "Historical Tale"))
@@ -1,13 +1,13 @@
 from typing import Dict, Any, List, Tuple, Optional, Literal
 from langchain_core.messages import HumanMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 from langgraph.graph import StateGraph, END
 
 # Import from config and utils
 import os
 import sys
 from config import MODEL_NAME, MODEL_NAME_REASONING
+from utils.llm_factory import get_chat_model
 from utils.research_tool import generate_research_questions, perplexity_search
 from utils.question_generator import generate_research_questions_dynamic
 
@@ -19,8 +19,8 @@ class HistoricalOrchestrator:
     
     def __init__(self):
         """Initialize the orchestrator with necessary components."""
-        self.llm = ChatOpenAI(model=MODEL_NAME, temperature=0.7)
-        self.reasoning_llm = ChatOpenAI(model=MODEL_NAME_REASONING, temperature=0.2)
+        self.llm = get_chat_model("openai", MODEL_NAME, temperature=0.7)
+        self.reasoning_llm = get_chat_model("openai", MODEL_NAME_REASONING, temperature=0.2)
     
     def orchestrate_historical_story(self):
         """
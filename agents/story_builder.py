@@ -1,12 +1,19 @@
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-import json
+from langchain_core.messages import HumanMessage, SystemMessage
 
 # Import from config
 import os
 import sys
-from config import MODEL_NAME
+from config import CHAPTER_DRAFT_MAX_CONCURRENCY, MODEL_NAME, PARALLEL_DRAFT_LENGTHS, STORY_DRAFT_MODE
+from utils.llm_factory import get_chat_model
+from utils.llm_usage import record_llm_usage, tracks_llm_usage
+from utils.prompt_layout import outline_text, story_brief_message
+from utils.structured_output import ChapterOutline, StructuredOutputError, invoke_structured, json_mode
+from utils.chapter_index import chapter_body, find_chapter_spans
+from utils.story_text import chapter_heading, join_chapters
+from utils.streaming import get_token_writer, stream_llm_response
 
 class StoryBuilder:
     """
@@ -16,7 +23,8 @@ class StoryBuilder:
     def __init__(self, model_name: str = None):
         """Initialize the story builder."""
         self.model_name = model_name or MODEL_NAME
-        self.llm = ChatOpenAI(model=self.model_name, temperature=0.7)
+        self.llm = get_chat_model("openai", self.model_name, temperature=0.7)
+        self.json_llm = json_mode(self.llm, self.model_name)
         
         # Initialize system prompts
         self.system_prompt = """You are a masterful storyteller who specializes in creating 
@@ -28,15 +36,12 @@ historically accurate and engaging stories. Your task is to craft a story that i
 Use the research provided to ensure historical accuracy while weaving an interesting narrative.
 """
 
-    def _create_chapter_outline(self, research_results: List[Dict], 
-                               prompt: str, 
-                               story_length: str) -> List[Dict]:
+    def _create_chapter_outline(self, brief: SystemMessage, story_length: str) -> List[Dict]:
         """
         Create an outline with chapters for the story.
         
         Args:
-            research_results: List of research results
-            prompt: User's story prompt
+            brief: The story brief message that opens every story prompt
             story_length: Requested story length (Short, Medium, Long)
             
         Returns:
@@ -49,57 +54,284 @@ Use the research provided to ensure historical accuracy while weaving an interes
             "Long": 7
         }.get(story_length, 5)
         
-        # Format research for the prompt
-        research_text = "\n\n".join([
-            f"RESEARCH ON {item['topic'].upper()}:\n{item['result']}" 
-            for item in research_results
-        ])
-        
-        outline_prompt = ChatPromptTemplate.from_messages([
-            ("system", self.system_prompt),
-            ("user", f"""Based on this user request and historical research, create a chapter outline for a story:
-
-USER REQUEST: {prompt}
-STORY LENGTH: {story_length} (approximately {chapters_count} chapters)
-
-HISTORICAL RESEARCH:
-{research_text}
+        outline_prompt = [
+            brief,
+            SystemMessage(content=self.system_prompt),
+            HumanMessage(content=f"""Based on the user request and historical research in the story brief, create a chapter outline
+of approximately {chapters_count} chapters.
 
 Create a compelling chapter outline that follows good narrative structure (setup, conflict, resolution) 
 while ensuring historical accuracy. For each chapter, provide:
 1. A title
 2. A brief description of what happens in that chapter
+3. The main characters who appear in it, each as "Name - one-line description"
 
-Format your response as a JSON array of chapter objects, each with "title" and "description" fields.
+Format your response as a JSON object with a "chapters" array of chapter objects, each with "title",
+"description" and "characters" fields.
 """)
-        ])
-        
-        response = self.llm.invoke(outline_prompt)
+        ]
         
-        # Parse the response - expecting JSON format
+        # Validated against the ChapterOutline schema; malformed JSON is repaired or re-asked.
+        # YouTube chapter times are set from the finished text (see utils.chapter_index).
         try:
-            chapters = json.loads(response.content)
-            # Add time markers for YouTube chapters
-            for i, chapter in enumerate(chapters):
-                # Simple time calculation - assume each chapter is ~2 minutes for Short, ~3 for Medium, ~4 for Long
-                minutes_per_chapter = {"Short": 2, "Medium": 3, "Long": 4}.get(story_length, 3)
-                minutes = i * minutes_per_chapter
-                chapter["time"] = f"{minutes:02d}:00"
-            return chapters
-        except json.JSONDecodeError:
-            # If the response isn't valid JSON, try to extract it from the text
-            import re
-            json_match = re.search(r'```json\n(.*?)\n```', response.content, re.DOTALL)
-            if json_match:
-                chapters = json.loads(json_match.group(1))
-            else:
-                # Create a simple fallback outline
-                chapters = [
-                    {"title": f"Chapter {i+1}", "description": "Story events", "time": f"{i*3:02d}:00"} 
-                    for i in range(chapters_count)
-                ]
-            return chapters
+            outline = invoke_structured(self.json_llm, outline_prompt, ChapterOutline, "historical_story_building",
+                                        list_field="chapters")
+            if outline.chapters:
+                return [chapter.model_dump() for chapter in outline.chapters]
+        except StructuredOutputError:
+            pass
+        # Create a simple fallback outline
+        return [
+            {"title": f"Chapter {i+1}", "description": "Story events"}
+            for i in range(chapters_count)
+        ]
+
+    def _draft_chapter(self, index: int, chapters: List[Dict], brief: SystemMessage, chapter_words: str,
+                       feedback: str, previous_text: str = "") -> str:
+        """
+        Draft a single chapter from the outline with a compact shared context.
+        
+        When previous_text is given the chapter is revised to address the
+        feedback instead of being written from scratch.
+        
+        Args:
+            index: Position of the chapter in the outline
+            chapters: The full chapter outline
+            brief: The story brief message that opens every story prompt
+            chapter_words: Target word count range for this chapter
+            feedback: Critic feedback from the previous iteration, if any
+            previous_text: The current draft of this chapter, when revising it
+            
+        Returns:
+            The chapter prose, without a heading
+        """
+        chapter = chapters[index]
+        previous_chapter = chapters[index - 1] if index > 0 else None
+        next_chapter = chapters[index + 1] if index + 1 < len(chapters) else None
+        
+        # Everything up to the outline is shared by all chapters; the chapter specifics come last
+        chapter_prompt = [
+            brief,
+            SystemMessage(content=self.system_prompt),
+            HumanMessage(content=f"""STORY OUTLINE:
+{outline_text(chapters)}
+
+You are writing one chapter of this story. Write only the prose of the chapter, with no title or
+chapter heading. Pick up naturally from the previous chapter and end in a way that leads into the next one.
+
+CHAPTER TO WRITE: {index + 1} of {len(chapters)}
+TARGET WORD COUNT FOR THIS CHAPTER: {chapter_words} words
+PREVIOUS CHAPTER: {f"{previous_chapter['title']} - {previous_chapter['description']}" if previous_chapter else "None, this is the opening chapter"}
+THIS CHAPTER: {chapter['title']} - {chapter['description']}
+NEXT CHAPTER: {f"{next_chapter['title']} - {next_chapter['description']}" if next_chapter else "None, this is the final chapter"}
+
+{"PREVIOUS FEEDBACK TO ADDRESS: " + feedback if feedback else ""}
+
+{"CURRENT DRAFT OF THIS CHAPTER (revise it to address the feedback):" + chr(10) + previous_text if previous_text else ""}
+""")
+        ]
+        
+        response = self.llm.invoke(chapter_prompt)
+        record_llm_usage(response, "historical_story_building")
+        return response.content.strip()
+
+    def _draft_title(self, brief: SystemMessage, chapters: List[Dict]) -> str:
+        """
+        Ask for a title for a story drafted chapter by chapter.
+        
+        Args:
+            brief: The story brief message that opens every story prompt
+            chapters: The chapter outline
+            
+        Returns:
+            The story title
+        """
+        title_prompt = [
+            brief,
+            SystemMessage(content=self.system_prompt),
+            HumanMessage(content=f"""STORY OUTLINE:
+{outline_text(chapters)}
+
+Give a compelling title for this story. Reply with the title only.
+""")
+        ]
+        
+        response = self.llm.invoke(title_prompt)
+        record_llm_usage(response, "historical_story_building")
+        return response.content.strip().split('\n')[0].replace('#', '').strip().strip('"')
+
+    def _stitch_chapters(self, chapters: List[Dict], chapter_texts: List[str]) -> List[str]:
+        """
+        Clean independently drafted chapters with a light continuity pass.
+        
+        The pass is local: it drops any heading the model added and removes a
+        paragraph repeated across a chapter boundary. join_chapters then gives
+        every chapter the same heading format.
+        
+        Args:
+            chapters: The chapter outline
+            chapter_texts: Drafted prose for each chapter, in outline order
+            
+        Returns:
+            The cleaned prose of each chapter, in outline order
+        """
+        sections = []
+        previous_last_paragraph = ""
+        
+        for i, (chapter, text) in enumerate(zip(chapters, chapter_texts)):
+            paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
+            
+            # Drop a heading the model wrote despite being asked not to
+            if paragraphs:
+                first_line = paragraphs[0].split('\n')[0].strip()
+                if first_line.startswith('#') or first_line.lower().startswith('chapter') or \
+                        first_line.strip('*').strip() == chapter['title']:
+                    paragraphs[0] = paragraphs[0][len(first_line):].strip()
+                    if not paragraphs[0]:
+                        paragraphs.pop(0)
+            
+            # Drop the opening paragraph if it just repeats how the previous chapter ended
+            if paragraphs and previous_last_paragraph and \
+                    " ".join(paragraphs[0].split()) == " ".join(previous_last_paragraph.split()):
+                paragraphs.pop(0)
+            
+            if paragraphs:
+                previous_last_paragraph = paragraphs[-1]
+            
+            sections.append("\n\n".join(paragraphs))
+        
+        return sections
+
+    def _draft_chapters_parallel(self, brief: SystemMessage, chapters: List[Dict], word_counts: str, feedback: str):
+        """
+        Draft every chapter concurrently and join them in order.
+        
+        Generation time drops from one long serial decode to roughly the time
+        of the longest chapter. Finished chapters are streamed to the UI in order.
+        
+        Args:
+            brief: The story brief message that opens every story prompt
+            chapters: The chapter outline
+            word_counts: Target word count range for the whole story
+            feedback: Critic feedback from the previous iteration, if any
+            
+        Returns:
+            Tuple of (title, prose of each chapter)
+        """
+        chapter_words = self._chapter_word_range(word_counts, len(chapters))
+        
+        writer = get_token_writer()
+        if writer:
+            writer({"node": "historical_story_building", "event": "start"})
+        
+        max_workers = max(1, min(CHAPTER_DRAFT_MAX_CONCURRENCY, len(chapters) + 1))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chapter") as executor:
+            # Copy the context per task so tracing and callbacks follow the calls into the workers
+            title_future = executor.submit(contextvars.copy_context().run, self._draft_title, brief, chapters)
+            chapter_futures = [
+                executor.submit(contextvars.copy_context().run, self._draft_chapter, i, chapters, brief,
+                                chapter_words, feedback)
+                for i in range(len(chapters))
+            ]
+            
+            title = title_future.result()
+            if writer:
+                writer({"node": "historical_story_building", "token": f"{title}\n\n"})
+            
+            chapter_texts = []
+            for i, future in enumerate(chapter_futures):
+                chapter_texts.append(future.result())
+                if writer:
+                    heading = "" if i == 0 else "\n\n"
+                    writer({"node": "historical_story_building",
+                            "token": f"{heading}{chapter_heading(i, chapters[i])}\n\n{chapter_texts[-1]}"})
+        
+        if writer:
+            writer({"node": "historical_story_building", "event": "end"})
+        
+        return title, self._stitch_chapters(chapters, chapter_texts)
+
+    def _chapter_word_range(self, word_counts: str, chapters_count: int) -> str:
+        """Split a story word count range such as "1500-2500" evenly across the chapters."""
+        low, _, high = word_counts.partition("-")
+        return f"{int(low) // chapters_count}-{int(high or low) // chapters_count}"
+
+    def _chapters_to_revise(self, state: Dict[str, Any], chapters: List[Dict]) -> List[int]:
+        """
+        Find the chapters the critic flagged, when they can be revised on their own.
+        
+        Args:
+            state: Current state with the previous draft and its evaluation
+            chapters: The chapter outline
+            
+        Returns:
+            Indices of the flagged chapters, or an empty list when the whole story should be redrafted
+        """
+        chapter_texts = state.get("chapter_texts") or []
+        verdicts = (state.get("evaluation") or {}).get("chapter_verdicts") or []
+        if not state.get("iterations") or len(chapter_texts) != len(chapters):
+            return []
+        
+        flagged = sorted({
+            verdict["chapter"] - 1 for verdict in verdicts
+            if not verdict.get("approved", True) and 1 <= verdict.get("chapter", 0) <= len(chapters)
+        })
+        
+        # Every chapter failing is a full redraft
+        return flagged if len(flagged) < len(chapters) else []
+
+    def _revise_chapters(self, state: Dict[str, Any], flagged: List[int], chapters: List[Dict],
+                         brief: SystemMessage, word_counts: str) -> Dict[str, Any]:
+        """
+        Regenerate only the flagged chapters and splice them back into the story.
+        
+        Args:
+            state: Current state with the previous draft and its evaluation
+            flagged: Indices of the chapters to regenerate
+            chapters: The chapter outline
+            brief: The story brief message that opens every story prompt
+            word_counts: Target word count range for the whole story
+            
+        Returns:
+            Updated state with the revised story
+        """
+        evaluation = state.get("evaluation") or {}
+        feedback = evaluation.get("feedback", "")
+        chapter_feedback = {
+            verdict["chapter"] - 1: verdict.get("feedback", "")
+            for verdict in evaluation.get("chapter_verdicts") or []
+        }
+        chapter_texts = list(state["chapter_texts"])
+        chapter_words = self._chapter_word_range(word_counts, len(chapters))
+        print(f"✏️ Revising chapters {[i + 1 for i in flagged]} of {len(chapters)}")
+        
+        max_workers = max(1, min(CHAPTER_DRAFT_MAX_CONCURRENCY, len(flagged)))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="chapter") as executor:
+            futures = {
+                i: executor.submit(contextvars.copy_context().run, self._draft_chapter, i, chapters, brief,
+                                   chapter_words, "\n".join(filter(None, [chapter_feedback.get(i, ""), feedback])),
+                                   chapter_texts[i])
+                for i in flagged
+            }
+            for i, future in futures.items():
+                chapter_texts[i] = self._stitch_chapters([chapters[i]], [future.result()])[0]
+        
+        story = join_chapters(chapters, chapter_texts)
+        
+        writer = get_token_writer()
+        if writer:
+            writer({"node": "historical_story_building", "event": "start"})
+            writer({"node": "historical_story_building", "token": f"{state.get('title', '')}\n\n{story}"})
+            writer({"node": "historical_story_building", "event": "end"})
+        
+        state["story"] = story
+        state["chapter_texts"] = chapter_texts
+        state["revised_chapters"] = flagged
+        state["iterations"] = state.get("iterations", 0) + 1
+        
+        return state
 
+    @tracks_llm_usage
     def create_story_draft(self, state):
         """
         Create a story draft based on research and user requirements.
@@ -111,13 +343,13 @@ Format your response as a JSON array of chapter objects, each with "title" and "
             Updated state with story draft and chapters
         """
         # Extract necessary information from state
-        user_prompt = state.get("prompt", "")
         story_type = state.get("story_type", "Historical")
         story_length = state.get("length", "Medium")
-        style = state.get("style", "Classic storytelling")
-        research_results = state.get("research_results", [])
         iteration = state.get("iterations", 0)
         
+        # The user request and research context open every prompt as a shared, cacheable prefix
+        brief = story_brief_message(state)
+        
         # If we have evaluation feedback, include it
         feedback = state.get("evaluation", {}).get("feedback", "")
         
@@ -125,23 +357,7 @@ Format your response as a JSON array of chapter objects, each with "title" and "
         if state.get("chapters") and iteration > 0:
             chapters = state.get("chapters")
         else:
-            chapters = self._create_chapter_outline(
-                research_results=research_results,
-                prompt=user_prompt,
-                story_length=story_length
-            )
-        
-        # Format research for the prompt
-        research_text = "\n\n".join([
-            f"RESEARCH ON {item['topic'].upper()}:\n{item['result']}" 
-            for item in research_results
-        ])
-        
-        # Format chapters for the prompt
-        chapters_text = "\n".join([
-            f"Chapter {i+1}: {chapter['title']} - {chapter['description']}"
-            for i, chapter in enumerate(chapters)
-        ])
+            chapters = self._create_chapter_outline(brief=brief, story_length=story_length)
         
         # Determine target word count based on length
         word_counts = {
@@ -150,35 +366,54 @@ Format your response as a JSON array of chapter objects, each with "title" and "
             "Long": "3000-5000"
         }.get(story_length, "1500-2500")
         
-        # Create the draft prompt
-        draft_prompt = ChatPromptTemplate.from_messages([
-            ("system", self.system_prompt),
-            ("user", f"""Create a compelling {story_type.lower()} story based on the following:
-
-                        USER REQUEST: {prompt}
-                        STYLE: {style}
-                        TARGET WORD COUNT: {word_counts} words
-                        
-                        STORY OUTLINE:
-                        {chapters_text}
-                        
-                        HISTORICAL RESEARCH:
-                        {research_text}
-                        
-                        {"PREVIOUS FEEDBACK TO ADDRESS: " + feedback if feedback else ""}
-                        
-                        Write a complete story that:
-                        1. Is historically accurate and authentic, using details from the research
-                        2. Follows the chapter structure provided
-                        3. Is engaging and well-written in the requested style
-                        4. Has well-developed characters and an interesting plot
-                        
-                        Provide a compelling title for the story at the beginning.
-                        """)
-           ])
-        
-        # Generate the story draft
-        response = self.llm.invoke(draft_prompt)
+        # When the critic flagged individual chapters, regenerate only those
+        flagged = self._chapters_to_revise(state, chapters)
+        if flagged:
+            return self._revise_chapters(state, flagged, chapters, brief, word_counts)
+        
+        if STORY_DRAFT_MODE == "parallel" and story_length in PARALLEL_DRAFT_LENGTHS and len(chapters) > 1:
+            title, chapter_texts = self._draft_chapters_parallel(
+                brief=brief,
+                chapters=chapters,
+                word_counts=word_counts,
+                feedback=feedback
+            )
+            
+            state["title"] = title
+            state["story"] = join_chapters(chapters, chapter_texts)
+            state["chapters"] = chapters
+            state["chapter_texts"] = chapter_texts
+            state["revised_chapters"] = None
+            state["iterations"] = iteration + 1
+            
+            return state
+        
+        # Create the draft prompt from messages so braces in the research are kept verbatim.
+        # The feedback changes every iteration, so it goes last.
+        draft_prompt = [
+            brief,
+            SystemMessage(content=self.system_prompt),
+            HumanMessage(content=f"""STORY OUTLINE:
+{outline_text(chapters)}
+
+Create a compelling {story_type.lower()} story of {word_counts} words from the story brief and this outline.
+
+Write a complete story that:
+1. Is historically accurate and authentic, using details from the research
+2. Follows the chapter structure provided
+3. Is engaging and well-written in the requested style
+4. Has well-developed characters and an interesting plot
+
+Provide a compelling title for the story at the beginning, then start each chapter
+with a heading of the form "## Chapter N: Chapter Title".
+
+{"PREVIOUS FEEDBACK TO ADDRESS: " + feedback if feedback else ""}
+""")
+        ]
+        
+        # Generate the story draft, streaming tokens to the UI as they arrive
+        response = stream_llm_response(self.llm, draft_prompt, node="historical_story_building")
+        record_llm_usage(response, "historical_story_building")
         
         # Extract title and story from the response
         content = response.content
@@ -192,10 +427,15 @@ Format your response as a JSON array of chapter objects, each with "title" and "
         # The rest is the story
         story = '\n'.join(lines[1:]).strip()
         
+        # Keep each chapter's prose so later revisions can regenerate chapters on their own
+        sections = [chapter_body(story, span) for span in find_chapter_spans(story, chapters)]
+        
         # Update the state
         state["title"] = title
         state["story"] = story
         state["chapters"] = chapters
+        state["chapter_texts"] = sections if len(sections) == len(chapters) else None
+        state["revised_chapters"] = None
         state["iterations"] = iteration + 1
         
         return state
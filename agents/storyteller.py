@@ -1,5 +1,7 @@
 from langgraph.graph import StateGraph, START, END
+import functools
 import os
+import time
 
 from typing import Dict, Any, Literal, Optional, List
 
@@ -7,12 +9,21 @@ from typing import Dict, Any, Literal, Optional, List
 from agents.story_builder import StoryBuilder
 from agents.critic_agent import CriticAgent
 from agents.style_adapter import StyleAdapter
+from agents.evaluation_budget import evaluation_node
+from utils.chapter_index import index_story_chapters
+from utils.metrics import get_metrics_callbacks
+from utils.research_context import build_research_context
 from utils.research_tool import generate_research_questions, perplexity_search
 
-# Create instances of our agents
-story_builder = StoryBuilder()
-critic = CriticAgent()
-style_adapter = StyleAdapter()
+@functools.lru_cache(maxsize=1)
+def get_agents():
+    """
+    Create the agents (and their LLM clients) on first use rather than at import.
+    
+    Returns:
+        Tuple of (story_builder, critic, style_adapter)
+    """
+    return StoryBuilder(), CriticAgent(), StyleAdapter()
 
 def routes_by_story_type(state):
     """
@@ -23,31 +34,41 @@ def routes_by_story_type(state):
     
     return story_type
 
-def create_workflow(State):
+def start_story_request(state):
+    """
+    Router node: record when the request started so the evaluation loop can enforce its deadline.
+    """
+    return {"started_at": state.get("started_at") or time.time()}
+
+def create_workflow(State, checkpointer=None):
     """
     Create a unified workflow for story generation based on UI input.
     All branches are integrated into a single StateGraph.
     
     Args:
         State: The state type definition
+        checkpointer: LangGraph checkpointer saving the state after each node, or None
         
     Returns:
         Compiled workflow
     """
+    story_builder, critic, style_adapter = get_agents()
+    
     # Initialize the state graph
     workflow = StateGraph(State)
     
     # Add the main router node
-    workflow.add_node("router", routes_by_story_type)
+    workflow.add_node("router", start_story_request)
     
     # ===== HISTORICAL BRANCH NODES =====
     # Add nodes for the research phase
     workflow.add_node("historical_research_questions", generate_research_questions)
     workflow.add_node("historical_research", perplexity_search)
+    workflow.add_node("historical_research_context", build_research_context)
     
     # Add nodes for story creation and refinement
     workflow.add_node("historical_story_building", story_builder.create_story_draft)
-    workflow.add_node("historical_evaluation", critic.evaluate_story)
+    workflow.add_node("historical_evaluation", evaluation_node(critic))
     workflow.add_node("historical_style", style_adapter.adapt_style)
     
     # ===== MORAL & REFLECTION BRANCH =====
@@ -76,11 +97,14 @@ def create_workflow(State):
         
     workflow.add_node("terror", process_terror)
     
+    # Every branch ends by indexing and timing the chapters of its story
+    workflow.add_node("chapter_index", index_story_chapters)
+    
     # ===== DEFINE THE EDGES =====
     # From router to each branch's first node
     workflow.add_conditional_edges(
         "router",
-        lambda state: state.get("story_type", "Moral & Reflection"),
+        routes_by_story_type,
         {
             "Historical": "historical_research_questions",
             "Moral & Reflection": "moral_reflection",
@@ -90,25 +114,28 @@ def create_workflow(State):
     
     # Historical branch flow
     workflow.add_edge("historical_research_questions", "historical_research")
-    workflow.add_edge("historical_research", "historical_story_building")
+    workflow.add_edge("historical_research", "historical_research_context")
+    workflow.add_edge("historical_research_context", "historical_story_building")
     workflow.add_edge("historical_story_building", "historical_evaluation")
     
-    # Conditional edge based on evaluation result
+    # Leave the loop once the draft is approved or the evaluation budget runs out
     workflow.add_conditional_edges(
         "historical_evaluation",
-        lambda state: "historical_style" if state.get("evaluation", {}).get("approved", False) else "historical_story_building",
+        lambda state: "historical_style" if state.get("stop_reason") else "historical_story_building",
         {
             "historical_style": "historical_style",
             "historical_story_building": "historical_story_building"
         }
     )
     
-    # Connect all endpoints to END
-    workflow.add_edge("historical_style", END)
-    workflow.add_edge("moral_reflection", END)
-    workflow.add_edge("terror", END)
+    # Connect all endpoints to END through the chapter index
+    workflow.add_edge("historical_style", "chapter_index")
+    workflow.add_edge("moral_reflection", "chapter_index")
+    workflow.add_edge("terror", "chapter_index")
+    workflow.add_edge("chapter_index", END)
     
     # Set the entry point
     workflow.set_entry_point("router")
     
-    return workflow.compile()
+    # Record per-node latency, tokens, retries and errors on every run
+    return workflow.compile(checkpointer=checkpointer).with_config(callbacks=get_metrics_callbacks())
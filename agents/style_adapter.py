@@ -1,11 +1,23 @@
-from typing import Dict, Any, List, Optional
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+from langchain_core.messages import HumanMessage, SystemMessage
 
 # Import from config
 import os
 import sys
-from config import MODEL_NAME
+from config import (
+    MODEL_NAME,
+    STYLE_ADAPT_MAX_CONCURRENCY,
+    STYLE_ADAPT_MODE,
+    STYLE_ANCHOR_WORDS,
+    STYLE_CHUNK_TARGET_WORDS,
+    STYLE_CHUNKED_MIN_WORDS,
+)
+from utils.llm_factory import get_chat_model
+from utils.llm_usage import record_llm_usage, tracks_llm_usage
+from utils.story_text import split_chapters
+from utils.streaming import get_token_writer, stream_llm_response
 
 class StyleAdapter:
     """
@@ -15,7 +27,7 @@ class StyleAdapter:
     def __init__(self, model_name: str = None):
         """Initialize the style adapter."""
         self.model_name = model_name or MODEL_NAME
-        self.llm = ChatOpenAI(model=self.model_name, temperature=0.6)
+        self.llm = get_chat_model("openai", self.model_name, temperature=0.6)
         
         # Initialize style templates
         self.style_templates = {
@@ -45,10 +57,149 @@ Balance informal tone with the gravity appropriate to historical events.
 """
         }
     
+    def _system_message(self, style_guidance: str) -> SystemMessage:
+        """Build the system message shared by the whole-story and chunked prompts."""
+        return SystemMessage(content=f"""You are a master of literary style adaptation. Your task is to refine and polish the 
+given story to consistently align with the requested style, while preserving the story's substance, 
+historical accuracy, and narrative structure.
+
+STYLE GUIDANCE:
+{style_guidance}
+""")
+
+    def _extract_title(self, styled_story: str, title: str):
+        """
+        Pull a "Title:" line off the start of the styled text, if the model wrote one.
+        
+        Args:
+            styled_story: The styled text returned by the model
+            title: The title to keep when the model did not write one
+            
+        Returns:
+            Tuple of (title, styled story without the title line)
+        """
+        lines = styled_story.split('\n')
+        styled_title = lines[0].replace('#', '').strip()
+        if styled_title.lower().startswith('title:'):
+            # Remove the title line from the story text
+            return styled_title[6:].strip(), '\n'.join(lines[1:]).strip()
+        return title, styled_story
+
+    def _split_into_chunks(self, story: str) -> List[Tuple[str, str]]:
+        """
+        Split a story on chapter headings, or on paragraph boundaries when it has none.
+        
+        Args:
+            story: The story text
+            
+        Returns:
+            List of (heading, body) pairs in story order; heading is "" for paragraph chunks
+        """
+        chunks = split_chapters(story)
+        if chunks:
+            return chunks
+        
+        chunks, current, current_words = [], [], 0
+        for paragraph in story.split('\n\n'):
+            if not paragraph.strip():
+                continue
+            current.append(paragraph.strip())
+            current_words += len(paragraph.split())
+            if current_words >= STYLE_CHUNK_TARGET_WORDS:
+                chunks.append(("", "\n\n".join(current)))
+                current, current_words = [], 0
+        if current:
+            chunks.append(("", "\n\n".join(current)))
+        return chunks
+
+    def _adapt_chunk(self, style: str, style_guidance: str, title: str, style_anchor: str,
+                     chunk: str, index: int, total: int) -> str:
+        """
+        Adapt one chunk of the story with the shared style guidance and anchor.
+        
+        Args:
+            style: Requested style
+            style_guidance: The style template for the requested style
+            title: The story title
+            style_anchor: Opening of the story, so every chunk keeps the same voice, tense and names
+            chunk: The text to adapt
+            index: Position of the chunk in the story
+            total: Number of chunks in the story
+            
+        Returns:
+            The adapted chunk
+        """
+        chunk_prompt = [
+            self._system_message(style_guidance),
+            HumanMessage(content=f"""Adapt one part of the historical story "{title}" to match the "{style}" style.
+
+Maintain the same plot, characters, and historical details, but enhance the prose to consistently reflect 
+the requested style. Keep the same narrative perspective and tense as the opening.
+Return only the adapted text of this part, with no title, heading or commentary.
+
+STORY OPENING (for voice, tense, perspective and names only; do not repeat it):
+{style_anchor}
+
+PART {index + 1} OF {total} TO ADAPT:
+{chunk}
+""")
+        ]
+        
+        response = self.llm.invoke(chunk_prompt)
+        record_llm_usage(response, "historical_style")
+        return response.content.strip()
+
+    def _adapt_style_chunked(self, title: str, story: str, style: str, style_guidance: str):
+        """
+        Adapt the story in chunks concurrently and reassemble them in order.
+        
+        Args:
+            title: The story title
+            story: The story text
+            style: Requested style
+            style_guidance: The style template for the requested style
+            
+        Returns:
+            Tuple of (title, styled story)
+        """
+        chunks = self._split_into_chunks(story)
+        style_anchor = " ".join(story.split()[:STYLE_ANCHOR_WORDS])
+        
+        writer = get_token_writer()
+        if writer:
+            writer({"node": "historical_style", "event": "start"})
+        
+        styled_chunks = []
+        max_workers = max(1, min(STYLE_ADAPT_MAX_CONCURRENCY, len(chunks)))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="style") as executor:
+            # Copy the context per task so tracing and callbacks follow the calls into the workers
+            futures = [
+                executor.submit(contextvars.copy_context().run, self._adapt_chunk, style, style_guidance,
+                                title, style_anchor, body, i, len(chunks))
+                for i, (_, body) in enumerate(chunks)
+            ]
+            for i, ((heading, _), future) in enumerate(zip(chunks, futures)):
+                styled_chunk = future.result()
+                if i == 0:
+                    # Title extraction works as for a whole-story rewrite
+                    title, styled_chunk = self._extract_title(styled_chunk, title)
+                styled_chunks.append(f"{heading}\n\n{styled_chunk}" if heading else styled_chunk)
+                if writer:
+                    writer({"node": "historical_style", "token": ("\n\n" if i else "") + styled_chunks[-1]})
+        
+        if writer:
+            writer({"node": "historical_style", "event": "end"})
+        
+        return title, "\n\n".join(styled_chunks)
+
+    @tracks_llm_usage
     def adapt_style(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """
         Apply consistent style to the final story.
         
+        Long stories are split on chapter or paragraph boundaries and the
+        chunks are adapted concurrently when STYLE_ADAPT_MODE is "chunked".
+        
         Args:
             state: Current state with approved story
             
@@ -63,20 +214,19 @@ Balance informal tone with the gravity appropriate to historical events.
         # Get the style template or default to classic
         style_guidance = self.style_templates.get(style, self.style_templates["Classic storytelling"])
         
-        style_prompt = ChatPromptTemplate.from_messages([
-            ("system", f"""You are a master of literary style adaptation. Your task is to refine and polish the 
-given story to consistently align with the requested style, while preserving the story's substance, 
-historical accuracy, and narrative structure.
-
-STYLE GUIDANCE:
-{style_guidance}
-"""),
-            ("user", f"""Adapt the following historical story to match the "{style}" style consistently throughout:
-
-TITLE: {title}
-
-STORY:
-{story}
+        if STYLE_ADAPT_MODE == "chunked" and len(story.split()) >= STYLE_CHUNKED_MIN_WORDS:
+            styled_title, styled_story = self._adapt_style_chunked(title, story, style, style_guidance)
+            
+            state["final_title"] = styled_title
+            state["final_story"] = styled_story
+            
+            return state
+        
+        # Built from messages rather than a template so braces in the story are kept verbatim.
+        # The fixed instructions come before the story so they form a cacheable prefix.
+        style_prompt = [
+            self._system_message(style_guidance),
+            HumanMessage(content=f"""Adapt the following historical story to match the "{style}" style consistently throughout.
 
 Maintain the same plot, characters, and historical details, but enhance the prose to consistently reflect 
 the requested style. Focus on:
@@ -87,23 +237,20 @@ the requested style. Focus on:
 
 Retain the title and overall structure, but polish every paragraph to create a cohesive stylistic experience.
 Return the complete styled story.
+
+TITLE: {title}
+
+STORY:
+{story}
 """)
-        ])
-        
-        response = self.llm.invoke(style_prompt)
+        ]
         
-        # The styled story is the complete response
-        styled_story = response.content
+        # Stream the styled story to the UI as it is generated
+        response = stream_llm_response(self.llm, style_prompt, node="historical_style")
+        record_llm_usage(response, "historical_style")
         
         # Extract title if it appears in the styled version (assuming it's on the first line)
-        lines = styled_story.split('\n')
-        styled_title = lines[0].replace('#', '').strip()
-        if styled_title.lower().startswith('title:'):
-            styled_title = styled_title[6:].strip()
-            # Remove the title line from the story text
-            styled_story = '\n'.join(lines[1:]).strip()
-        else:
-            styled_title = title
+        styled_title, styled_story = self._extract_title(response.content, title)
         
         # Update the state
         state["final_title"] = styled_title
@@ -0,0 +1,81 @@
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+# Import from config
+from config import StoryState
+
+# Compiled graphs shared by every request handler, keyed by (state schema, branch)
+_compiled_workflows: Dict[Tuple[Any, str], Any] = {}
+_registry_lock = threading.Lock()
+
+
+def _workflow_builders() -> Dict[str, Callable]:
+    """
+    Map each branch name to the function that builds and compiles its graph.
+
+    Imported lazily so the agent modules can themselves use the registry.
+    """
+    from agents.storyteller import create_workflow
+    from agents.historical_branch import create_historical_branch
+    from utils.checkpoints import get_workflow_checkpoints
+
+    def create_main_workflow(State):
+        # Runs of the main graph are checkpointed so they can resume (see utils.checkpoints)
+        checkpoints = get_workflow_checkpoints()
+        return create_workflow(State, checkpointer=checkpoints.checkpointer if checkpoints else None)
+
+    return {
+        "main": create_main_workflow,
+        "historical": create_historical_branch
+    }
+
+
+def get_workflow(branch: str = "main", State=None):
+    """
+    Return the compiled workflow for a branch, compiling it on first use.
+
+    Compiled LangGraph graphs are immutable and safe to invoke concurrently,
+    so a single instance per (schema, branch) is shared by all requests.
+    When checkpointing is enabled, runs of the main graph need a thread id
+    in their config (see utils.checkpoints).
+
+    Args:
+        branch: Name of the graph to return ("main" or "historical")
+        State: The state type definition, defaults to config.StoryState
+
+    Returns:
+        Compiled workflow
+    """
+    State = State or StoryState
+    key = (State, branch)
+
+    workflow = _compiled_workflows.get(key)
+    if workflow is None:
+        with _registry_lock:
+            # Another thread may have compiled it while we were waiting
+            workflow = _compiled_workflows.get(key)
+            if workflow is None:
+                builders = _workflow_builders()
+                if branch not in builders:
+                    raise ValueError(f"Unknown workflow branch: {branch}")
+                workflow = builders[branch](State)
+                _compiled_workflows[key] = workflow
+    return workflow
+
+
+def warm_workflows(branches=("main", "historical"), State=None) -> None:
+    """
+    Compile the given branches up front, e.g. at application startup.
+
+    Args:
+        branches: Branch names to compile
+        State: The state type definition, defaults to config.StoryState
+    """
+    for branch in branches:
+        get_workflow(branch, State)
+
+
+def clear_workflows() -> None:
+    """Drop every compiled workflow so the next request rebuilds it."""
+    with _registry_lock:
+        _compiled_workflows.clear()
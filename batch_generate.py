@@ -0,0 +1,231 @@
+"""
+Generate stories in bulk from a JSONL file, without the Gradio app.
+
+Each input line is a request such as
+    {"id": "rome-1", "prompt": "...", "story_type": "Historical", "length": "Medium", "style": "Poetic"}
+("request_id" and "body" are accepted in place of "id" and "prompt"). Requests
+are streamed from the file and run through the workflow with bounded
+concurrency. Each result (title, story, chapters, evaluation, timings) is
+appended to the output JSONL as soon as it finishes. Ids already completed in
+the output are skipped, so an interrupted batch resumes where it stopped; with
+checkpointing enabled a request that failed midway also resumes from its last
+completed node. Malformed lines get an error result instead of aborting the
+batch, and an id repeated within the input is generated once.
+
+Usage:
+    python batch_generate.py requests.jsonl [--output results.jsonl] [--concurrency 4] [--limit 100]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config import JOB_WORKERS
+from agents.workflow_registry import get_workflow
+from utils.checkpoints import get_workflow_checkpoints
+from utils.sample_stories import get_sample_stories
+
+DEFAULT_REQUEST = {"story_type": "Historical", "length": "Medium", "style": "Classic storytelling"}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="JSONL file with one story request per line")
+    parser.add_argument("--output", help="Results JSONL, defaults to <input>.results.jsonl")
+    parser.add_argument("--concurrency", type=int, default=JOB_WORKERS, help="Stories generated at the same time")
+    parser.add_argument("--limit", type=int, help="Stop after this many new requests")
+    return parser.parse_args()
+
+
+def read_requests(path):
+    """
+    Yield (line number, request, error) for every non-empty line, without loading the whole file.
+
+    A line that is not a JSON object yields a None request and the error,
+    so one bad line does not abort the batch.
+    """
+    with open(path) as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, None, f"Invalid JSON: {e}"
+                continue
+            if isinstance(request, dict):
+                yield line_number, request, None
+            else:
+                yield line_number, None, "Invalid request: expected a JSON object"
+
+
+def completed_ids(path):
+    """Ids with a successful result in an existing output file."""
+    done = set()
+    if os.path.exists(path):
+        for _, result, error in read_requests(path):
+            if not error and result.get("status") == "ok":
+                done.add(result["id"])
+    return done
+
+
+def initial_state(request):
+    """Workflow state for a request record, filling in the defaults."""
+    return {
+        "prompt": request.get("prompt") or request.get("body", ""),
+        "story_type": request.get("story_type", DEFAULT_REQUEST["story_type"]),
+        "length": request.get("length", DEFAULT_REQUEST["length"]),
+        "style": request.get("style", DEFAULT_REQUEST["style"]),
+        "iterations": 0,
+        # As in the app: style examples and fallbacks for the story types
+        "sample_stories": get_sample_stories()
+    }
+
+
+def generate(workflow, request_id, state):
+    """
+    Run one request through the workflow.
+
+    Returns:
+        Result record for the output file
+    """
+    config, stream_input, checkpoints = None, state, get_workflow_checkpoints()
+    if checkpoints:
+        thread_id, resuming = checkpoints.start_run(f"batch:{request_id}")
+        if resuming:
+            thread_id, stream_input = checkpoints.resume_input(workflow, thread_id, f"batch:{request_id}", state)
+        config = checkpoints.config(thread_id)
+
+    node_seconds = {}
+    final_state = state
+    start = last = time.perf_counter()
+    try:
+        # Nodes of one run execute one after another, so the gap between updates is the node's time
+        for mode, chunk in workflow.stream(stream_input, config, stream_mode=["updates", "values"]):
+            now = time.perf_counter()
+            if mode == "updates":
+                for node in chunk:
+                    node_seconds[node] = round(node_seconds.get(node, 0.0) + now - last, 3)
+                last = now
+            else:
+                final_state = chunk
+    except Exception as e:
+        if checkpoints:
+            checkpoints.finish_run(thread_id, succeeded=False)
+        return {"id": request_id, "status": "error", "error": str(e),
+                "timings": {"wall_seconds": round(time.perf_counter() - start, 3), "nodes": node_seconds}}
+
+    if checkpoints:
+        checkpoints.finish_run(thread_id, succeeded=True)
+    return {
+        "id": request_id,
+        "status": "ok",
+        "title": final_state.get("final_title") or final_state.get("title", ""),
+        "story": final_state.get("final_story") or final_state.get("story", ""),
+        "chapters": final_state.get("chapters", []),
+        "evaluation": final_state.get("evaluation"),
+        "iterations": final_state.get("iterations"),
+        "stop_reason": final_state.get("stop_reason"),
+        "timings": {"wall_seconds": round(time.perf_counter() - start, 3), "nodes": node_seconds}
+    }
+
+
+class BatchStats:
+    """Throughput counters shared by the worker threads."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.ok = 0
+        self.failed = 0
+        self.skipped = 0
+        self.words = 0
+        self.latencies = []
+        self._lock = threading.Lock()
+
+    def record(self, result):
+        with self._lock:
+            if result["status"] == "ok":
+                self.ok += 1
+                self.words += len(result["story"].split())
+            else:
+                self.failed += 1
+            # Requests rejected before running (malformed lines) have no timings
+            if "timings" in result:
+                self.latencies.append(result["timings"]["wall_seconds"])
+
+    def line(self):
+        """One-line progress summary."""
+        with self._lock:
+            elapsed = time.perf_counter() - self.started
+            finished = self.ok + self.failed
+            per_minute = finished / elapsed * 60 if elapsed else 0.0
+            return (f"{finished} done ({self.ok} ok, {self.failed} failed, {self.skipped} skipped) in {elapsed:.0f}s: "
+                    f"{per_minute:.2f} stories/min, {self.words / elapsed * 60 if elapsed else 0:.0f} words/min")
+
+    def summary(self):
+        """Final statistics, including latency percentiles."""
+        with self._lock:
+            latencies = sorted(self.latencies)
+        if not latencies:
+            return self.line()
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        return f"{self.line()}; latency p50 {statistics.median(latencies):.1f}s, p95 {p95:.1f}s"
+
+
+def main():
+    args = parse_args()
+    output_path = args.output or os.path.splitext(args.input)[0] + ".results.jsonl"
+    done = completed_ids(output_path)
+    workflow = get_workflow()
+    stats = BatchStats()
+
+    write_lock = threading.Lock()
+    # Bounds the requests read ahead of the workers, so huge inputs are streamed rather than loaded
+    slots = threading.BoundedSemaphore(args.concurrency * 2)
+
+    def write_result(request_id, result):
+        with write_lock:
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+        stats.record(result)
+        status = "✅" if result["status"] == "ok" else f"🟥 {result['error']}"
+        seconds = result.get("timings", {}).get("wall_seconds", 0.0)
+        print(f"{status} {request_id} ({seconds:.1f}s) | {stats.line()}", file=sys.stderr)
+
+    def run(request_id, state):
+        try:
+            write_result(request_id, generate(workflow, request_id, state))
+        finally:
+            slots.release()
+
+    print(f"📚 {len(done)} requests already completed in {output_path}", file=sys.stderr)
+    submitted = 0
+    # Ids already submitted in this run, so a duplicated request is generated once
+    seen = set()
+    with open(output_path, "a") as output, ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        for line_number, request, error in read_requests(args.input):
+            if error:
+                write_result(f"line-{line_number}", {"id": f"line-{line_number}", "status": "error", "error": error})
+                continue
+            request_id = str(request.get("id") or request.get("request_id") or f"line-{line_number}")
+            if request_id in done or request_id in seen:
+                if request_id in seen:
+                    print(f"⚠️ Skipping duplicate id {request_id} on line {line_number}", file=sys.stderr)
+                stats.skipped += 1
+                continue
+            if args.limit is not None and submitted >= args.limit:
+                break
+            slots.acquire()
+            executor.submit(run, request_id, initial_state(request))
+            seen.add(request_id)
+            submitted += 1
+
+    print(f"🏁 {stats.summary()}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark cold import time of the StoryForge entry points with `python -X importtime`.
+
+Each module is imported in a fresh interpreter, so nothing is cached between
+runs. The script reports the median total import time over the runs and the
+slowest modules imported along the way. With --budget-ms it exits with status 1
+when a module is over budget, so it can gate CI and catch a heavy dependency
+creeping back into the startup path.
+
+Usage:
+    python benchmarks/bench_import_time.py [--modules storyforge_app batch_generate] [--runs 5]
+        [--top 10] [--budget-ms 1500]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MODULES = ["storyforge_app", "batch_generate", "agents.workflow_registry", "agents.storyteller"]
+
+# e.g. "import time:       412 |       1530 |   agents.workflow_registry"
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per module; the median is reported")
+    parser.add_argument("--top", type=int, default=10, help="Slowest modules to list (by cumulative time)")
+    parser.add_argument("--budget-ms", type=float, help="Fail if a module takes longer than this to import")
+    return parser.parse_args()
+
+
+def import_once(module):
+    """
+    Import a module in a fresh interpreter.
+
+    Returns:
+        Tuple of (total milliseconds, {imported module: cumulative milliseconds}), or None if the import failed
+    """
+    env = {**os.environ, "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-benchmark")}
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        print(f"🟥 import {module} failed:\n{completed.stderr.strip().splitlines()[-1]}", file=sys.stderr)
+        return None
+
+    cumulative = {}
+    total_us = 0
+    for line in completed.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative_us, indent, name = match.groups()
+        cumulative[name] = int(cumulative_us) / 1000
+        # Top-level imports (single-space indent) add up to the whole import
+        if len(indent) == 1:
+            total_us += int(cumulative_us)
+    return total_us / 1000, cumulative
+
+
+def main():
+    args = parse_args()
+    over_budget = []
+
+    for module in args.modules:
+        runs = [result for result in (import_once(module) for _ in range(args.runs)) if result]
+        if not runs:
+            over_budget.append(module)
+            continue
+
+        totals = [total for total, _ in runs]
+        median_total = statistics.median(totals)
+        print(f"\n📦 {module}: {median_total:.1f} ms median "
+              f"(min {min(totals):.1f}, max {max(totals):.1f}, {len(runs)} runs)")
+
+        # Slowest imports of the median run, excluding the module itself
+        _, cumulative = min(runs, key=lambda run: abs(run[0] - median_total))
+        slowest = sorted(((ms, name) for name, ms in cumulative.items() if name != module), reverse=True)
+        for ms, name in slowest[:args.top]:
+            print(f"   {ms:9.1f} ms  {name}")
+
+        if args.budget_ms is not None and median_total > args.budget_ms:
+            print(f"🟥 {module} is over the {args.budget_ms:.0f} ms budget")
+            over_budget.append(module)
+
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
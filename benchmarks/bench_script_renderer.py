@@ -0,0 +1,97 @@
+"""
+Micro-benchmark of narration script rendering on long stories.
+
+Compares the old string-concatenating convert_to_script_format (reproduced
+below) with utils.script_renderer, both on a first render and on the
+memoized repeat render the Story/Script toggle hits, for synthetic stories
+of 5k to 50k words.
+
+Usage:
+    python benchmarks/bench_script_renderer.py [--words 5000 20000 50000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import script_renderer
+from utils.script_renderer import SCRIPT, SSML, render_script
+
+VOCABULARY = ("the emperor walked through ancient streets of Rome while senators whispered about "
+              "conspiracy betrayal and glory under marble columns lit by evening torches").split()
+
+
+def legacy_convert_to_script_format(story):
+    """The renderer this benchmark replaces, kept verbatim for comparison."""
+    if not story:
+        return ""
+    paragraphs = story.split('\n\n')
+    script = ""
+    for i, para in enumerate(paragraphs):
+        script += f"[SECTION {i+1}]\n"
+        para_with_pauses = re.sub(r'([.!?]) ', r'\1 // ', para)
+        words = para_with_pauses.split()
+        for j in range(len(words)):
+            if len(words[j]) > 4 and random.random() < 0.05:
+                words[j] = f"*{words[j]}*"
+        enhanced_para = ' '.join(words)
+        script += enhanced_para + "\n\n"
+    script += "[END NARRATION]"
+    return script
+
+
+def synthetic_story(words, seed=7):
+    """A story of about the given word count: 12-word sentences, 8-sentence paragraphs."""
+    rng = random.Random(seed)
+    paragraphs, sentences, sentence = [], [], []
+    for index in range(words):
+        sentence.append(rng.choice(VOCABULARY))
+        if len(sentence) == 12 or index == words - 1:
+            sentences.append(" ".join(sentence).capitalize() + rng.choice(".!?"))
+            sentence = []
+            if len(sentences) == 8:
+                paragraphs.append(" ".join(sentences))
+                sentences = []
+    if sentences:
+        paragraphs.append(" ".join(sentences))
+    return "\n\n".join(paragraphs)
+
+
+def best_ms(fn, repeat):
+    """Fastest of several timed calls, in milliseconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--words", type=int, nargs="+", default=[5000, 10000, 20000, 50000])
+    parser.add_argument("--repeat", type=int, default=20, help="Timed calls per measurement; the fastest is kept")
+    args = parser.parse_args()
+
+    print(f"{'words':>7} {'legacy':>11} {'script':>11} {'ssml':>11} {'memoized':>11}")
+    for words in args.words:
+        story = synthetic_story(words)
+        legacy = best_ms(lambda: legacy_convert_to_script_format(story), args.repeat)
+
+        def first_render(output_format):
+            script_renderer._rendered.clear()
+            render_script(story, output_format)
+
+        script = best_ms(lambda: first_render(SCRIPT), args.repeat)
+        ssml = best_ms(lambda: first_render(SSML), args.repeat)
+        render_script(story)
+        memoized = best_ms(lambda: render_script(story), args.repeat)
+        print(f"{words:>7} {legacy:>8.2f} ms {script:>8.2f} ms {ssml:>8.2f} ms {memoized:>8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark the per-request cost of building the LangGraph workflow.
+
+Compares compiling the graph on every request (the old behaviour of
+handle_story_generation) against fetching it from the workflow registry.
+
+Usage:
+    python benchmarks/bench_workflow_compile.py [--requests 200]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The agents build their LLM clients at import, which only needs a key to be present
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from config import StoryState
+from agents.storyteller import create_workflow
+from agents.workflow_registry import clear_workflows, get_workflow
+
+
+def measure(label, build, requests):
+    """Call build() once per simulated request and report latency and allocations."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(requests):
+        build()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    per_request_ms = elapsed / requests * 1000
+    print(f"{label:<28} {per_request_ms:10.3f} ms/request {peak / 1024:10.1f} KiB peak")
+    return per_request_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200, help="Number of simulated requests")
+    args = parser.parse_args()
+
+    clear_workflows()
+    before = measure("compile per request", lambda: create_workflow(StoryState), args.requests)
+    after = measure("shared registry", lambda: get_workflow(), args.requests)
+
+    print(f"\nPer-request overhead saved: {before - after:.3f} ms ({before / max(after, 1e-9):.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
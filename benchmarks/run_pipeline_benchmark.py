@@ -0,0 +1,173 @@
+"""
+Offline end-to-end benchmark of the story pipeline.
+
+Runs the full workflow from create_workflow for every story type, length and
+style against the fake LLM backend (utils.fake_llm), so it needs no network or
+API keys. For each run it records the wall time of every node, the memory
+allocated (tracemalloc) and the size of the final state serialized as JSON, and
+prints the whole report as JSON so runs can be compared.
+
+Usage:
+    python benchmarks/run_pipeline_benchmark.py [--latency 0.05] [--tokens-per-second 0]
+        [--story-types Historical] [--lengths Short Medium] [--repeat 1] [--output report.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+STORY_TYPES = ["Moral & Reflection", "Historical", "Terror"]
+LENGTHS = ["Short", "Medium", "Long"]
+STYLES = ["Classic storytelling", "Modern", "Poetic", "Conversational"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds to first token per LLM call")
+    parser.add_argument("--tokens-per-second", type=float, default=0, help="Simulated generation speed, 0 for instant")
+    parser.add_argument("--story-types", nargs="+", default=STORY_TYPES, choices=STORY_TYPES)
+    parser.add_argument("--lengths", nargs="+", default=LENGTHS, choices=LENGTHS)
+    parser.add_argument("--styles", nargs="+", default=STYLES, choices=STYLES)
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per combination")
+    parser.add_argument("--output", help="Write the JSON report to this file instead of stdout")
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    """Select the fake backend before config is imported; the agents read it at import."""
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_LATENCY_SECONDS"] = str(args.latency)
+    os.environ["FAKE_LLM_TOKENS_PER_SECOND"] = str(args.tokens_per_second)
+    # Every run should pay for its research instead of reading earlier answers from disk
+    os.environ["RESEARCH_CACHE_ENABLED"] = "false"
+    os.environ["LANGSMITH_TRACING"] = "false"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+
+def run_once(workflow, story_type, length, style):
+    """Run one story through the workflow and measure it."""
+    initial_state = {
+        "prompt": f"A {story_type.lower()} story set in ancient Rome",
+        "story_type": story_type,
+        "length": length,
+        "style": style,
+        "iterations": 0
+    }
+
+    node_seconds = defaultdict(float)
+    node_calls = defaultdict(int)
+    final_state = initial_state
+
+    tracemalloc.start()
+    start = last = time.perf_counter()
+    # The graph runs one node at a time, so the gap between updates is the node's wall time
+    for mode, chunk in workflow.stream(initial_state, stream_mode=["updates", "values"]):
+        now = time.perf_counter()
+        if mode == "updates":
+            for node in chunk:
+                node_seconds[node] += now - last
+                node_calls[node] += 1
+            last = now
+        else:
+            final_state = chunk
+    wall_seconds = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "story_type": story_type,
+        "length": length,
+        "style": style,
+        "wall_seconds": round(wall_seconds, 4),
+        "nodes": {
+            node: {"seconds": round(node_seconds[node], 4), "calls": node_calls[node]}
+            for node in node_seconds
+        },
+        "allocated_peak_kib": round(peak / 1024, 1),
+        "allocated_retained_kib": round(current / 1024, 1),
+        "state_json_bytes": len(json.dumps(final_state, default=str).encode("utf-8")),
+        "iterations": final_state.get("iterations"),
+        "stop_reason": final_state.get("stop_reason"),
+        "story_words": len((final_state.get("final_story") or final_state.get("story") or "").split())
+    }
+
+
+def summarize(runs):
+    """Aggregate wall time per node across all runs."""
+    totals = defaultdict(lambda: {"seconds": 0.0, "calls": 0})
+    for run in runs:
+        for node, stats in run["nodes"].items():
+            totals[node]["seconds"] += stats["seconds"]
+            totals[node]["calls"] += stats["calls"]
+
+    return {
+        "runs": len(runs),
+        "wall_seconds_total": round(sum(run["wall_seconds"] for run in runs), 4),
+        "wall_seconds_max": max((run["wall_seconds"] for run in runs), default=0),
+        "allocated_peak_kib_max": max((run["allocated_peak_kib"] for run in runs), default=0),
+        "state_json_bytes_max": max((run["state_json_bytes"] for run in runs), default=0),
+        "nodes": {
+            node: {
+                "seconds": round(stats["seconds"], 4),
+                "calls": stats["calls"],
+                "mean_seconds_per_call": round(stats["seconds"] / stats["calls"], 4)
+            }
+            for node, stats in sorted(totals.items(), key=lambda item: -item[1]["seconds"])
+        }
+    }
+
+
+def main():
+    args = parse_args()
+    configure_environment(args)
+
+    from config import StoryState
+    from agents.storyteller import create_workflow
+
+    compile_start = time.perf_counter()
+    workflow = create_workflow(StoryState)
+    compile_seconds = time.perf_counter() - compile_start
+
+    runs = []
+    for story_type in args.story_types:
+        for length in args.lengths:
+            for style in args.styles:
+                for _ in range(args.repeat):
+                    # Keep the nodes' progress logging out of the JSON report
+                    with contextlib.redirect_stdout(sys.stderr):
+                        run = run_once(workflow, story_type, length, style)
+                    runs.append(run)
+                    print(f"⏱️ {story_type} / {length} / {style}: {run['wall_seconds']:.2f}s", file=sys.stderr)
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "settings": {
+            "latency_seconds": args.latency,
+            "tokens_per_second": args.tokens_per_second,
+            "repeat": args.repeat
+        },
+        "compile_seconds": round(compile_seconds, 4),
+        "summary": summarize(runs),
+        "runs": runs
+    }
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+        print(f"📝 Report written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,123 @@ MODEL_NAME_REASONING = "o1-mini"
 PPLX_API_KEY = os.getenv("PPLX_API_KEY")
 PPLX_MODEL_NAME = "llama-3.1-sonar-small-128k-online"
 
+# Research fan-out: how many questions are sent to Perplexity at once, and how long each may take
+RESEARCH_MAX_CONCURRENCY = int(os.getenv("RESEARCH_MAX_CONCURRENCY", "4"))
+RESEARCH_QUESTION_TIMEOUT = float(os.getenv("RESEARCH_QUESTION_TIMEOUT", "60"))
+
+# Questions whose word overlap (Jaccard similarity, weighted towards the rarer words) reaches this
+# threshold are researched once; well above the ~0.5 of questions differing in one topic word
+QUESTION_DEDUP_THRESHOLD = float(os.getenv("QUESTION_DEDUP_THRESHOLD", "0.8"))
+
+# Compact research context shared by every story prompt (see utils.research_context)
+RESEARCH_CONTEXT_TOKEN_BUDGET = int(os.getenv("RESEARCH_CONTEXT_TOKEN_BUDGET", "1500"))
+RESEARCH_FACT_DEDUP_THRESHOLD = 0.7
+
+# Disk cache for research answers, shared across stories
+CACHE_DIR = os.getenv("STORYFORGE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+RESEARCH_CACHE_ENABLED = os.getenv("RESEARCH_CACHE_ENABLED", "true").lower() == "true"
+RESEARCH_CACHE_PATH = os.path.join(CACHE_DIR, "research_cache.sqlite3")
+RESEARCH_CACHE_TTL_SECONDS = float(os.getenv("RESEARCH_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+RESEARCH_CACHE_MAX_ENTRIES = int(os.getenv("RESEARCH_CACHE_MAX_ENTRIES", "5000"))
+
+# Checkpoints of the main workflow, so a failed or interrupted run resumes from its last completed node
+# (see utils.checkpoints). Threads are deleted after the retention period; finished ones are compacted.
+CHECKPOINTS_ENABLED = os.getenv("CHECKPOINTS_ENABLED", "true").lower() == "true"
+CHECKPOINT_PATH = os.path.join(CACHE_DIR, "checkpoints.sqlite3")
+CHECKPOINT_RETENTION_SECONDS = float(os.getenv("CHECKPOINT_RETENTION_SECONDS", str(7 * 24 * 3600)))
+CHECKPOINT_PRUNE_INTERVAL_SECONDS = float(os.getenv("CHECKPOINT_PRUNE_INTERVAL_SECONDS", "3600"))
+
+# Workflow diagrams rendered locally and cached by graph structure (see utils.workflow_diagram)
+DIAGRAM_CACHE_DIR = os.path.join(CACHE_DIR, "diagrams")
+
+# Narration rate used to time chapters from their word counts (see utils.chapter_index)
+NARRATION_WORDS_PER_MINUTE = float(os.getenv("NARRATION_WORDS_PER_MINUTE", "150"))
+
+# Narration scripts (see utils.script_renderer): share of longer words emphasized, SSML pause after sentences
+SCRIPT_EMPHASIS_RATE = float(os.getenv("SCRIPT_EMPHASIS_RATE", "0.05"))
+SCRIPT_PAUSE_MS = int(os.getenv("SCRIPT_PAUSE_MS", "400"))
+SCRIPT_CACHE_MAX_ENTRIES = int(os.getenv("SCRIPT_CACHE_MAX_ENTRIES", "64"))
+
+# LLM backend: "live" calls OpenAI and Perplexity, "fake" uses the offline canned responses of utils.fake_llm
+LLM_BACKEND = os.getenv("LLM_BACKEND", "live")
+FAKE_LLM_LATENCY_SECONDS = float(os.getenv("FAKE_LLM_LATENCY_SECONDS", "0.2"))  # Time to first token
+FAKE_LLM_TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "0"))  # 0 generates instantly
+
+# Shared HTTP connection pool used by every LLM client (see utils.llm_factory)
+LLM_HTTP_POOL_SIZE = int(os.getenv("LLM_HTTP_POOL_SIZE", "20"))
+LLM_HTTP_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_HTTP_KEEPALIVE_CONNECTIONS", "10"))
+LLM_HTTP_KEEPALIVE_SECONDS = float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "30"))
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "120"))
+# Retries the OpenAI client makes on its own after a rate limit, timeout or server error
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+
+# Narration (see utils.narration): "openai" uses the speech API, "offline" a local stand-in engine.
+# Chunks are synthesized concurrently and cached on disk, so only edited paragraphs are re-synthesized.
+NARRATION_BACKEND = os.getenv("NARRATION_BACKEND", "openai" if LLM_BACKEND == "live" else "offline")
+NARRATION_TTS_MODEL = os.getenv("NARRATION_TTS_MODEL", "gpt-4o-mini-tts")
+NARRATION_MAX_CONCURRENCY = int(os.getenv("NARRATION_MAX_CONCURRENCY", "4"))
+NARRATION_CHUNK_MAX_CHARS = int(os.getenv("NARRATION_CHUNK_MAX_CHARS", "1500"))
+NARRATION_PARAGRAPH_PAUSE_MS = int(os.getenv("NARRATION_PARAGRAPH_PAUSE_MS", "600"))
+NARRATION_CACHE_DIR = os.path.join(CACHE_DIR, "narration")
+NARRATION_OUTPUT_DIR = os.path.join(CACHE_DIR, "audio")
+
+# Critic and outline responses (see utils.structured_output): ask for native JSON where the model supports it,
+# and re-ask this many times with the schema when a response still cannot be parsed
+STRUCTURED_OUTPUT_JSON_MODE = os.getenv("STRUCTURED_OUTPUT_JSON_MODE", "true").lower() == "true"
+STRUCTURED_OUTPUT_RETRIES = int(os.getenv("STRUCTURED_OUTPUT_RETRIES", "1"))
+
+# Critic model routing (see agents.critic_agent): "tiered" scores each draft with CRITIC_FAST_MODEL first and
+# escalates to the reasoning model only when the mean score is within CRITIC_BORDERLINE_MARGIN of
+# CRITIC_APPROVAL_SCORE, the verdict contradicts the scores, the score moved by CRITIC_MAX_SCORE_SWING or more
+# since the previous iteration, or the response could not be parsed. "reasoning" always uses the reasoning
+# model, "fast" never escalates.
+CRITIC_ROUTING = os.getenv("CRITIC_ROUTING", "tiered")
+CRITIC_FAST_MODEL = os.getenv("CRITIC_FAST_MODEL", MODEL_NAME)
+CRITIC_APPROVAL_SCORE = float(os.getenv("CRITIC_APPROVAL_SCORE", "7.5"))
+CRITIC_BORDERLINE_MARGIN = float(os.getenv("CRITIC_BORDERLINE_MARGIN", "0.5"))
+CRITIC_MAX_SCORE_SWING = float(os.getenv("CRITIC_MAX_SCORE_SWING", "2.0"))
+
+# Story drafting: "parallel" drafts each chapter concurrently for the listed lengths, "single" writes the story in one call
+STORY_DRAFT_MODE = os.getenv("STORY_DRAFT_MODE", "parallel")
+PARALLEL_DRAFT_LENGTHS = ("Medium", "Long")
+CHAPTER_DRAFT_MAX_CONCURRENCY = int(os.getenv("CHAPTER_DRAFT_MAX_CONCURRENCY", "8"))
+
+# Style adaptation: "chunked" restyles chapters (or paragraph groups) concurrently for stories of at least
+# STYLE_CHUNKED_MIN_WORDS words, "single" rewrites the whole story in one call
+STYLE_ADAPT_MODE = os.getenv("STYLE_ADAPT_MODE", "chunked")
+STYLE_CHUNKED_MIN_WORDS = int(os.getenv("STYLE_CHUNKED_MIN_WORDS", "1200"))
+STYLE_CHUNK_TARGET_WORDS = int(os.getenv("STYLE_CHUNK_TARGET_WORDS", "600"))
+STYLE_ANCHOR_WORDS = 80
+STYLE_ADAPT_MAX_CONCURRENCY = int(os.getenv("STYLE_ADAPT_MAX_CONCURRENCY", "8"))
+
+# Budget of the historical evaluation loop; a request can override it with an "evaluation_budget" dict.
+# The loop stops at the first of: max iterations, deadline (seconds since the request started) or a
+# mean critic score that improves by less than the minimum between iterations.
+EVALUATION_MAX_ITERATIONS = int(os.getenv("EVALUATION_MAX_ITERATIONS", "3"))
+EVALUATION_DEADLINE_SECONDS = float(os.getenv("EVALUATION_DEADLINE_SECONDS", "600"))
+EVALUATION_MIN_SCORE_IMPROVEMENT = float(os.getenv("EVALUATION_MIN_SCORE_IMPROVEMENT", "0.25"))
+
+# Per-node latency, token, retry and error metrics (see utils.metrics), served for Prometheus on METRICS_PORT (0 disables the endpoint)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+# Print a line per LLM call with its token usage (always kept in state["llm_usage"] and the metrics)
+LLM_USAGE_LOG = os.getenv("LLM_USAGE_LOG", "false").lower() == "true"
+
+# Story generation job queue (see utils.job_queue): worker pool size, maximum queued jobs, and the longest
+# estimated wait a new job is admitted with (0 admits any job while the queue has room)
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_QUEUE_LENGTH = int(os.getenv("JOB_MAX_QUEUE_LENGTH", "20"))
+JOB_MAX_ESTIMATED_WAIT_SECONDS = float(os.getenv("JOB_MAX_ESTIMATED_WAIT_SECONDS", "0"))
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", "500"))  # Finished jobs kept for status lookups
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+
+# Finished stories are reused for identical (prompt, story type, length, style) requests (see utils.single_flight)
+STORY_CACHE_TTL_SECONDS = float(os.getenv("STORY_CACHE_TTL_SECONDS", "3600"))
+STORY_CACHE_MAX_ENTRIES = int(os.getenv("STORY_CACHE_MAX_ENTRIES", "100"))
+
+# Stream tokens from the story builder and style adapter to the UI as they are generated
+STREAM_TOKENS = os.getenv("STREAM_TOKENS", "true").lower() == "true"
+
 LANGSMITH_TRACING = True
 LANGSMITH_ENDPOINT = "https://api.smith.langchain.com"
 LANGSMITH_API_KEY = os.getenv("LANGSMITH_API_KEY")
@@ -39,17 +156,30 @@ class StoryState(TypedDict):
     # Processing Variables
     iterations: Optional[int]
     sample_stories: Optional[Dict]
+    bypass_research_cache: Optional[bool]
+    started_at: Optional[float]  # Epoch seconds when the request entered the graph
+    evaluation_budget: Optional[Dict]  # Overrides for max_iterations, deadline_seconds, min_score_improvement
     
     # Research variables
     questions: Optional[List[str]]
     research_results: Optional[List[Dict]]
     research_history: Optional[Dict]
+    research_context: Optional[str]  # Compressed, de-duplicated research used by every prompt
     
     # Story building variables
     chapters: Optional[List[Dict[str, str]]]
+    chapter_texts: Optional[List[str]]  # Prose of each chapter, without headings
+    revised_chapters: Optional[List[int]]  # Chapters regenerated in the last revision, None after a full draft
+    chapter_spans: Optional[List[Dict]]  # Where each chapter sits in the final story, with its timestamp
     
     # Evaluation variables
     evaluation: Optional[Dict]
+    score_history: Optional[List[Optional[float]]]  # Mean critic score of each iteration
+    best_draft: Optional[Dict]  # Best-scoring draft so far: iteration, score, title, story, chapters, chapter_texts
+    stop_reason: Optional[str]  # Why the evaluation loop ended: approved, max_iterations, deadline, no_improvement
+    
+    # Token usage of every LLM call, including prompt-cache hits (see utils.llm_usage)
+    llm_usage: Optional[List[Dict]]
     
     # Outputs
     title: Optional[str]
@@ -1,24 +1,24 @@
-import gradio as gr
 import time
-import re
-import random
-from pathlib import Path
-import base64
-import io
-import json
-from PIL import Image as PILImage
 
-# Import and create the workflow
-from agents.storyteller import create_workflow
+# Import the shared workflow registry (the agents and their LLM clients are built on first use)
+from agents.workflow_registry import get_workflow, warm_workflows
+from config import JOB_MAX_QUEUE_LENGTH, JOB_POLL_INTERVAL, JOB_WORKERS, METRICS_ENABLED, METRICS_PORT
+from utils.chapter_index import youtube_chapters
+from utils.checkpoints import get_workflow_checkpoints
+from utils.job_queue import FAILED, QUEUED, RUNNING, JobQueue, QueueFullError
+from utils.single_flight import CACHED, JOINED, SingleFlight, request_key
+from utils.metrics import metrics_summary, start_metrics_server
+from utils.narration import VOICES, get_narrator
+from utils.sample_stories import get_sample_stories
+from utils.script_renderer import SCRIPT, SSML, render_script
 
-# Define the state type
-from typing import TypedDict, Optional, Dict, List, Any
-from IPython.display import Image, display
-from langchain_core.runnables.graph import CurveStyle, MermaidDrawMethod, NodeStyles
+# Minimum seconds between UI updates while tokens are streaming
+STREAM_UI_INTERVAL = 0.1
 
-# Mock story data (replace with your LangGraph agent later)
-with open("SAMPLE_STORIES.json", "r") as f:
-    SAMPLE_STORIES = json.load(f)
+# Story workflows run on this worker pool rather than in the Gradio request handlers;
+# identical requests share one job and finished stories are reused
+story_jobs = JobQueue("stories")
+story_requests = SingleFlight(story_jobs)
 
 # Mock functions to simulate your LangGraph agent
 def generate_story(prompt, story_type, length, style):
@@ -27,43 +27,126 @@ def generate_story(prompt, story_type, length, style):
     time.sleep(2)  # Simulate processing time
     
     # Just return the appropriate sample story for now
-    story_data = SAMPLE_STORIES[story_type]
+    story_data = get_sample_stories()[story_type]
     return story_data["title"], story_data["story"], story_data["chapters"]
 
-def convert_to_script_format(story):
-    """Convert narrative text to script format for easy voiceover"""
-    if not story:
-        return ""
-        
-    # Split into paragraphs
-    paragraphs = story.split('\n\n')
-    script = ""
+def split_streamed_text(node, text, current_title):
+    """
+    Split partially streamed text into the title and story shown in the UI.
+
+    The story builder writes the title on the first line of its draft; the
+    style adapter's output is shown as-is under the current title.
+    """
+    if node == "historical_story_building":
+        if "\n" not in text:
+            return current_title, ""
+        first_line, rest = text.split("\n", 1)
+        title = first_line.replace('#', '').strip()
+        if title.lower().startswith('title:'):
+            title = title[6:].strip()
+        return title, rest.strip()
+    return current_title, text
+
+def run_story_job(job, initial_state, key, regenerate=False):
+    """
+    Job body: run the workflow, publishing the partial title and story as tokens stream in.
+
+    With checkpointing enabled, a request whose previous run failed or was
+    interrupted resumes from the last completed node instead of starting over.
+
+    Args:
+        job: The running job, used to report progress
+        initial_state: Initial workflow state built from the UI inputs
+        key: Request key, used to find the request's unfinished run
+        regenerate: Start a new run even if an unfinished one exists
+
+    Returns:
+        The final workflow state
+    """
+    # Reuse the compiled workflow shared by all requests
+    workflow = get_workflow()
     
-    for i, para in enumerate(paragraphs):
-        script += f"[SECTION {i+1}]\n"
-        # Add breathing pauses with double slashes
-        para_with_pauses = re.sub(r'([.!?]) ', r'\1 // ', para)
-        # Add emphasis to key phrases (simple implementation)
-        words = para_with_pauses.split()
-        for j in range(len(words)):
-            # Randomly emphasize about 5% of words that are longer than 4 letters
-            if len(words[j]) > 4 and random.random() < 0.05:
-                words[j] = f"*{words[j]}*"
-        
-        enhanced_para = ' '.join(words)
-        script += enhanced_para + "\n\n"
-        
-    script += "[END NARRATION]"
-    return script
+    config, stream_input, checkpoints = None, initial_state, get_workflow_checkpoints()
+    if checkpoints:
+        thread_id, resuming = checkpoints.start_run(key, resume=not regenerate)
+        if resuming:
+            thread_id, stream_input = checkpoints.resume_input(workflow, thread_id, key, initial_state)
+            job.update_progress(resumed=stream_input is None)
+        config = checkpoints.config(thread_id)
+    
+    # "custom" carries the LLM tokens, "values" the state after each node
+    final_state = initial_state
+    title, tokens, last_update = "", [], 0.0
+    try:
+        for mode, chunk in workflow.stream(stream_input, config, stream_mode=["custom", "values"]):
+            if mode == "values":
+                final_state = chunk
+            elif chunk.get("event") == "start":
+                # A new draft or the style pass is starting, so replace the text shown
+                tokens = []
+            elif "token" in chunk:
+                tokens.append(chunk["token"])
+                now = time.monotonic()
+                if now - last_update >= STREAM_UI_INTERVAL:
+                    last_update = now
+                    title, story = split_streamed_text(chunk["node"], "".join(tokens), title)
+                    job.update_progress(title=title, story=story)
+    except Exception:
+        # Keep the thread so the next identical request resumes it
+        if checkpoints:
+            checkpoints.finish_run(thread_id, succeeded=False)
+        raise
+    
+    if checkpoints:
+        checkpoints.finish_run(thread_id, succeeded=True)
+    # Render the script on the worker, so the Script toggle is answered from the cache
+    render_script(final_state.get("final_story") or final_state.get("story", ""),
+                  spans=final_state.get("chapter_spans"))
+    return final_state
+
+def job_status_text(job, source=None):
+    """Describe a job's state and the queue load for the status box."""
+    if source == CACHED:
+        return "♻️ Reused the story generated for an identical request (tick Regenerate for a new one)"
+    if source == JOINED and not job.done:
+        return "🔗 Joined an identical request in progress. " + job_status_text(job)
+    info = job.snapshot()
+    stats = story_jobs.stats()
+    load = f"{stats['queued']} waiting, {stats['running']}/{stats['workers']} running"
+    if job.status == QUEUED:
+        return (f"⏳ Job {job.id} queued: position {story_jobs.position(job)}, "
+                f"about {story_jobs.estimated_wait():.0f}s to wait ({load})")
+    if job.status == RUNNING:
+        resumed = ", resumed from the last checkpoint" if job.progress.get("resumed") else ""
+        return (f"✍️ Job {job.id} running for {info['run_seconds']:.0f}s "
+                f"(waited {info['wait_seconds']:.0f}s{resumed}; {load})")
+    if job.status == FAILED:
+        return f"🟥 Job {job.id} failed: {job.error}"
+    return f"✅ Job {job.id} finished in {info['run_seconds']:.0f}s (waited {info['wait_seconds']:.0f}s)"
+
+def generate_audio(title, story, voice="Male - Neutral", progress=None):
+    """
+    Narrate the story into a WAV file (see utils.narration).
 
-def generate_audio(title, story):
-    """Simulate audio generation"""
-    # This would call your audio generation service
-    time.sleep(2)  # Simulate processing
-    return "Audio generated successfully! Your voiceover is ready to download."
+    Only the paragraphs not narrated before with this voice are synthesized.
 
-def format_youtube_chapters(chapters):
-    """Format chapters for YouTube description"""
+    Returns:
+        Tuple of (status message, path to the WAV file)
+    """
+    if not story:
+        return "Generate a story first.", None
+    text = f"{title}\n\n{story}" if title else story
+    result = get_narrator().narrate(text, voice, progress=progress)
+    status = (f"🔊 {result['audio_seconds'] / 60:.1f} min of narration in {result['seconds']:.1f}s: "
+              f"{result['synthesized']} of {result['chunks']} chunks synthesized, {result['cached']} reused")
+    return status, result["path"]
+
+def format_youtube_chapters(chapters, chapter_spans=None):
+    """Format chapters for YouTube description, timed from the story's chapter spans when known"""
+    if chapter_spans:
+        return youtube_chapters(chapter_spans)
+    if not chapters:
+        return "Generate a story first."
     # Format chapters for YouTube description
     result = "CHAPTERS:\n"
     for chapter in chapters:
@@ -71,181 +154,196 @@ def format_youtube_chapters(chapters):
     return result
 
 # Create the Gradio interface
-with gr.Blocks(theme=gr.themes.Soft(primary_hue="gray")) as demo:
-    # Header
-    gr.Markdown("# StoryForge")
-    gr.Markdown("#### AI Storyteller for YouTube Content Creation")
+def create_demo():
+    """
+    Build the Gradio interface.
     
-    # Story type selection
-    with gr.Row():
-        story_type = gr.Radio(
-            ["Moral & Reflection", "Historical", "Terror"],
-            label="Select Story Type",
-            value="Moral & Reflection"
-        )
+    Gradio is imported here so that importing this module (e.g. for
+    run_story_job) doesn't pay for it.
     
-    # Main content area
-    with gr.Tabs():
-        # Story Generation Tab
-        with gr.TabItem("Create Story"):
-            with gr.Row():
-                # Left panel - Input
-                with gr.Column(scale=1):
-                    prompt = gr.Textbox(
-                        placeholder="What would you like a story about?",
-                        label="Story Prompt",
-                        lines=5
-                    )
-                    
-                    with gr.Row():
-                        length = gr.Radio(
-                            ["Short", "Medium", "Long"],
-                            label="Story Length",
-                            value="Medium"
+    Returns:
+        The gr.Blocks app
+    """
+    import gradio as gr
+    
+    with gr.Blocks(theme=gr.themes.Soft(primary_hue="gray")) as demo:
+        # Header
+        gr.Markdown("# StoryForge")
+        gr.Markdown("#### AI Storyteller for YouTube Content Creation")
+    
+        # Story type selection
+        with gr.Row():
+            story_type = gr.Radio(
+                ["Moral & Reflection", "Historical", "Terror"],
+                label="Select Story Type",
+                value="Moral & Reflection"
+            )
+    
+        # Main content area
+        with gr.Tabs():
+            # Story Generation Tab
+            with gr.TabItem("Create Story"):
+                with gr.Row():
+                    # Left panel - Input
+                    with gr.Column(scale=1):
+                        prompt = gr.Textbox(
+                            placeholder="What would you like a story about?",
+                            label="Story Prompt",
+                            lines=5
                         )
                     
-                    style = gr.Dropdown(
-                        ["Classic storytelling", "Modern", "Poetic", "Conversational"],
-                        label="Style",
-                        value="Classic storytelling"
-                    )
+                        with gr.Row():
+                            length = gr.Radio(
+                                ["Short", "Medium", "Long"],
+                                label="Story Length",
+                                value="Medium"
+                            )
                     
-                    generate_btn = gr.Button("Generate Story", variant="primary")
-                
-                # Right panel - Output
-                with gr.Column(scale=1):
-                    with gr.Row():
-                        title_output = gr.Textbox(label="Title")
-                        format_toggle = gr.Radio(
-                            ["Story", "Script"], 
-                            label="Format", 
-                            value="Story",
-                            interactive=True
+                        style = gr.Dropdown(
+                            ["Classic storytelling", "Modern", "Poetic", "Conversational"],
+                            label="Style",
+                            value="Classic storytelling"
                         )
                     
-                    # Two different text outputs for story/script format
-                    with gr.Group():
-                        story_output = gr.Textbox(label="Story", lines=12)
-                        script_output = gr.Textbox(label="Script Format", lines=12, visible=False)
-        ## Create a tah to visualize the worflow application
-        with gr.TabItem("Agent Workflow"):
-            gr.Markdown("### Story Agent Workflow")
-            gr.Markdown("This tab shows how the story generation agent routes request the routes based on the story type")
+                        regenerate = gr.Checkbox(label="Regenerate (don't reuse a story made for the same request)",
+                                                 value=False)
+                        generate_btn = gr.Button("Generate Story", variant="primary")
+                
+                    # Right panel - Output
+                    with gr.Column(scale=1):
+                        with gr.Row():
+                            title_output = gr.Textbox(label="Title")
+                            format_toggle = gr.Radio(
+                                ["Story", "Script", "SSML"], 
+                                label="Format", 
+                                value="Story",
+                                interactive=True
+                            )
+                    
+                        # Two different text outputs for story/script format
+                        with gr.Group():
+                            story_output = gr.Textbox(label="Story", lines=12)
+                            script_output = gr.Textbox(label="Script Format", lines=12, visible=False)
+                        job_status = gr.Textbox(label="Job Status", interactive=False)
+                        # Outline and chapter spans of the story shown, from the workflow's chapter_index node
+                        chapters_state = gr.State([])
+                        chapter_spans_state = gr.State([])
+            ## Create a tah to visualize the worflow application
+            with gr.TabItem("Agent Workflow"):
+                gr.Markdown("### Story Agent Workflow")
+                gr.Markdown("This tab shows how the story generation agent routes request the routes based on the story type")
 
-            #Add a button to generate/refresh the visualization
-            with gr.Row():
-                visualize_btn = gr.Button("Generate/Refresh Workflow Diagram", variant="primary")
+                #Add a button to generate/refresh the visualization
+                with gr.Row():
+                    visualize_btn = gr.Button("Generate/Refresh Workflow Diagram", variant="primary")
             
-            # Add an image component to display the workflow diagram
-            with gr.Row():
-                workflow_image = gr.Image(
-                    label="LangGraph Workflow", 
-                    show_label=True,
-                    interactive=False,
-                    height=500
-                )
+                # Add an image component to display the workflow diagram
+                with gr.Row():
+                    workflow_image = gr.Image(
+                        label="LangGraph Workflow", 
+                        show_label=True,
+                        interactive=False,
+                        height=500
+                    )
             
-            # Add explanatory text about the workflow
-            with gr.Row():
-                workflow_explanation = gr.Markdown("""
-                **How the StoryForge Agent Works:**
+                # Add explanatory text about the workflow
+                with gr.Row():
+                    workflow_explanation = gr.Markdown("""
+                    **How the StoryForge Agent Works:**
                 
-                1. The workflow starts by taking your story parameters from the UI
-                2. Based on the selected story type, it routes to the appropriate generation path
-                3. Each story type has specialized prompting and generation strategies
-                4. The completed story is returned to the UI for display
+                    1. The workflow starts by taking your story parameters from the UI
+                    2. Based on the selected story type, it routes to the appropriate generation path
+                    3. Each story type has specialized prompting and generation strategies
+                    4. The completed story is returned to the UI for display
                 
-                This visualization helps you understand how LangGraph orchestrates the story generation process.
-                """)
-       ## Audio Generation Tab
-       # with gr.TabItem("Audio"):
-       #     with gr.Row():
-       #         with gr.Column(scale=1):
-       #             gr.Markdown("### Generate Voiceover")
-       #             gr.Markdown("Convert your story into a professional voiceover for your YouTube video.")
-       #             
-       #             voice_type = gr.Dropdown(
-       #                 ["Male - Deep", "Male - Neutral", "Female - Warm", "Female - Professional", "Child"],
-       #                 label="Voice Type",
-       #                 value="Male - Neutral"
-       #             )
-       #             
-       #             audio_btn = gr.Button("🔊 Generate Audio", variant="primary")
-       #             audio_status = gr.Textbox(label="Status", visible=True)
-       #             
-       #         with gr.Column(scale=1):
-       #             audio_output = gr.Audio(label="Preview Audio", interactive=False, visible=False)
-       #             download_btn = gr.Button("Download Audio", visible=False)
-       # 
-       # # Images Tab
-       # with gr.TabItem("Images"):
-       #     gr.Markdown("### Story Visualizations")
-       #     gr.Markdown("Generate images based on key moments in your story for your YouTube video.")
-       #     
-       #     with gr.Row():
-       #         image_prompt = gr.Textbox(label="Image Description (or leave empty to auto-generate)", lines=2)
-       #         image_style = gr.Dropdown(
-       #             ["Realistic", "Artistic", "Fantasy", "Sketch", "Cinematic"],
-       #             label="Image Style",
-       #             value="Cinematic"
-       #         )
-       #     
-       #     generate_img_btn = gr.Button("Generate Images", variant="primary")
-       #     
-       #     with gr.Row():
-       #         image_gallery = gr.Gallery(
-       #             label="Generated Images",
-       #             show_label=True,
-       #             columns=3,
-       #             height="250px",
-       #             object_fit="contain"
-       #         )
-       # 
-       # # YouTube Chapters Tab
-       # with gr.TabItem("YouTube Chapters"):
-       #     gr.Markdown("### Chapter Markers")
-       #     gr.Markdown("Create timestamps for your YouTube video to improve navigation and engagement.")
-       #     chapter_df = gr.Dataframe( headers=["Time", "Title", "Description"], datatype=["str", "str", "str"],
-       #         row_count=5,
-       #         col_count=(3, "fixed"),
-       #         interactive=True
-       #     )
-       #     
-       #     with gr.Row():
-       #         add_chapter_btn = gr.Button("Add Chapter")
-       #         export_chapters_btn = gr.Button("Export for YouTube")
-       #     
-       #     youtube_format = gr.Textbox(
-       #         label="YouTube Description Format", 
-       #         lines=8,
-       #         interactive=False
-       #     )
-       # 
-       # # Export Tab
-       # with gr.TabItem("Export"):
-       #     gr.Markdown("### Export Your Content")
-       #     gr.Markdown("Download all assets for your YouTube video creation.")
-       #     
-       #     with gr.Row():
-       #         with gr.Column(scale=1):
-       #             gr.Markdown("#### Available Assets")
-       #             export_checklist = gr.CheckboxGroup(
-       #                 ["Story Text", "Script Format", "Audio Narration", "Generated Images", "Chapter Markers"],
-       #                 label="Select Assets to Export"
-       #             )
-       #             export_format = gr.Radio(
-       #                 ["Individual Files", "ZIP Package"],
-       #                 label="Export Format",
-       #                 value="ZIP Package"
-       #             )
-       #             export_all_btn = gr.Button("Export Selected Assets", variant="primary")
-       #         
-       #         with gr.Column(scale=1):
-       #             export_status = gr.Textbox(label="Export Status")
-       #             download_link = gr.File(label="Download", visible=False)
-    # Set up event handlers
-    def handle_story_generation(prompt, story_type, length, style):
-        try:
+                    This visualization helps you understand how LangGraph orchestrates the story generation process.
+                    """)
+            
+                # Per-node latency, LLM time, tokens, retries and errors since the app started
+                gr.Markdown("### Node Metrics")
+                with gr.Row():
+                    metrics_btn = gr.Button("Refresh Metrics")
+                with gr.Row():
+                    metrics_headers, _ = metrics_summary()
+                    metrics_table = gr.Dataframe(headers=metrics_headers, interactive=False)
+            ## Audio Generation Tab
+            with gr.TabItem("Audio"):
+                with gr.Row():
+                    with gr.Column(scale=1):
+                        gr.Markdown("### Generate Voiceover")
+                        gr.Markdown("Convert your story into a professional voiceover for your YouTube video.")
+                        
+                        voice_type = gr.Dropdown(
+                            list(VOICES),
+                            label="Voice Type",
+                            value="Male - Neutral"
+                        )
+                        
+                        audio_btn = gr.Button("🔊 Generate Audio", variant="primary")
+                        audio_status = gr.Textbox(label="Status", visible=True)
+                        
+                    with gr.Column(scale=1):
+                        audio_output = gr.Audio(label="Preview Audio", interactive=False, visible=False)
+                        audio_file = gr.File(label="Download Audio", visible=False)
+            ## YouTube Chapters Tab
+            with gr.TabItem("YouTube Chapters"):
+                gr.Markdown("### Chapter Markers")
+                gr.Markdown("Timestamps for your YouTube video, timed from the narration of each chapter.")
+                export_chapters_btn = gr.Button("Export for YouTube", variant="primary")
+                youtube_format = gr.Textbox(
+                    label="YouTube Description Format",
+                    lines=8,
+                    interactive=False
+                )
+           # 
+           # # Images Tab
+           # with gr.TabItem("Images"):
+           #     gr.Markdown("### Story Visualizations")
+           #     gr.Markdown("Generate images based on key moments in your story for your YouTube video.")
+           #     
+           #     with gr.Row():
+           #         image_prompt = gr.Textbox(label="Image Description (or leave empty to auto-generate)", lines=2)
+           #         image_style = gr.Dropdown(
+           #             ["Realistic", "Artistic", "Fantasy", "Sketch", "Cinematic"],
+           #             label="Image Style",
+           #             value="Cinematic"
+           #         )
+           #     
+           #     generate_img_btn = gr.Button("Generate Images", variant="primary")
+           #     
+           #     with gr.Row():
+           #         image_gallery = gr.Gallery(
+           #             label="Generated Images",
+           #             show_label=True,
+           #             columns=3,
+           #             height="250px",
+           #             object_fit="contain"
+           #         )
+           # 
+           # # Export Tab
+           # with gr.TabItem("Export"):
+           #     gr.Markdown("### Export Your Content")
+           #     gr.Markdown("Download all assets for your YouTube video creation.")
+           #     
+           #     with gr.Row():
+           #         with gr.Column(scale=1):
+           #             gr.Markdown("#### Available Assets")
+           #             export_checklist = gr.CheckboxGroup(
+           #                 ["Story Text", "Script Format", "Audio Narration", "Generated Images", "Chapter Markers"],
+           #                 label="Select Assets to Export"
+           #             )
+           #             export_format = gr.Radio(
+           #                 ["Individual Files", "ZIP Package"],
+           #                 label="Export Format",
+           #                 value="ZIP Package"
+           #             )
+           #             export_all_btn = gr.Button("Export Selected Assets", variant="primary")
+           #         
+           #         with gr.Column(scale=1):
+           #             export_status = gr.Textbox(label="Export Status")
+           #             download_link = gr.File(label="Download", visible=False)
+        # Set up event handlers
+        def handle_story_generation(prompt, story_type, length, style, regenerate=False):
             # Create the initial state with the UI inputs
             initial_state = {
                 "prompt": prompt,
@@ -255,175 +353,152 @@ with gr.Blocks(theme=gr.themes.Soft(primary_hue="gray")) as demo:
                 "title": "",  # Will be filled during generation
                 "story": "",  # Will be filled during generation
                 "iterations": 0,  # Add iteration tracking for our agents
-                "sample_stories": SAMPLE_STORIES  # Add sample stories for fallback
+                "sample_stories": get_sample_stories()  # Add sample stories for fallback
             }
-            
-            # Define the state type - this should match the config.py StoryState
-            class StoryState(TypedDict):
-                prompt: str
-                story_type: str
-                length: str
-                style: str
-                title: Optional[str]
-                story: Optional[str]
-                iterations: Optional[int]
-                sample_stories: Optional[Dict]
-            
+        
             print("🟩 Initial state:", initial_state)
-            print("🟩 Creating workflow for story generation...")
-            
-            # Create and execute the workflow
-            workflow = create_workflow(StoryState)
-            print(f"🟩 Invoking workflow with prompt: {prompt[:300]}...")
-            final_state = workflow.invoke(initial_state)
-            
-            # Return results
-            return final_state.get("title", "Untitled"), final_state.get("story", "")
-
-        except Exception as e:
-            # Log the error
-            print(f"🟥​Error generating story: {e}")
-            import traceback
-            traceback.print_exc()
-            
-            # Fallback to sample stories
-            story_data = SAMPLE_STORIES.get(story_type, SAMPLE_STORIES["Moral & Reflection"])
-            return story_data["title"], story_data["story"]
-    # 2. Update the show_workflow function to ensure it captures the full workflow including our new branches
-    # This updates the visualization part
-    
-    def show_workflow():
-        """
-        Generates and displays the workflow diagram using Mermaid.Ink
         
-        Returns:
-            str: Path to the generated workflow image
-        """
-        diagram_path = "workflow_diagram.png"
+            # Hand the workflow to the job queue, sharing the job or result of identical requests;
+            # the handler only polls it
+            try:
+                key = request_key(prompt, story_type, length, style)
+                job, source = story_requests.submit(key, run_story_job, initial_state, key, regenerate,
+                                                    regenerate=regenerate)
+            except QueueFullError as e:
+                print(f"🟧 Story request refused: {e}")
+                yield "", "", f"🟧 Too many stories in progress: {e}", [], []
+                return
+            print(f"🟩 Job {job.id} ({source}) for prompt: {prompt[:300]}...")
         
-        try:
-            # Define the state type
-            class StoryState(TypedDict):
-                prompt: str
-                story_type: str
-                length: str
-                style: str
-                title: Optional[str]
-                story: Optional[str]
-                iterations: Optional[int]  # Add this for our historical branch
-            
-            # Create the workflow (without invoking it)
-            from agents.storyteller import create_workflow
-            workflow = create_workflow(StoryState)
-            
-            # Get the Mermaid diagram data
-            mermaid_graph = workflow.get_graph().draw_mermaid_png(
-                draw_method=MermaidDrawMethod.API
-            )
-            
-            # The above returns the raw PNG data, so we need to save it
-            # Convert base64 data to image and save
-            if isinstance(mermaid_graph, bytes):
-                # If it's raw bytes, save directly
-                with open(diagram_path, "wb") as f:
-                    f.write(mermaid_graph)
-            elif isinstance(mermaid_graph, str) and mermaid_graph.startswith("data:image/png;base64,"):
-                # If it's a base64 string, decode and save
-                base64_data = mermaid_graph.split(",")[1]
-                img_data = base64.b64decode(base64_data)
-                with open(diagram_path, "wb") as f:
-                    f.write(img_data)
-            elif isinstance(mermaid_graph, str):
-                # If it's mermaid code, use the Mermaid.Ink API
-                mermaid_url = "https://mermaid.ink/img/"
-                encoded_data = base64.b64encode(mermaid_graph.encode("utf-8")).decode("utf-8")
-                response = requests.get(f"{mermaid_url}{encoded_data}")
-                
-                if response.status_code == 200:
-                    with open(diagram_path, "wb") as f:
-                        f.write(response.content)
-                else:
-                    print(f"Error from Mermaid.Ink API: {response.status_code}")
-                    return None
-            
-            print(f"✓ Workflow diagram saved to {diagram_path}")
-            return diagram_path
+            while not job.wait(JOB_POLL_INTERVAL):
+                yield job.progress.get("title", ""), job.progress.get("story", ""), job_status_text(job, source), [], []
+        
+            if job.status == FAILED:
+                # Fallback to sample stories
+                sample_stories = get_sample_stories()
+                story_data = sample_stories.get(story_type, sample_stories["Moral & Reflection"])
+                yield story_data["title"], story_data["story"], job_status_text(job, source), \
+                    story_data.get("chapters", []), []
+                return
         
-        except Exception as e:
-            print(f"Error generating workflow diagram: {e}")
-            import traceback
-            traceback.print_exc()
-            return None
+            # Return results, preferring the style-adapted version when there is one
+            final_state = job.result
+            yield (final_state.get("final_title") or final_state.get("title", "Untitled"),
+                   final_state.get("final_story") or final_state.get("story", ""),
+                   job_status_text(job, source),
+                   final_state.get("chapters") or [],
+                   final_state.get("chapter_spans") or [])
+        # 2. Update the show_workflow function to ensure it captures the full workflow including our new branches
+        # This updates the visualization part
     
+        def show_workflow():
+            """
+            Render the workflow diagram locally, cached on disk by graph structure
 
+            Returns:
+                str: Path to the generated workflow image
+            """
+            try:
+                from utils.workflow_diagram import render_workflow_diagram
 
-    # Connect the button click to the handler function
-    story_outputs = generate_btn.click(
-        fn=handle_story_generation,
-        inputs=[prompt, story_type, length, style],
-        outputs=[title_output, story_output]
-    )
-    # Connect the visualization button to the handler
-    visualize_btn.click(
-        fn=show_workflow,
-        outputs=workflow_image
-    )
-    # Handle format toggle
-    def toggle_format(choice, story):
-        if choice == "Story":
-            return gr.update(visible=True), gr.update(visible=False)
-        else:
-            script = convert_to_script_format(story)
-            return gr.update(visible=False), gr.update(visible=True, value=script)
+                # Reuse the compiled workflow (without invoking it)
+                return render_workflow_diagram(get_workflow())
+            except Exception as e:
+                print(f"Error generating workflow diagram: {e}")
+                import traceback
+                traceback.print_exc()
+                return None
+
+
+        # Connect the button click to the handler function
+        story_outputs = generate_btn.click(
+            fn=handle_story_generation,
+            inputs=[prompt, story_type, length, style, regenerate],
+            outputs=[title_output, story_output, job_status, chapters_state, chapter_spans_state]
+        )
+        # Connect the visualization button to the handler
+        visualize_btn.click(
+            fn=show_workflow,
+            outputs=workflow_image
+        )
+        def show_metrics():
+            """Return the per-node metrics summary for the Agent Workflow tab."""
+            headers, rows = metrics_summary()
+            return {"headers": headers, "data": rows}
+    
+        metrics_btn.click(
+            fn=show_metrics,
+            outputs=metrics_table
+        )
+        # Handle format toggle
+        def toggle_format(choice, story, chapter_spans):
+            if choice == "Story":
+                return gr.update(visible=True), gr.update(visible=False)
+            else:
+                # Memoized by story hash, so toggling back and forth does not re-render
+                script = render_script(story, SSML if choice == "SSML" else SCRIPT, spans=chapter_spans)
+                return gr.update(visible=False), gr.update(visible=True, value=script)
+    
+        format_toggle.change(
+            fn=toggle_format,
+            inputs=[format_toggle, story_output, chapter_spans_state],
+            outputs=[story_output, script_output]
+        )
     
-    format_toggle.change(
-        fn=toggle_format,
-        inputs=[format_toggle, story_output],
-        outputs=[story_output, script_output]
-    )
+        # Audio generation
+        def handle_audio_gen(title, story, voice, progress=gr.Progress()):
+            status, path = generate_audio(
+                title, story, voice,
+                progress=lambda done, total: progress(done / total, desc=f"Narrating chunk {done} of {total}")
+            )
+            return gr.update(value=status), gr.update(value=path, visible=bool(path)), \
+                gr.update(value=path, visible=bool(path))
+        
+        audio_btn.click(
+            fn=handle_audio_gen,
+            inputs=[title_output, story_output, voice_type],
+            outputs=[audio_status, audio_output, audio_file]
+        )
+        
+        # Format chapters for YouTube from the stored chapter spans
+        export_chapters_btn.click(
+            fn=format_youtube_chapters,
+            inputs=[chapters_state, chapter_spans_state],
+            outputs=[youtube_format]
+        )
+       # 
+       # # Handle export
+       # def handle_export(checklist):
+       #     time.sleep(1)  # Simulate export process
+       #     if not checklist:
+       #         return "Please select at least one asset to export.", gr.update(visible=False)
+       #     return f"Successfully exported: {', '.join(checklist)}", gr.update(visible=True)
+       # 
+       # export_all_btn.click(
+       #     fn=handle_export,
+       #     inputs=[export_checklist],
+       #     outputs=[export_status, download_link]
+       # )
     
-   # # Audio generation
-   # def handle_audio_gen():
-   #     time.sleep(2)  # Simulate processing
-   #     return gr.update(value="Audio generated successfully!"), gr.update(visible=True), gr.update(visible=True)
-   # 
-   # audio_btn.click(
-   #     fn=handle_audio_gen,
-   #     inputs=[],
-   #     outputs=[audio_status, audio_output, download_btn]
-   # )
-   # 
-   # # Format chapters for YouTube
-   # export_chapters_btn.click(
-   #     fn=format_youtube_chapters,
-   #     inputs=[chapter_df],
-   #     outputs=[youtube_format]
-   # )
-   # 
-   # # Add a chapter row
-   # def add_chapter_row(current_df):
-   #     # This is a simplified version - in reality you'd need proper dataframe handling
-   #     return current_df
-   # 
-   # add_chapter_btn.click(
-   #     fn=add_chapter_row,
-   #     inputs=[chapter_df],
-   #     outputs=[chapter_df]
-   # )
-   # 
-   # # Handle export
-   # def handle_export(checklist):
-   #     time.sleep(1)  # Simulate export process
-   #     if not checklist:
-   #         return "Please select at least one asset to export.", gr.update(visible=False)
-   #     return f"Successfully exported: {', '.join(checklist)}", gr.update(visible=True)
-   # 
-   # export_all_btn.click(
-   #     fn=handle_export,
-   #     inputs=[export_checklist],
-   #     outputs=[export_status, download_link]
-   # )
+    return demo
+
+def __getattr__(name):
+    """Build the interface on first access to storyforge_app.demo (e.g. by the gradio CLI)."""
+    if name == "demo":
+        globals()["demo"] = create_demo()
+        return globals()["demo"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Launch the app
 if __name__ == "__main__":
+    # Compile the graphs once before serving the first request
+    warm_workflows()
+    checkpoints = get_workflow_checkpoints()
+    if checkpoints:
+        checkpoints.prune()
+    if METRICS_ENABLED and METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+    demo = create_demo()
+    # Handlers only poll the job queue, so allow one per queued or running job
+    demo.queue(default_concurrency_limit=JOB_WORKERS + JOB_MAX_QUEUE_LENGTH)
     demo.launch(share=True)
@@ -0,0 +1,29 @@
+from config import QUESTION_DEDUP_THRESHOLD
+from utils.question_dedup import collapse_near_duplicates
+
+
+def test_questions_differing_in_one_topic_word_stay_separate():
+    questions = [
+        "What was the role of women in ancient Rome?",
+        "What was the role of slaves in ancient Rome?",
+        "What weapons did the Roman legions use?",
+        "What armor did the Roman legions use?",
+        "Who was emperor of Rome in 64 AD?",
+        "Who was emperor of Rome in 117 AD?",
+    ]
+    unique_questions, assignments = collapse_near_duplicates(questions, QUESTION_DEDUP_THRESHOLD)
+    assert unique_questions == questions
+    assert assignments == list(range(len(questions)))
+
+
+def test_paraphrased_questions_merge():
+    questions = [
+        "What was daily life like in ancient Rome?",
+        "Who was emperor of Rome in 64 AD?",
+        "How did people live day to day in ancient Rome?",
+        "What caused the great fire of Rome?",
+        "What were the causes of the Great Fire of Rome?",
+    ]
+    unique_questions, assignments = collapse_near_duplicates(questions, QUESTION_DEDUP_THRESHOLD)
+    assert unique_questions == [questions[0], questions[1], questions[3]]
+    assert assignments == [0, 1, 0, 2, 2]
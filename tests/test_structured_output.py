@@ -0,0 +1,22 @@
+import pytest
+
+from utils.structured_output import Evaluation, StructuredOutputError, parse_structured, repair_json
+
+
+def test_repair_json_skips_brackets_in_leading_prose():
+    assert repair_json('Here [note]: {"a": 1}') == {"a": 1}
+
+
+def test_repair_json_rejects_bare_non_ascii_word():
+    with pytest.raises(ValueError):
+        repair_json('{"a": é}')
+
+
+def test_parse_structured_raises_structured_output_error_on_non_ascii_word():
+    with pytest.raises(StructuredOutputError):
+        parse_structured('{"scores": é}', Evaluation, "test")
+
+
+def test_repair_json_common_defects():
+    assert repair_json('```json\n{"a": [1, 2,], "b": True}\n```') == {"a": [1, 2], "b": True}
+    assert repair_json('{"a": "line\nbreak", "b": [1, 2, 3') == {"a": "line\nbreak", "b": [1, 2, 3]}
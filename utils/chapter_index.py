@@ -0,0 +1,134 @@
+import re
+from typing import Any, Dict, List, Optional
+
+# Import from config
+from config import NARRATION_WORDS_PER_MINUTE
+from utils.story_text import CHAPTER_HEADING
+
+# "## Chapter 2: The Siege" -> "The Siege"
+_HEADING_PREFIX = re.compile(r"^#{1,6}\s*Chapter\b\s*\d*\s*[:.\-–—]?\s*", re.IGNORECASE)
+
+
+def format_timestamp(seconds: float) -> str:
+    """
+    Format seconds as a YouTube chapter timestamp.
+
+    Returns:
+        "MM:SS", or "H:MM:SS" from one hour on
+    """
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+def find_chapter_spans(story: str, chapters: Optional[List[Dict]] = None,
+                       words_per_minute: float = NARRATION_WORDS_PER_MINUTE) -> List[Dict[str, Any]]:
+    """
+    Locate every chapter in the story text in a single pass over its headings.
+
+    Each span records where the chapter's heading and prose sit in the text, so
+    callers slice the story directly (see chapter_body) instead of re-parsing
+    it. Timestamps come from the words narrated before each chapter at the
+    given narration rate; the first chapter always starts at 00:00, as YouTube requires.
+
+    Args:
+        story: The story text, with "## Chapter N: Title" headings
+        chapters: The chapter outline, whose titles are preferred over the headings'
+        words_per_minute: Narration rate used for the timestamps
+
+    Returns:
+        One span per heading in story order: chapter (its number), title, start,
+        body_start, end (character offsets), words, seconds and time.
+        Empty if the story has no chapter headings.
+    """
+    headings = list(CHAPTER_HEADING.finditer(story))
+    if not headings:
+        return []
+
+    chapters = chapters or []
+    # Anything before the first heading is narrated as part of the first chapter
+    elapsed_words = 0
+    spans = []
+    for index, heading in enumerate(headings):
+        end = headings[index + 1].start() if index + 1 < len(headings) else len(story)
+        words = len(story[heading.end():end].split())
+        if index < len(chapters) and chapters[index].get("title"):
+            title = chapters[index]["title"]
+        else:
+            title = _HEADING_PREFIX.sub("", heading.group(1)).strip() or f"Chapter {index + 1}"
+
+        seconds = elapsed_words * 60 / words_per_minute
+        spans.append({
+            "chapter": index + 1,
+            "title": title,
+            "start": heading.start(),
+            "body_start": heading.end(),
+            "end": end,
+            "words": words,
+            "seconds": round(seconds, 1),
+            "time": format_timestamp(seconds)
+        })
+        elapsed_words += words
+        if index == 0:
+            elapsed_words += len(story[:heading.start()].split())
+    return spans
+
+
+def spans_match(story: str, spans: Optional[List[Dict[str, Any]]]) -> bool:
+    """Whether spans from find_chapter_spans still point at the headings of this story text."""
+    if not spans or spans[-1]["end"] != len(story):
+        return False
+    for span in spans:
+        heading = CHAPTER_HEADING.match(story, span["start"])
+        if not heading or heading.end() != span["body_start"]:
+            return False
+    return True
+
+
+def chapter_body(story: str, span: Dict[str, Any]) -> str:
+    """The prose of one chapter, without its heading, sliced straight from the story."""
+    return story[span["body_start"]:span["end"]].strip()
+
+
+def youtube_chapters(spans: List[Dict[str, Any]]) -> str:
+    """
+    Format chapter spans as the chapter list of a YouTube description.
+
+    Args:
+        spans: Spans from find_chapter_spans
+
+    Returns:
+        "CHAPTERS:" followed by one "MM:SS - Title" line per chapter
+    """
+    return "CHAPTERS:\n" + "".join(f"{span['time']} - {span['title']}\n" for span in spans)
+
+
+def index_story_chapters(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Post-processing node: index the chapters of the finished story and time them.
+
+    Stores the spans of the final story (the styled one when there is one) in
+    state["chapter_spans"] and sets each outline chapter's "time" from them.
+    When the text has no usable headings, chapter times are spread over the
+    story's word count instead.
+
+    Args:
+        state: State with the finished story and its chapter outline
+
+    Returns:
+        Updated state with chapter_spans and timed chapters
+    """
+    story = state.get("final_story") or state.get("story") or ""
+    chapters = state.get("chapters") or []
+    spans = find_chapter_spans(story, chapters)
+
+    if spans and (not chapters or len(spans) == len(chapters)):
+        state["chapters"] = [{**chapter, "time": span["time"]} for chapter, span in zip(chapters, spans)]
+    elif chapters:
+        words_per_chapter = len(story.split()) / len(chapters)
+        state["chapters"] = [
+            {**chapter, "time": format_timestamp(i * words_per_chapter * 60 / NARRATION_WORDS_PER_MINUTE)}
+            for i, chapter in enumerate(chapters)
+        ]
+    state["chapter_spans"] = spans
+    return state
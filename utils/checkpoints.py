@@ -0,0 +1,236 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional, Tuple
+
+# Import from config
+from config import (
+    CHECKPOINT_PATH,
+    CHECKPOINT_PRUNE_INTERVAL_SECONDS,
+    CHECKPOINT_RETENTION_SECONDS,
+    CHECKPOINTS_ENABLED,
+)
+
+# Run states recorded for each thread
+RUNNING, FAILED, DONE = "running", "failed", "done"
+
+
+def _open_saver(path: str):
+    """
+    Open the SQLite checkpointer, falling back to an in-memory one.
+
+    Returns:
+        Tuple of (checkpointer, whether it persists across restarts)
+    """
+    try:
+        # Optional: pip install langgraph-checkpoint-sqlite
+        from langgraph.checkpoint.sqlite import SqliteSaver
+    except ImportError:
+        from langgraph.checkpoint.memory import MemorySaver
+        print("⚠️ langgraph-checkpoint-sqlite is not installed; checkpoints are kept in memory only")
+        return MemorySaver(), False
+
+    saver = SqliteSaver(sqlite3.connect(path, check_same_thread=False))
+    saver.setup()
+    return saver, True
+
+
+class WorkflowCheckpoints:
+    """
+    Checkpointer for workflow runs, with the bookkeeping to resume, expire and compact them.
+
+    Every run gets its own LangGraph thread. A request whose last run failed or
+    was interrupted resumes that thread from its last completed node. Threads
+    are deleted after the retention period, and finished threads are compacted
+    down to their final checkpoint.
+    """
+
+    def __init__(self, path: str, retention_seconds: float, prune_interval_seconds: float):
+        """Open (or create) the checkpoint database."""
+        self.path = path
+        self.retention_seconds = retention_seconds
+        self.prune_interval_seconds = prune_interval_seconds
+        self._last_prune = 0.0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.checkpointer, self.persistent = _open_saver(path)
+
+        # Run bookkeeping lives next to the checkpoints, on its own connection
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS workflow_runs (
+                    thread_id TEXT PRIMARY KEY,
+                    request_key TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS workflow_runs_request ON workflow_runs (request_key, updated_at)"
+            )
+
+    @staticmethod
+    def config(thread_id: str) -> Dict[str, Any]:
+        """Runnable config selecting a thread."""
+        return {"configurable": {"thread_id": thread_id}}
+
+    def start_run(self, request_key: str, resume: bool = True) -> Tuple[str, bool]:
+        """
+        Pick the thread for a run of a request.
+
+        Args:
+            request_key: Key identifying the request (see utils.single_flight.request_key)
+            resume: Reuse the thread of the request's last unfinished run, if any
+
+        Returns:
+            Tuple of (thread id, whether it continues an unfinished run)
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            if resume:
+                row = self._conn.execute(
+                    """SELECT thread_id FROM workflow_runs WHERE request_key = ? AND status != ?
+                       ORDER BY updated_at DESC LIMIT 1""",
+                    (request_key, DONE)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE workflow_runs SET status = ?, updated_at = ? WHERE thread_id = ?",
+                        (RUNNING, now, row[0])
+                    )
+                    return row[0], True
+
+            thread_id = f"{request_key[:16]}-{uuid.uuid4().hex[:8]}"
+            self._conn.execute(
+                "INSERT INTO workflow_runs (thread_id, request_key, status, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (thread_id, request_key, RUNNING, now, now)
+            )
+        return thread_id, False
+
+    def finish_run(self, thread_id: str, succeeded: bool) -> None:
+        """
+        Record how a run ended and prune old checkpoints when due.
+
+        Args:
+            thread_id: The run's thread
+            succeeded: False keeps the thread resumable
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE workflow_runs SET status = ?, updated_at = ? WHERE thread_id = ?",
+                (DONE if succeeded else FAILED, time.time(), thread_id)
+            )
+        if time.time() - self._last_prune >= self.prune_interval_seconds:
+            self.prune()
+
+    def resume_input(self, workflow, thread_id: str, request_key: str,
+                     initial_state: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Thread and input to stream for a run picked by start_run to continue an unfinished one.
+
+        A thread with pending nodes continues from its last completed node. A
+        thread with nothing pending (e.g. the process died after the last node
+        but before finish_run) is closed and the run starts on a fresh thread,
+        so no state from the old run (score_history, best_draft, evaluation...)
+        leaks into the new one.
+
+        Args:
+            workflow: The compiled workflow
+            thread_id: The thread returned by start_run
+            request_key: Key identifying the request, for the fresh thread
+            initial_state: State to start from when there is nothing to resume
+
+        Returns:
+            Tuple of (thread id, None to continue it or initial_state to start over)
+        """
+        snapshot = workflow.get_state(self.config(thread_id))
+        if snapshot.next:
+            print(f"⏯️ Resuming thread {thread_id} at {', '.join(snapshot.next)}")
+            return thread_id, None
+        # Nothing left to run on the old thread
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE workflow_runs SET status = ?, updated_at = ? WHERE thread_id = ?",
+                (DONE, time.time(), thread_id)
+            )
+        new_thread_id, _ = self.start_run(request_key, resume=False)
+        return new_thread_id, initial_state
+
+    def prune(self) -> Dict[str, int]:
+        """
+        Delete threads older than the retention period and compact finished ones.
+
+        Returns:
+            Number of expired threads and of checkpoints removed by compaction
+        """
+        self._last_prune = time.time()
+        with self._lock, self._conn:
+            expired = [row[0] for row in self._conn.execute(
+                "SELECT thread_id FROM workflow_runs WHERE updated_at < ?",
+                (time.time() - self.retention_seconds,)
+            )]
+        for thread_id in expired:
+            self.checkpointer.delete_thread(thread_id)
+
+        compacted = 0
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM workflow_runs WHERE thread_id = ?", [(t,) for t in expired])
+            if self.persistent:
+                # Finished threads are never resumed, so only their final checkpoint is worth keeping
+                compacted = self._conn.execute(
+                    """DELETE FROM checkpoints
+                       WHERE thread_id IN (SELECT thread_id FROM workflow_runs WHERE status = ?)
+                       AND checkpoint_id < (
+                           SELECT MAX(latest.checkpoint_id) FROM checkpoints AS latest
+                           WHERE latest.thread_id = checkpoints.thread_id
+                           AND latest.checkpoint_ns = checkpoints.checkpoint_ns
+                       )""",
+                    (DONE,)
+                ).rowcount
+                self._conn.execute(
+                    """DELETE FROM writes WHERE NOT EXISTS (
+                           SELECT 1 FROM checkpoints
+                           WHERE checkpoints.thread_id = writes.thread_id
+                           AND checkpoints.checkpoint_ns = writes.checkpoint_ns
+                           AND checkpoints.checkpoint_id = writes.checkpoint_id
+                       )"""
+                )
+        if self.persistent and (expired or compacted):
+            with self._lock:
+                self._conn.execute("VACUUM")
+
+        print(f"🧹 Checkpoints: {len(expired)} expired threads deleted, {compacted} checkpoints compacted")
+        return {"expired_threads": len(expired), "compacted_checkpoints": compacted}
+
+
+_workflow_checkpoints: Optional[WorkflowCheckpoints] = None
+_workflow_checkpoints_lock = threading.Lock()
+
+
+def get_workflow_checkpoints() -> Optional[WorkflowCheckpoints]:
+    """
+    Return the process-wide workflow checkpoints, opening them on first use.
+
+    Returns:
+        The shared WorkflowCheckpoints, or None when checkpointing is disabled in config
+    """
+    global _workflow_checkpoints
+    if not CHECKPOINTS_ENABLED:
+        return None
+    if _workflow_checkpoints is None:
+        with _workflow_checkpoints_lock:
+            if _workflow_checkpoints is None:
+                _workflow_checkpoints = WorkflowCheckpoints(
+                    CHECKPOINT_PATH,
+                    retention_seconds=CHECKPOINT_RETENTION_SECONDS,
+                    prune_interval_seconds=CHECKPOINT_PRUNE_INTERVAL_SECONDS
+                )
+    return _workflow_checkpoints
@@ -0,0 +1,212 @@
+import json
+import random
+import re
+import time
+import zlib
+from typing import Any, Dict, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+# Import from config
+from config import FAKE_LLM_LATENCY_SECONDS, FAKE_LLM_TOKENS_PER_SECOND
+
+# Offline stand-in for ChatOpenAI and ChatPerplexity, selected with LLM_BACKEND=fake.
+# Responses are recognised from the prompts of each call site and sized like real
+# ones (chapters honour their target word count, critic replies are valid JSON), so
+# benchmarks exercise the same parsing, fan-out and streaming paths as live runs.
+
+_WORDS = (
+    "the river city stone night legion market senate bread road harbor fire soldier merchant "
+    "temple wind oath letter sword grain ship wall crowd emperor gate lamp silence rain voice "
+    "walked watched remembered carried whispered waited crossed burned promised returned"
+).split()
+
+_CITATIONS = [
+    "https://www.britannica.com/",
+    "https://www.worldhistory.org/",
+    "https://en.wikipedia.org/",
+    "https://www.jstor.org/"
+]
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count used for the simulated usage metadata (about 1.3 tokens per word)."""
+    return max(1, int(len(text.split()) * 1.3))
+
+
+def _prose(rng: random.Random, words: int) -> str:
+    """Deterministic filler prose of about the given number of words, in paragraphs."""
+    sentences, count = [], 0
+    while count < words:
+        length = rng.randint(8, 18)
+        sentence = " ".join(rng.choice(_WORDS) for _ in range(length))
+        sentences.append(sentence.capitalize() + ".")
+        count += length
+    paragraphs = [" ".join(sentences[i:i + 5]) for i in range(0, len(sentences), 5)]
+    return "\n\n".join(paragraphs)
+
+
+def _range_midpoint(text: str, default: int) -> int:
+    """Midpoint of the first "low-high" word range in a prompt."""
+    match = re.search(r"(\d+)-(\d+) words", text)
+    return (int(match.group(1)) + int(match.group(2))) // 2 if match else default
+
+
+def _outline_chapters(text: str) -> List[str]:
+    """Chapter titles of the outline included in a prompt."""
+    return re.findall(r"^Chapter \d+: (.+?) - ", text, re.MULTILINE)
+
+
+def fake_response(messages: List[BaseMessage], provider: str = "openai") -> Dict[str, Any]:
+    """
+    Build a canned response for a StoryForge prompt.
+
+    Args:
+        messages: The prompt messages
+        provider: "openai" or "perplexity"
+
+    Returns:
+        Dictionary with the response "content" and, for Perplexity, its "citations"
+    """
+    prompt = messages[-1].content if messages else ""
+    rng = random.Random(zlib.crc32(prompt.encode("utf-8")))
+
+    if provider == "perplexity":
+        answer = " ".join(
+            f"{_prose(rng, 30)} [{number}]" for number in range(1, 4)
+        )
+        return {"content": answer, "citations": rng.sample(_CITATIONS, 3)}
+
+    if "Generate research questions" in prompt:
+        subjects = ["daily life", "politics", "warfare", "trade", "religion", "technology"]
+        return {"content": "\n".join(f"What was {subject} like at the time of the story?" for subject in subjects[:5])}
+
+    if "create a chapter outline" in prompt:
+        match = re.search(r"approximately (\d+) chapters", prompt)
+        chapters = [
+            {
+                "title": f"Chapter title {i + 1}",
+                "description": _prose(rng, 25),
+                "characters": [f"Character {j} - {_prose(rng, 6)}" for j in range(1, 3)]
+            }
+            for i in range(int(match.group(1)) if match else 5)
+        ]
+        return {"content": json.dumps({"chapters": chapters})}
+
+    if "CHAPTER TO WRITE:" in prompt:
+        return {"content": _prose(rng, _range_midpoint(prompt.split("CHAPTER TO WRITE:")[1], 400))}
+
+    if "Reply with the title only" in prompt:
+        return {"content": "The " + " ".join(rng.choice(_WORDS) for _ in range(3)).title()}
+
+    if "Evaluate the historical story draft" in prompt or "Re-evaluate only the revised" in prompt:
+        match = re.search(r"ITERATION: (\d+)", prompt)
+        iteration = int(match.group(1)) if match else 1
+        revised = [int(number) for number in re.findall(r"^CHAPTER (\d+):", prompt, re.MULTILINE)]
+        numbers = revised or list(range(1, len(_outline_chapters(prompt)) + 1))
+        # The first draft gets one chapter flagged; the revision is approved
+        approved = iteration >= 2
+        score = min(10, 6 + iteration)
+        return {"content": json.dumps({
+            "scores": {
+                "historical_accuracy": score,
+                "narrative_quality": score,
+                "style_and_tone": score,
+                "character_and_dialogue": score,
+                "overall_impact": score
+            },
+            "strengths": [_prose(rng, 12)],
+            "weaknesses": [_prose(rng, 12)],
+            "feedback": _prose(rng, 40),
+            "approved": approved,
+            "chapters": [
+                {"chapter": number, "approved": approved or number != 2, "feedback": "" if approved else _prose(rng, 20)}
+                for number in numbers
+            ]
+        })}
+
+    if "TO ADAPT:\n" in prompt:
+        # Restyled text is about as long as the original part
+        part = prompt.split("TO ADAPT:\n", 1)[1]
+        return {"content": _prose(rng, len(part.split()))}
+
+    if "\nSTORY:\n" in prompt:
+        title = re.search(r"TITLE: (.*)", prompt)
+        story = prompt.split("\nSTORY:\n", 1)[1]
+        return {"content": f"{title.group(1) if title else 'Untitled'}\n\n{story.strip()}"}
+
+    if "## Chapter N: Chapter Title" in prompt:
+        story_words = _range_midpoint(prompt, 2000)
+        chapters = _outline_chapters(prompt) or ["Chapter title 1"]
+        body = "\n\n".join(
+            f"## Chapter {i + 1}: {title}\n\n{_prose(rng, story_words // len(chapters))}"
+            for i, title in enumerate(chapters)
+        )
+        return {"content": f"Title: The {rng.choice(_WORDS).title()}\n\n{body}"}
+
+    return {"content": _prose(rng, 150)}
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic chat model with simulated latency, for offline runs and benchmarks.
+    """
+
+    provider: str = "openai"
+    model_name: str = "fake"
+    temperature: Optional[float] = None
+    latency_seconds: float = FAKE_LLM_LATENCY_SECONDS
+    tokens_per_second: float = FAKE_LLM_TOKENS_PER_SECOND
+
+    @property
+    def _llm_type(self) -> str:
+        return "storyforge-fake"
+
+    def _usage(self, messages: List[BaseMessage], content: str) -> Dict[str, Any]:
+        """Usage metadata in the shape ChatOpenAI reports it."""
+        input_tokens = sum(estimate_tokens(str(message.content)) for message in messages)
+        output_tokens = estimate_tokens(content)
+        return {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "input_token_details": {"cache_read": 0}
+        }
+
+    def _token_delay(self) -> float:
+        """Seconds between streamed tokens, 0 for instant generation."""
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        response = fake_response(messages, self.provider)
+        content = response["content"]
+        time.sleep(self.latency_seconds + estimate_tokens(content) * self._token_delay())
+
+        additional_kwargs = {"citations": response["citations"]} if "citations" in response else {}
+        message = AIMessage(content=content, additional_kwargs=additional_kwargs,
+                            usage_metadata=self._usage(messages, content))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        response = fake_response(messages, self.provider)
+        content = response["content"]
+        delay = self._token_delay()
+        time.sleep(self.latency_seconds)
+
+        for token in re.findall(r"\S+\s*|\s+", content):
+            if delay:
+                time.sleep(delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+        # Usage is reported on the last chunk, as with stream_usage=True
+        additional_kwargs = {"citations": response["citations"]} if "citations" in response else {}
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content="", additional_kwargs=additional_kwargs, usage_metadata=self._usage(messages, content)
+        ))
@@ -0,0 +1,262 @@
+import itertools
+import queue
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+# Import from config
+from config import JOB_MAX_ESTIMATED_WAIT_SECONDS, JOB_MAX_QUEUE_LENGTH, JOB_RETENTION, JOB_WORKERS
+from utils.metrics import JOB_QUEUE_DEPTH, JOB_REJECTED, JOB_RUNNING, JOB_WAIT
+
+# Job states, in order
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+
+class QueueFullError(RuntimeError):
+    """Raised when admission control refuses a job."""
+
+
+class Job:
+    """
+    A unit of work submitted to a JobQueue.
+
+    The worker calls fn(job, *args); long jobs report partial results through
+    update_progress() so pollers can show them before the job finishes.
+    """
+
+    def __init__(self, job_id: str, fn: Callable, args: tuple):
+        self.id = job_id
+        self.fn = fn
+        self.args = args
+        self.status = QUEUED
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.progress: Dict[str, Any] = {}
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self._done = threading.Event()
+
+    @classmethod
+    def completed(cls, job_id: str, result: Any) -> "Job":
+        """A job that already succeeded with the given result, e.g. one answered from a cache."""
+        job = cls(job_id, None, ())
+        job.started_at = job.finished_at = job.submitted_at
+        job.status = SUCCEEDED
+        job.result = result
+        job._done.set()
+        return job
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def update_progress(self, **progress: Any) -> None:
+        """Publish partial results, e.g. the text streamed so far."""
+        self.progress = {**self.progress, **progress}
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until the job finishes.
+
+        Args:
+            timeout: Seconds to wait, or None to wait indefinitely
+
+        Returns:
+            True if the job finished
+        """
+        return self._done.wait(timeout)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Status of the job as a plain dictionary."""
+        now = time.time()
+        return {
+            "id": self.id,
+            "status": self.status,
+            "wait_seconds": (self.started_at or now) - self.submitted_at,
+            "run_seconds": (self.finished_at or now) - self.started_at if self.started_at else 0.0,
+            "error": self.error
+        }
+
+
+class JobQueue:
+    """
+    Bounded job queue served by a fixed pool of worker threads.
+
+    Submitting returns at once with a Job to poll. Admission control refuses
+    new jobs when the queue is full or, optionally, when the estimated wait
+    exceeds a limit, so load turns into fast rejections instead of piling up.
+    """
+
+    def __init__(self, name: str, workers: int = JOB_WORKERS, max_queue_length: int = JOB_MAX_QUEUE_LENGTH,
+                 max_estimated_wait: float = JOB_MAX_ESTIMATED_WAIT_SECONDS, retention: int = JOB_RETENTION):
+        """
+        Initialize the queue; workers start on the first submission.
+
+        Args:
+            name: Queue name, used as the metrics label
+            workers: Number of jobs run at the same time
+            max_queue_length: Maximum jobs waiting for a worker
+            max_estimated_wait: Refuse jobs whose estimated wait in seconds exceeds this, 0 to disable
+            retention: Finished jobs kept for status lookups
+        """
+        self.name = name
+        self.workers = max(1, workers)
+        self.max_queue_length = max_queue_length
+        self.max_estimated_wait = max_estimated_wait
+        self.retention = retention
+
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue(maxsize=max_queue_length)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._running = 0
+        self._counts = {"submitted": 0, "succeeded": 0, "failed": 0, "rejected": 0}
+        # Moving averages used for the wait estimate and reporting
+        self._mean_run_seconds: Optional[float] = None
+        self._mean_wait_seconds: Optional[float] = None
+        self._sequence = itertools.count(1)
+
+    def _start_workers(self) -> None:
+        """Start the worker threads once."""
+        if self._threads:
+            return
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"{self.name}-worker-{index + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def estimated_wait(self) -> float:
+        """Seconds a job submitted now is expected to wait for a worker."""
+        with self._lock:
+            busy = self._running + self._queue.qsize()
+            mean_run = self._mean_run_seconds or 0.0
+        return max(0, busy - self.workers + 1) * mean_run / self.workers
+
+    def submit(self, fn: Callable, *args: Any) -> Job:
+        """
+        Queue fn(job, *args) to run on a worker.
+
+        Args:
+            fn: Function running the job; receives the Job first
+            *args: Further arguments for fn
+
+        Returns:
+            The queued Job
+
+        Raises:
+            QueueFullError: When admission control refuses the job
+        """
+        if self.max_estimated_wait and self.estimated_wait() > self.max_estimated_wait:
+            self._reject()
+            raise QueueFullError(f"Estimated wait is over {self.max_estimated_wait:g}s, try again later")
+
+        job = Job(f"{next(self._sequence)}-{uuid.uuid4().hex[:8]}", fn, args)
+        with self._lock:
+            self._start_workers()
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                self._counts["rejected"] += 1
+                JOB_REJECTED.inc(self.name)
+                raise QueueFullError(f"The queue is full ({self.max_queue_length} jobs waiting), try again later")
+            self._jobs[job.id] = job
+            self._counts["submitted"] += 1
+            self._forget_finished()
+        JOB_QUEUE_DEPTH.set(self.name, self._queue.qsize())
+        return job
+
+    def _reject(self) -> None:
+        with self._lock:
+            self._counts["rejected"] += 1
+        JOB_REJECTED.inc(self.name)
+
+    def _forget_finished(self) -> None:
+        """Drop the oldest finished jobs beyond the retention limit. Called with the lock held."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.retention)]:
+            del self._jobs[job_id]
+
+    def _work(self) -> None:
+        """Worker loop: run jobs until a None sentinel arrives."""
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+
+            job.started_at = time.time()
+            job.status = RUNNING
+            wait_seconds = job.started_at - job.submitted_at
+            with self._lock:
+                self._running += 1
+                self._mean_wait_seconds = _moving_average(self._mean_wait_seconds, wait_seconds)
+            JOB_WAIT.observe(self.name, wait_seconds)
+            JOB_QUEUE_DEPTH.set(self.name, self._queue.qsize())
+            JOB_RUNNING.set(self.name, self._running)
+
+            try:
+                job.result = job.fn(job, *job.args)
+                job.status = SUCCEEDED
+            except Exception as e:
+                print(f"🟥 Job {job.id} failed: {e}")
+                traceback.print_exc()
+                job.error = str(e)
+                job.status = FAILED
+            finally:
+                job.finished_at = time.time()
+                with self._lock:
+                    self._running -= 1
+                    self._counts[job.status] += 1
+                    self._mean_run_seconds = _moving_average(self._mean_run_seconds,
+                                                             job.finished_at - job.started_at)
+                JOB_RUNNING.set(self.name, self._running)
+                job._done.set()
+                self._queue.task_done()
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Look up a job by id; finished jobs are kept up to the retention limit."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def position(self, job: Job) -> int:
+        """1-based position of a queued job, 0 once a worker has picked it up."""
+        if job.status != QUEUED:
+            return 0
+        with self._lock:
+            queued = [queued_job for queued_job in self._jobs.values() if queued_job.status == QUEUED]
+        return queued.index(job) + 1 if job in queued else 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, running jobs, totals and mean wait and run times."""
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "running": self._running,
+                "workers": self.workers,
+                "max_queue_length": self.max_queue_length,
+                **self._counts,
+                "mean_wait_seconds": self._mean_wait_seconds,
+                "mean_run_seconds": self._mean_run_seconds
+            }
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop the workers after the queued jobs have run.
+
+        Args:
+            wait: Block until the workers have exited
+        """
+        for _ in self._threads:
+            self._queue.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+        self._threads = []
+
+
+def _moving_average(current: Optional[float], value: float, weight: float = 0.2) -> float:
+    """Exponential moving average, seeded with the first value."""
+    return value if current is None else current + weight * (value - current)
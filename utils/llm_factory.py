@@ -0,0 +1,140 @@
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+# Import from config
+from config import (
+    LLM_HTTP_KEEPALIVE_CONNECTIONS,
+    LLM_HTTP_KEEPALIVE_SECONDS,
+    LLM_BACKEND,
+    LLM_HTTP_POOL_SIZE,
+    LLM_MAX_RETRIES,
+    LLM_REQUEST_TIMEOUT,
+    OPENAI_API_KEY,
+    PPLX_API_KEY,
+)
+from utils.metrics import arecord_llm_retry, record_llm_retry
+
+PERPLEXITY_BASE_URL = "https://api.perplexity.ai"
+
+# Chat models shared by every agent and request, keyed by (provider, model, temperature, timeout)
+_chat_models: Dict[Tuple[str, str, Optional[float], Optional[float]], Any] = {}
+_http_clients: Dict[str, Any] = {}
+_factory_lock = threading.RLock()
+
+
+def _http_limits():
+    """Connection pool limits shared by all HTTP clients."""
+    import httpx
+
+    return httpx.Limits(
+        max_connections=LLM_HTTP_POOL_SIZE,
+        max_keepalive_connections=LLM_HTTP_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=LLM_HTTP_KEEPALIVE_SECONDS
+    )
+
+
+def get_http_client(async_client: bool = False):
+    """
+    Return the pooled keep-alive HTTP client used by all LLM providers.
+
+    Reusing one client keeps TCP and TLS sessions open between calls instead
+    of paying the handshake on every node.
+
+    Args:
+        async_client: Return the asyncio client instead of the synchronous one
+
+    Returns:
+        Shared httpx client configured with the openai defaults
+    """
+    # The openai, httpx and langchain_openai imports take over a second, so they wait for the first client
+    import openai
+
+    kind = "async" if async_client else "sync"
+    with _factory_lock:
+        if kind not in _http_clients:
+            # Count the responses the OpenAI client retries on its own (rate limits, server errors)
+            if async_client:
+                _http_clients[kind] = openai.DefaultAsyncHttpxClient(limits=_http_limits(), timeout=LLM_REQUEST_TIMEOUT,
+                                                                     event_hooks={"response": [arecord_llm_retry]})
+            else:
+                _http_clients[kind] = openai.DefaultHttpxClient(limits=_http_limits(), timeout=LLM_REQUEST_TIMEOUT,
+                                                                event_hooks={"response": [record_llm_retry]})
+        return _http_clients[kind]
+
+
+def _create_chat_model(provider: str, model: str, temperature: Optional[float], request_timeout: Optional[float]):
+    """Build a new chat model wired to the shared HTTP connection pool."""
+    if LLM_BACKEND == "fake":
+        from utils.fake_llm import FakeChatModel
+        return FakeChatModel(provider=provider, model_name=model, temperature=temperature)
+
+    if request_timeout is None:
+        request_timeout = LLM_REQUEST_TIMEOUT
+
+    if provider == "openai":
+        from langchain_openai import ChatOpenAI
+
+        kwargs = {"temperature": temperature} if temperature is not None else {}
+        return ChatOpenAI(
+            model=model,
+            api_key=OPENAI_API_KEY,
+            timeout=request_timeout,
+            max_retries=LLM_MAX_RETRIES,
+            http_client=get_http_client(),
+            http_async_client=get_http_client(async_client=True),
+            # Report token usage (including cached prompt tokens) on streamed responses too
+            stream_usage=True,
+            **kwargs
+        )
+
+    if provider == "perplexity":
+        # Imported here so OpenAI-only deployments don't need langchain_community
+        from langchain_community.chat_models import ChatPerplexity
+
+        chat = ChatPerplexity(
+            api_key=PPLX_API_KEY,
+            model=model,
+            temperature=temperature if temperature is not None else 0.7,
+            request_timeout=request_timeout
+        )
+        # ChatPerplexity builds its own openai client; swap in one on the shared pool
+        import openai
+
+        chat.client = openai.OpenAI(
+            api_key=PPLX_API_KEY,
+            base_url=PERPLEXITY_BASE_URL,
+            timeout=request_timeout,
+            max_retries=LLM_MAX_RETRIES,
+            http_client=get_http_client()
+        )
+        return chat
+
+    raise ValueError(f"Unknown LLM provider: {provider}")
+
+
+def get_chat_model(provider: str, model: str, temperature: Optional[float] = None,
+                   request_timeout: Optional[float] = None):
+    """
+    Return the shared chat model for a provider, model and temperature.
+
+    Chat models are stateless between calls and safe to use from several
+    threads, so one instance per configuration is handed to every caller.
+
+    Args:
+        provider: "openai" or "perplexity" (both served by utils.fake_llm when LLM_BACKEND is "fake")
+        model: Model name, e.g. config.MODEL_NAME
+        temperature: Sampling temperature, or None for the provider default
+        request_timeout: Per-call timeout in seconds, or None for LLM_REQUEST_TIMEOUT
+
+    Returns:
+        Shared LangChain chat model
+    """
+    key = (provider, model, temperature, request_timeout)
+    chat_model = _chat_models.get(key)
+    if chat_model is None:
+        with _factory_lock:
+            chat_model = _chat_models.get(key)
+            if chat_model is None:
+                chat_model = _create_chat_model(provider, model, temperature, request_timeout)
+                _chat_models[key] = chat_model
+    return chat_model
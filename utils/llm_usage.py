@@ -0,0 +1,95 @@
+import functools
+import threading
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+# Import from config
+from config import LLM_USAGE_LOG
+
+# Records for the node currently running; shared with worker threads through copied contexts
+_current_usage: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("llm_usage", default=None)
+
+# Most recent calls across all requests, for inspection from the app or a notebook
+recent_llm_usage = deque(maxlen=1000)
+_usage_lock = threading.Lock()
+
+
+def usage_from_response(response, node: str) -> Dict[str, Any]:
+    """
+    Read input, cached input and output token counts from an LLM response.
+
+    Args:
+        response: The AIMessage returned by the chat model
+        node: Name of the graph node that made the call
+
+    Returns:
+        Usage record for the call
+    """
+    usage = getattr(response, "usage_metadata", None) or {}
+    metadata = getattr(response, "response_metadata", None) or {}
+    token_usage = metadata.get("token_usage") or {}
+
+    cached = (usage.get("input_token_details") or {}).get("cache_read")
+    if cached is None:
+        cached = (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+
+    return {
+        "node": node,
+        "model": metadata.get("model_name", ""),
+        "input_tokens": usage.get("input_tokens", token_usage.get("prompt_tokens", 0)) or 0,
+        "cached_input_tokens": cached or 0,
+        "output_tokens": usage.get("output_tokens", token_usage.get("completion_tokens", 0)) or 0
+    }
+
+
+def record_llm_usage(response, node: str) -> Dict[str, Any]:
+    """
+    Record the token usage of an LLM call, including prompt-cache hits.
+
+    The record goes to the running node's state["llm_usage"] (see
+    tracks_llm_usage); it is printed only with LLM_USAGE_LOG set.
+
+    Args:
+        response: The AIMessage returned by the chat model
+        node: Name of the graph node that made the call
+
+    Returns:
+        Usage record for the call
+    """
+    record = usage_from_response(response, node)
+    if LLM_USAGE_LOG:
+        print(f"🧾 {node}: {record['input_tokens']} input tokens "
+              f"({record['cached_input_tokens']} cached), {record['output_tokens']} output tokens")
+
+    with _usage_lock:
+        recent_llm_usage.append(record)
+    records = _current_usage.get()
+    if records is not None:
+        records.append(record)
+    return record
+
+
+def tracks_llm_usage(node_function):
+    """
+    Decorate a graph node so the LLM usage it records is appended to state["llm_usage"].
+
+    Args:
+        node_function: Node taking and returning the state dictionary
+
+    Returns:
+        The wrapped node
+    """
+    @functools.wraps(node_function)
+    def wrapper(*args, **kwargs):
+        records: List[Dict[str, Any]] = []
+        token = _current_usage.set(records)
+        try:
+            state = node_function(*args, **kwargs)
+        finally:
+            _current_usage.reset(token)
+        if records and isinstance(state, dict):
+            state["llm_usage"] = (state.get("llm_usage") or []) + records
+        return state
+
+    return wrapper
@@ -0,0 +1,303 @@
+import bisect
+import threading
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Import from config
+from config import LLM_MAX_RETRIES, METRICS_ENABLED
+
+# Prometheus default buckets, stretched for multi-minute LLM nodes
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000)
+
+# HTTP statuses the OpenAI client retries on its own, invisible to LangChain callbacks
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+
+class Histogram:
+    """
+    Prometheus-style histogram with one series per label value.
+    """
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: Sequence[float]):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        # label value -> (bucket counts, +Inf count, sum)
+        self._series: Dict[str, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float) -> None:
+        """Record one observation."""
+        with self._lock:
+            series = self._series.setdefault(label_value, [[0] * len(self.buckets), 0, 0.0])
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += 1
+            series[2] += value
+
+    def snapshot(self) -> Dict[str, Tuple[List[int], int, float]]:
+        """Copy of every series: (per-bucket counts, total count, sum)."""
+        with self._lock:
+            return {label: (list(counts), count, total) for label, (counts, count, total) in self._series.items()}
+
+    def quantile(self, label_value: str, q: float) -> Optional[float]:
+        """
+        Estimate a quantile from the buckets, interpolating linearly as Prometheus does.
+
+        Args:
+            label_value: The series to read
+            q: Quantile between 0 and 1, e.g. 0.95
+
+        Returns:
+            The estimate, or None when the series has no observations
+        """
+        series = self.snapshot().get(label_value)
+        if not series or not series[1]:
+            return None
+        counts, count, _ = series
+        rank, cumulative, lower = q * count, 0, 0.0
+        for upper, bucket_count in zip(self.buckets, counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+            lower = upper
+        # Beyond the largest bucket
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        """Prometheus text exposition lines for this histogram."""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_value, (counts, count, total) in sorted(self.snapshot().items()):
+            label = f'{self.label}="{_escape(label_value)}"'
+            cumulative = 0
+            for upper, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{label},le="{upper:g}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label}}} {total:.6f}")
+            lines.append(f"{self.name}_count{{{label}}} {count}")
+        return lines
+
+
+class Counter:
+    """
+    Prometheus-style counter with one series per label value.
+    """
+
+    def __init__(self, name: str, help_text: str, label: str):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._values: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value: str, amount: float = 1) -> None:
+        """Add to a series."""
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def value(self, label_value: str) -> float:
+        """Current value of a series."""
+        with self._lock:
+            return self._values.get(label_value, 0)
+
+    def render(self) -> List[str]:
+        """Prometheus text exposition lines for this counter."""
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        lines.extend(f'{self.name}{{{self.label}="{_escape(label)}"}} {value:g}' for label, value in values)
+        return lines
+
+
+class Gauge(Counter):
+    """
+    Prometheus-style gauge with one series per label value.
+    """
+
+    def set(self, label_value: str, value: float) -> None:
+        """Set a series to the current value."""
+        with self._lock:
+            self._values[label_value] = value
+
+    def render(self) -> List[str]:
+        """Prometheus text exposition lines for this gauge."""
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+def _escape(value: str) -> str:
+    """Escape a Prometheus label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# Every series is labelled with the graph node (e.g. historical_story_building)
+NODE_DURATION = Histogram("storyforge_node_duration_seconds", "Wall time of each graph node run.",
+                          "node", DURATION_BUCKETS)
+LLM_DURATION = Histogram("storyforge_llm_call_duration_seconds", "Wall time of each LLM call made by a node.",
+                         "node", DURATION_BUCKETS)
+LLM_INPUT_TOKENS = Histogram("storyforge_llm_input_tokens", "Input tokens of each LLM call made by a node.",
+                             "node", TOKEN_BUCKETS)
+LLM_OUTPUT_TOKENS = Histogram("storyforge_llm_output_tokens", "Output tokens of each LLM call made by a node.",
+                              "node", TOKEN_BUCKETS)
+LLM_RETRIES = Counter("storyforge_llm_retries_total",
+                      "LLM requests retried after a rate limit, timeout or server error.", "node")
+LLM_ERRORS = Counter("storyforge_llm_errors_total", "LLM calls that failed.", "node")
+NODE_ERRORS = Counter("storyforge_node_errors_total", "Graph node runs that raised an exception.", "node")
+
+# Job queue series are labelled with the queue name (see utils.job_queue)
+JOB_QUEUE_DEPTH = Gauge("storyforge_job_queue_depth", "Jobs waiting for a worker.", "queue")
+JOB_RUNNING = Gauge("storyforge_jobs_running", "Jobs being run by a worker.", "queue")
+JOB_WAIT = Histogram("storyforge_job_wait_seconds", "Time jobs spent queued before a worker picked them up.",
+                     "queue", DURATION_BUCKETS)
+JOB_REJECTED = Counter("storyforge_jobs_rejected_total", "Jobs refused by admission control.", "queue")
+STORY_REQUESTS = Counter("storyforge_story_requests_total",
+                         "Story requests by where the result came from: cache, joined (an identical request "
+                         "in flight) or new.", "source")
+
+NARRATION_CHUNKS = Counter("storyforge_narration_chunks_total",
+                           "Narration audio chunks by where they came from: cache or synthesized.", "source")
+
+STRUCTURED_OUTPUT_REPAIRED = Counter("storyforge_structured_output_repaired_total",
+                                     "LLM responses that parsed only after JSON repair (fences, trailing commas, "
+                                     "truncation).", "node")
+STRUCTURED_OUTPUT_FAILURES = Counter("storyforge_structured_output_failures_total",
+                                     "LLM responses that could not be parsed into their schema.", "node")
+CRITIC_ROUTES = Counter("storyforge_critic_routes_total",
+                        "Critic evaluations by routing decision: fast (kept the fast model's verdict) or the "
+                        "reason it was escalated to the reasoning model.", "decision")
+
+_METRICS = (NODE_DURATION, LLM_DURATION, LLM_INPUT_TOKENS, LLM_OUTPUT_TOKENS, LLM_RETRIES, LLM_ERRORS, NODE_ERRORS,
+            JOB_QUEUE_DEPTH, JOB_RUNNING, JOB_WAIT, JOB_REJECTED, STORY_REQUESTS, NARRATION_CHUNKS,
+            STRUCTURED_OUTPUT_REPAIRED, STRUCTURED_OUTPUT_FAILURES, CRITIC_ROUTES)
+
+
+def render_prometheus() -> str:
+    """
+    Render every metric in the Prometheus text exposition format.
+
+    Returns:
+        The /metrics response body
+    """
+    return "\n".join(line for metric in _METRICS for line in metric.render()) + "\n"
+
+
+# Node of the LLM call in flight in the current context (thread or task), for the HTTP-level retry hook
+_current_llm_node: ContextVar[Optional[str]] = ContextVar("llm_node", default=None)
+
+
+def _will_retry(response) -> bool:
+    """Whether the OpenAI client retries after this response, following its own rules."""
+    should_retry = response.headers.get("x-should-retry")
+    if should_retry in ("true", "false"):
+        retryable = should_retry == "true"
+    else:
+        retryable = response.status_code in RETRYABLE_STATUS_CODES or response.status_code >= 500
+    # The client numbers its attempts in this header; the last one is not retried
+    retries_taken = int(response.request.headers.get("x-stainless-retry-count", "0") or 0)
+    return retryable and retries_taken < LLM_MAX_RETRIES
+
+
+def record_llm_retry(response) -> None:
+    """
+    httpx response hook: count the responses the OpenAI client is about to retry.
+
+    The node comes from the LLM call running in the current context (see utils.metrics_callbacks).
+
+    Args:
+        response: The httpx response
+    """
+    if _will_retry(response):
+        LLM_RETRIES.inc(_current_llm_node.get() or "unknown")
+
+
+async def arecord_llm_retry(response) -> None:
+    """Async httpx response hook, see record_llm_retry."""
+    record_llm_retry(response)
+
+
+def get_metrics_callbacks() -> List[Any]:
+    """
+    Return the callback handlers to attach to a workflow run.
+
+    Returns:
+        The shared metrics handler, or an empty list when METRICS_ENABLED is off
+    """
+    if not METRICS_ENABLED:
+        return []
+    # langchain_core is slow to import; only the workflows need the handler
+    from utils.metrics_callbacks import metrics_handler
+    return [metrics_handler]
+
+
+def metrics_summary() -> Tuple[List[str], List[List[Any]]]:
+    """
+    Summarize the metrics per node for the app's Agent Workflow tab.
+
+    Returns:
+        Tuple of (column headers, one row per node)
+    """
+    headers = ["Node", "Runs", "p50 (s)", "p95 (s)", "LLM calls", "LLM time (s)",
+               "Input tokens", "Output tokens", "Retries", "Errors"]
+    node_runs = NODE_DURATION.snapshot()
+    llm_calls = LLM_DURATION.snapshot()
+    input_tokens = LLM_INPUT_TOKENS.snapshot()
+    output_tokens = LLM_OUTPUT_TOKENS.snapshot()
+
+    def rounded(value):
+        return round(value, 2) if value is not None else None
+
+    rows = []
+    for node in sorted(set(node_runs) | set(llm_calls)):
+        rows.append([
+            node,
+            node_runs.get(node, (None, 0))[1],
+            rounded(NODE_DURATION.quantile(node, 0.5)),
+            rounded(NODE_DURATION.quantile(node, 0.95)),
+            llm_calls.get(node, (None, 0))[1],
+            round(llm_calls.get(node, (None, 0, 0.0))[2], 2),
+            int(input_tokens.get(node, (None, 0, 0))[2]),
+            int(output_tokens.get(node, (None, 0, 0))[2]),
+            int(LLM_RETRIES.value(node)),
+            int(NODE_ERRORS.value(node) + LLM_ERRORS.value(node))
+        ])
+    return headers, rows
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the console
+        pass
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """
+    Serve /metrics in the Prometheus text format from a background thread.
+
+    Args:
+        port: Port to listen on
+        host: Interface to bind
+
+    Returns:
+        The running server
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"📈 Metrics available at http://{host}:{port}/metrics")
+    return server
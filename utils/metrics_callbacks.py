@@ -0,0 +1,90 @@
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from utils.llm_usage import usage_from_response
+from utils.metrics import (
+    LLM_DURATION,
+    LLM_ERRORS,
+    LLM_INPUT_TOKENS,
+    LLM_OUTPUT_TOKENS,
+    LLM_RETRIES,
+    NODE_DURATION,
+    NODE_ERRORS,
+    _current_llm_node,
+)
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    LangChain callback handler recording node and LLM metrics.
+
+    Node runs are recognised by LangGraph's "langgraph_node" metadata; LLM
+    calls made inside a node (including from worker threads) inherit it.
+    """
+
+    # Called in the caller's context even on async runs, so the retry hook sees the node it sets
+    run_inline = True
+
+    def __init__(self):
+        self._started: Dict[Any, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, node: str) -> None:
+        with self._lock:
+            self._started[run_id] = (node, time.perf_counter())
+
+    def _finish(self, run_id) -> Tuple[Optional[str], float]:
+        with self._lock:
+            node, started = self._started.pop(run_id, (None, 0.0))
+        return node, time.perf_counter() - started
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        # The node's own run, rather than a runnable nested inside it
+        if node and kwargs.get("name") == node:
+            self._start(run_id, node)
+
+    def on_chain_end(self, outputs, *, run_id, parent_run_id=None, **kwargs):
+        node, elapsed = self._finish(run_id)
+        if node:
+            NODE_DURATION.observe(node, elapsed)
+
+    def on_chain_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        node, elapsed = self._finish(run_id)
+        if node:
+            NODE_DURATION.observe(node, elapsed)
+            NODE_ERRORS.inc(node)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, tags=None, metadata=None,
+                            **kwargs):
+        node = (metadata or {}).get("langgraph_node", "unknown")
+        self._start(run_id, node)
+        _current_llm_node.set(node)
+
+    def on_retry(self, retry_state, *, run_id, parent_run_id=None, **kwargs):
+        with self._lock:
+            node = self._started.get(run_id, ("unknown",))[0]
+        LLM_RETRIES.inc(node)
+
+    def on_llm_end(self, response, *, run_id, parent_run_id=None, **kwargs):
+        node, elapsed = self._finish(run_id)
+        if not node:
+            return
+        LLM_DURATION.observe(node, elapsed)
+        generations = [generation for batch in response.generations for generation in batch]
+        if generations and getattr(generations[0], "message", None) is not None:
+            usage = usage_from_response(generations[0].message, node)
+            LLM_INPUT_TOKENS.observe(node, usage["input_tokens"])
+            LLM_OUTPUT_TOKENS.observe(node, usage["output_tokens"])
+
+    def on_llm_error(self, error, *, run_id, parent_run_id=None, **kwargs):
+        node, elapsed = self._finish(run_id)
+        if node:
+            LLM_DURATION.observe(node, elapsed)
+            LLM_ERRORS.inc(node)
+
+
+metrics_handler = MetricsCallbackHandler()
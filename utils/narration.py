@@ -0,0 +1,350 @@
+import array
+import contextlib
+import functools
+import hashlib
+import io
+import math
+import os
+import re
+import threading
+import time
+import wave
+import zlib
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+# Import from config
+from config import (
+    LLM_MAX_RETRIES,
+    LLM_REQUEST_TIMEOUT,
+    NARRATION_BACKEND,
+    NARRATION_CACHE_DIR,
+    NARRATION_CHUNK_MAX_CHARS,
+    NARRATION_MAX_CONCURRENCY,
+    NARRATION_OUTPUT_DIR,
+    NARRATION_PARAGRAPH_PAUSE_MS,
+    NARRATION_TTS_MODEL,
+    NARRATION_WORDS_PER_MINUTE,
+    OPENAI_API_KEY,
+)
+from utils.metrics import NARRATION_CHUNKS
+
+# Voice choices of the Audio tab -> OpenAI speech voices
+VOICES = {
+    "Male - Deep": "onyx",
+    "Male - Neutral": "echo",
+    "Female - Warm": "nova",
+    "Female - Professional": "shimmer",
+    "Child": "fable",
+}
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+")
+# Markdown the story may contain that should not be read out: heading marks and emphasis
+_MARKDOWN = re.compile(r"^#{1,6}\s*|(?<!\S)[*_]{1,3}(?=\S)|(?<=\S)[*_]{1,3}(?![\w*])", re.MULTILINE)
+
+
+class TTSBackend(ABC):
+    """
+    Text-to-speech engine used by the Narrator.
+
+    Backends return raw little-endian 16-bit mono PCM at their sample_rate;
+    the Narrator takes care of chunking, caching, concurrency and the WAV file.
+    """
+
+    name = "base"
+    sample_rate = 24000
+
+    @abstractmethod
+    def synthesize(self, text: str, voice: str) -> bytes:
+        """
+        Synthesize one chunk of text.
+
+        Args:
+            text: Text to speak, at most NARRATION_CHUNK_MAX_CHARS long
+            voice: Backend voice name
+
+        Returns:
+            16-bit mono PCM frames
+        """
+
+
+class OpenAISpeechBackend(TTSBackend):
+    """TTS through the OpenAI speech API, on the shared HTTP connection pool."""
+
+    name = "openai"
+    sample_rate = 24000  # The API's "pcm" format: 24 kHz, 16-bit, mono
+
+    def __init__(self, model: str = NARRATION_TTS_MODEL):
+        import openai
+        from utils.llm_factory import get_http_client
+
+        self.model = model
+        self.client = openai.OpenAI(api_key=OPENAI_API_KEY, http_client=get_http_client(),
+                                    timeout=LLM_REQUEST_TIMEOUT, max_retries=LLM_MAX_RETRIES)
+
+    def synthesize(self, text: str, voice: str) -> bytes:
+        response = self.client.audio.speech.create(model=self.model, voice=voice, input=text,
+                                                   response_format="pcm")
+        return response.content
+
+
+class OfflineToneBackend(TTSBackend):
+    """
+    Offline stand-in engine for tests, benchmarks and air-gapped runs.
+
+    Each word becomes a short tone whose pitch depends on the word and the
+    voice, timed at NARRATION_WORDS_PER_MINUTE, so the output is
+    deterministic and as long as the real narration would be.
+    """
+
+    name = "offline"
+    sample_rate = 16000
+
+    def __init__(self, latency_seconds: float = 0.0):
+        """
+        Initialize the engine.
+
+        Args:
+            latency_seconds: Delay added to every chunk, to simulate a remote engine
+        """
+        self.latency_seconds = latency_seconds
+
+    @staticmethod
+    @functools.lru_cache(maxsize=256)
+    def _period(frequency: int, sample_rate: int) -> bytes:
+        """PCM of one period of a sine tone."""
+        samples = max(2, sample_rate // frequency)
+        return array.array("h", (int(3000 * math.sin(2 * math.pi * i / samples)) for i in range(samples))).tobytes()
+
+    def synthesize(self, text: str, voice: str) -> bytes:
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        word_samples = int(self.sample_rate * 60 / NARRATION_WORDS_PER_MINUTE)
+        gap = b"\x00\x00" * (word_samples // 5)
+        base = 110 + zlib.crc32(voice.encode("utf-8")) % 110
+        frames = []
+        for word in text.split():
+            period = self._period(base + zlib.crc32(word.lower().encode("utf-8")) % 220, self.sample_rate)
+            tone_bytes = (word_samples - word_samples // 5) * 2
+            frames.append((period * (tone_bytes // len(period) + 1))[:tone_bytes])
+            frames.append(gap)
+        return b"".join(frames)
+
+
+def narration_chunks(text: str, max_chars: int = NARRATION_CHUNK_MAX_CHARS) -> List[str]:
+    """
+    Split a story into the chunks synthesized on their own.
+
+    Every paragraph is a chunk, so editing one paragraph changes only its
+    chunk; paragraphs longer than max_chars are split between sentences.
+    Markdown heading marks and emphasis are removed.
+
+    Args:
+        text: The story (or script) text
+        max_chars: Longest chunk sent to the TTS engine
+
+    Returns:
+        Chunks in reading order
+    """
+    chunks = []
+    for paragraph in _PARAGRAPH_BREAK.split(text.strip()):
+        paragraph = " ".join(_MARKDOWN.sub("", paragraph).split())
+        if not paragraph:
+            continue
+        # A heading reads better followed by a pause
+        if paragraph[-1].isalnum():
+            paragraph += "."
+        if len(paragraph) <= max_chars:
+            chunks.append(paragraph)
+            continue
+        current = ""
+        for sentence in _SENTENCE_BREAK.split(paragraph):
+            if current and len(current) + 1 + len(sentence) > max_chars:
+                chunks.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}" if current else sentence
+        if current:
+            chunks.append(current)
+    return chunks
+
+
+class Narrator:
+    """
+    Narrate stories into WAV files with a TTSBackend.
+
+    Chunks are synthesized concurrently on a bounded worker pool and cached on
+    disk by hash of (backend, voice, text), so re-narrating an edited story
+    only synthesizes the chunks that changed. Finished chunks are streamed, in
+    order, into an in-memory WAV buffer that is written out in one go, one
+    narration of a given text and voice at a time.
+    """
+
+    def __init__(self, backend: TTSBackend, cache_dir: str = NARRATION_CACHE_DIR,
+                 output_dir: str = NARRATION_OUTPUT_DIR, max_workers: int = NARRATION_MAX_CONCURRENCY,
+                 pause_ms: int = NARRATION_PARAGRAPH_PAUSE_MS):
+        """
+        Initialize the narrator.
+
+        Args:
+            backend: The TTS engine
+            cache_dir: Directory of the per-chunk audio cache
+            output_dir: Directory the narrations are written to
+            max_workers: Chunks synthesized at the same time
+            pause_ms: Silence between chunks
+        """
+        self.backend = backend
+        self.cache_dir = cache_dir
+        self.output_dir = output_dir
+        self.max_workers = max(1, max_workers)
+        self.pause = b"\x00\x00" * (backend.sample_rate * pause_ms // 1000)
+        # Output path -> [lock, narrations holding or waiting for it], so identical narrations
+        # requested together are written once; entries go away with their last narration
+        self._path_locks: Dict[str, list] = {}
+        self._path_locks_guard = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        os.makedirs(output_dir, exist_ok=True)
+
+    def chunk_key(self, text: str, voice: str) -> str:
+        """Cache key of a chunk's audio."""
+        raw = "\x1f".join([self.backend.name, str(self.backend.sample_rate), voice, text])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _cache_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pcm")
+
+    def _chunk_audio(self, text: str, voice: str, key: str) -> Tuple[bytes, bool]:
+        """
+        Audio of one chunk, from the cache or the backend.
+
+        Returns:
+            Tuple of (PCM frames, whether it came from the cache)
+        """
+        path = self._cache_path(key)
+        try:
+            with open(path, "rb") as f:
+                frames = f.read()
+            NARRATION_CHUNKS.inc("cache")
+            return frames, True
+        except FileNotFoundError:
+            pass
+
+        frames = self.backend.synthesize(text, voice)
+        # Renamed into place, so a concurrent narration never reads a partial chunk
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(frames)
+        os.replace(tmp_path, path)
+        NARRATION_CHUNKS.inc("synthesized")
+        return frames, False
+
+    def narrate(self, text: str, voice: str = "echo",
+                progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """
+        Narrate a story into a WAV file.
+
+        Args:
+            text: The story text
+            voice: Voice name, or one of the Audio tab's choices (see VOICES)
+            progress: Called with (chunks written, total chunks) as the file is written
+
+        Returns:
+            Dictionary with the WAV path, chunk counts (total, synthesized, cached),
+            the audio duration and the wall time in seconds
+        """
+        started = time.perf_counter()
+        voice = VOICES.get(voice, voice)
+        chunks = narration_chunks(text)
+        keys = [self.chunk_key(chunk, voice) for chunk in chunks]
+        narration_key = hashlib.sha256("".join(keys).encode("utf-8")).hexdigest()[:16]
+        path = os.path.join(self.output_dir, f"narration-{narration_key}.wav")
+        result = {"path": path, "chunks": len(chunks), "synthesized": 0, "cached": len(chunks)}
+
+        with self._path_lock(path):
+            if not os.path.exists(path):
+                result.update(self._write_wav(path, chunks, keys, voice, progress))
+            elif progress:
+                progress(len(chunks), len(chunks))
+
+        with wave.open(path, "rb") as wav:
+            result["audio_seconds"] = round(wav.getnframes() / wav.getframerate(), 1)
+        result["seconds"] = round(time.perf_counter() - started, 3)
+        return result
+
+    @contextlib.contextmanager
+    def _path_lock(self, path: str) -> Iterator[None]:
+        """Hold the lock serializing narrations into one output path."""
+        with self._path_locks_guard:
+            entry = self._path_locks.setdefault(path, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._path_locks_guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._path_locks[path]
+
+    def _write_wav(self, path: str, chunks: List[str], keys: List[str], voice: str,
+                   progress: Optional[Callable[[int, int], None]]) -> Dict[str, int]:
+        """Synthesize or load every chunk, stream them in order into an in-memory WAV and write it out."""
+        counts = {"synthesized": 0, "cached": 0}
+        buffer = io.BytesIO()
+        # Chunks are fetched at most this far ahead of the one being written
+        ahead = self.max_workers * 2
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="narration") as executor, \
+                wave.open(buffer, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(self.backend.sample_rate)
+
+            window: "deque[Future]" = deque()
+            for index in range(min(ahead, len(chunks))):
+                window.append(executor.submit(self._chunk_audio, chunks[index], voice, keys[index]))
+            for index in range(len(chunks)):
+                frames, cached = window.popleft().result()
+                following = index + len(window) + 1
+                if following < len(chunks):
+                    window.append(executor.submit(self._chunk_audio, chunks[following], voice, keys[following]))
+
+                counts["cached" if cached else "synthesized"] += 1
+                if index:
+                    wav.writeframes(self.pause)
+                wav.writeframes(frames)
+                if progress:
+                    progress(index + 1, len(chunks))
+
+        try:
+            with open(path, "wb") as f:
+                f.write(buffer.getbuffer())
+        except BaseException:
+            # Never leave a partial narration behind to be reused as the finished one
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+        return counts
+
+
+_narrator: Optional[Narrator] = None
+_narrator_lock = threading.Lock()
+
+
+def get_narrator() -> Narrator:
+    """
+    Return the process-wide narrator, creating its backend on first use.
+
+    Returns:
+        Narrator using the NARRATION_BACKEND engine ("openai" or "offline")
+    """
+    global _narrator
+    if _narrator is None:
+        with _narrator_lock:
+            if _narrator is None:
+                backend = OpenAISpeechBackend() if NARRATION_BACKEND == "openai" else OfflineToneBackend()
+                _narrator = Narrator(backend)
+    return _narrator
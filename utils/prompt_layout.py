@@ -0,0 +1,61 @@
+from typing import Any, Dict, List
+
+from langchain_core.messages import SystemMessage
+
+from utils.research_context import get_research_context
+
+# Prompts are laid out for provider-side prefix caching: every prompt of a story
+# starts with the same story brief, followed by the agent's fixed instructions and
+# the outline, and only then the parts that change between calls (the chapter being
+# written, the iteration, feedback and drafts). Calls in the revision loop, and
+# nodes that share a model, can then reuse the cached prefix.
+
+
+def story_brief_message(state: Dict[str, Any]) -> SystemMessage:
+    """
+    Build the message that opens every story prompt.
+
+    It only holds values that stay fixed for the whole story, so it is a
+    byte-identical prefix across nodes and iterations.
+
+    Args:
+        state: Current state with the user request and research context
+
+    Returns:
+        System message with the user request and the research context
+    """
+    return SystemMessage(content=f"""STORY BRIEF
+
+USER REQUEST: {state.get("prompt", "")}
+STORY TYPE: {state.get("story_type", "Historical")}
+STORY LENGTH: {state.get("length", "Medium")}
+STYLE: {state.get("style", "Classic storytelling")}
+
+HISTORICAL RESEARCH:
+{get_research_context(state)}
+""")
+
+
+def outline_text(chapters: List[Dict]) -> str:
+    """
+    Format the chapter outline and its cast for a prompt.
+
+    Args:
+        chapters: The chapter outline
+
+    Returns:
+        One line per chapter followed by the main characters
+    """
+    lines = [f"Chapter {i + 1}: {chapter['title']} - {chapter['description']}" for i, chapter in enumerate(chapters)]
+
+    # Every prompt sees the same cast so names and roles stay consistent
+    characters = []
+    for chapter in chapters:
+        for character in chapter.get("characters", []):
+            if character not in characters:
+                characters.append(character)
+    if characters:
+        lines.append("\nMAIN CHARACTERS:")
+        lines.extend(f"- {character}" for character in characters)
+
+    return "\n".join(lines)
@@ -0,0 +1,115 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, FrozenSet, List, Tuple
+
+_WORD = re.compile(r"[a-z0-9]+")
+_NUMBER = re.compile(r"\d+")
+
+# Question words and fillers that say nothing about the topic being researched
+_STOPWORDS = frozenset("""
+a an the of in on at to for from by with about into during over under and or but
+what which who whom whose when where why how was were is are be been being did do does
+had has have there their they them it its this that these those as like such some any
+much many more most other can could would should will shall may might must please
+people person
+""".split())
+
+# Stems of words that ask about the same thing in different words ("daily life" vs "live day to day")
+_VARIANTS = {"daily": "day", "everyday": "day", "lif": "liv", "roman": "rom"}
+
+
+def _stem(token: str) -> str:
+    """Strip the most common English suffixes so plural and tense variants compare equal."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    for suffix in ("ing", "ed", "s"):
+        if len(token) > len(suffix) + 2 and token.endswith(suffix) and not token.endswith("ss"):
+            token = token[:-len(suffix)]
+            break
+    # "live", "lived" and "living" all reduce to "liv"
+    if len(token) > 3 and token.endswith("e"):
+        token = token[:-1]
+    return _VARIANTS.get(token, token)
+
+
+def shingles(question: str, size: int = 1) -> FrozenSet[str]:
+    """
+    Break a question into a set of word shingles.
+
+    Args:
+        question: The question text
+        size: Number of consecutive content words per shingle
+
+    Returns:
+        Set of shingles built from the stemmed, stopword-free tokens
+    """
+    tokens = [_stem(token) for token in _WORD.findall(question.lower()) if token not in _STOPWORDS]
+    if len(tokens) < size:
+        return frozenset([" ".join(tokens)]) if tokens else frozenset()
+    return frozenset(" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1))
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """Jaccard similarity of two shingle sets."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def weighted_jaccard(a: FrozenSet[str], b: FrozenSet[str], weights: Dict[str, float]) -> float:
+    """Jaccard similarity of two shingle sets, with each shingle counted at its weight."""
+    if not a or not b:
+        return 0.0
+    union = sum(weights[shingle] for shingle in a | b)
+    return sum(weights[shingle] for shingle in a & b) / union if union else 0.0
+
+
+def collapse_near_duplicates(questions: List[str], threshold: float,
+                             shingle_size: int = 1) -> Tuple[List[str], List[int]]:
+    """
+    Merge questions whose weighted shingle sets overlap by at least the threshold.
+
+    Runs locally with no network calls. Shingles are weighted by how rare they
+    are among the questions (inverse document frequency), so the context every
+    question shares ("ancient", "rome") counts for little and the word that
+    tells two questions apart ("women" vs "slaves") counts for a lot.
+    Questions mentioning different numbers (years, legions) are never merged.
+    A story has only a handful of questions, so exact pairwise comparison is
+    cheaper than a MinHash sketch.
+
+    Args:
+        questions: Questions in generation order
+        threshold: Minimum weighted Jaccard similarity for two questions to be merged
+        shingle_size: Number of consecutive content words per shingle
+
+    Returns:
+        Tuple of (unique questions to research, index into the unique list for every input question)
+    """
+    question_shingles = [shingles(question, shingle_size) for question in questions]
+    frequencies = Counter(shingle for shingle_set in question_shingles for shingle in shingle_set)
+    weights = {shingle: math.log(1 + len(questions) / count) for shingle, count in frequencies.items()}
+    numbers = [frozenset(_NUMBER.findall(question)) for question in questions]
+
+    unique_questions: List[str] = []
+    unique_indices: List[int] = []
+    assignments: List[int] = []
+
+    for position, question in enumerate(questions):
+        best_index, best_score = -1, 0.0
+        for index, candidate in enumerate(unique_indices):
+            if numbers[position] != numbers[candidate]:
+                continue
+            score = weighted_jaccard(question_shingles[position], question_shingles[candidate], weights)
+            if score > best_score:
+                best_index, best_score = index, score
+
+        if best_index >= 0 and best_score >= threshold:
+            print(f"🔁 Merged question: {question} -> {unique_questions[best_index]} ({best_score:.2f})")
+            assignments.append(best_index)
+        else:
+            unique_questions.append(question)
+            unique_indices.append(position)
+            assignments.append(len(unique_questions) - 1)
+
+    return unique_questions, assignments
@@ -1,14 +1,16 @@
 from typing import Dict, List, Any
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+from langchain_core.messages import HumanMessage, SystemMessage
 
 # Import from config
 import os
 import sys
 
 from config import MODEL_NAME_REASONING
+from utils.llm_factory import get_chat_model
+from utils.llm_usage import record_llm_usage, tracks_llm_usage
 
 
+@tracks_llm_usage
 def generate_research_questions_dynamic(state):
     """
     Here we dynamically generate research questions based on the story prompt uing a reasoning model, gpt-o1-mini
@@ -19,7 +21,7 @@ def generate_research_questions_dynamic(state):
     Returns:
         Updated state with research questions
     """ 
-    llm_reasoning = ChatOpenAI(model = MODEL_NAME_REASONING)
+    llm_reasoning = get_chat_model("openai", MODEL_NAME_REASONING)
 
     # Extract the information of the prompt
     prompt= state.get("prompt", "")
@@ -29,8 +31,9 @@ def generate_research_questions_dynamic(state):
     print(story_type)
 
     # Create a prompt to generate research questions
-    question_prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a historical researcher helping to create an accurate historical story.
+    # Built from messages so braces in the user's prompt are kept verbatim; the prompt itself goes last
+    question_prompt = [
+            SystemMessage(content="""You are a historical researcher helping to create an accurate historical story.
     Generate 4-6 specific research questions that will be essential for creating an accurate and
     engaging historical story based on the user's request.
     
@@ -42,15 +45,16 @@ def generate_research_questions_dynamic(state):
     
     Formulate clear, specific questions that can be answered through research.
     """),
-            ("user", f"""Generate research questions for a historical story based on this prompt:
-    STORY PROMPT: {prompt}
-    
+            HumanMessage(content=f"""Generate research questions for a historical story based on the prompt below.
     Return only the questions, one per line, with no preamble or explanation.
     Each question should be direct and specific, appropriate for a search engine or historical database.
+    
+    STORY PROMPT: {prompt}
     """)
-        ])
+        ]
     # Generate questions
-    response = llm.invoke(question_prompt)
+    response = llm_reasoning.invoke(question_prompt)
+    record_llm_usage(response, "historical_research_questions")
 
     # Parse the response into a list of questions
     questions = [q.strip() for q in response.content.strip().split('\n') if q.strip()]
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Import from config
+from config import RESEARCH_CACHE_ENABLED, RESEARCH_CACHE_MAX_ENTRIES, RESEARCH_CACHE_PATH, RESEARCH_CACHE_TTL_SECONDS
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalize a research question so trivial variations share a cache entry.
+
+    Args:
+        question: The raw question text
+
+    Returns:
+        Lower-cased question with collapsed whitespace and no trailing punctuation
+    """
+    return _WHITESPACE.sub(" ", question).strip().lower().rstrip("?.!").strip()
+
+
+class ResearchCache:
+    """
+    Disk-backed cache of research answers with a TTL and size-bounded LRU eviction.
+
+    Entries are keyed on the normalized question, the model name and the
+    system message. The cache is safe to share between the research worker threads.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int):
+        """Open (or create) the cache database."""
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS research_cache (
+                    key TEXT PRIMARY KEY,
+                    question TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    citations TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS research_cache_accessed_at ON research_cache (accessed_at)"
+            )
+
+    @staticmethod
+    def make_key(question: str, model: str, system_message: str) -> str:
+        """Build the cache key for a question asked to a model with a system message."""
+        raw = "\x1f".join([normalize_question(question), model, system_message])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, question: str, model: str, system_message: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached answer.
+
+        Args:
+            question: The research question
+            model: The model the answer was produced by
+            system_message: The system message sent with the question
+
+        Returns:
+            Research result entry, or None on a miss or an expired entry
+        """
+        key = self.make_key(question, model, system_message)
+        now = time.time()
+
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT answer, citations, created_at FROM research_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None or now - row[2] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM research_cache WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE research_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+
+        return {
+            "question": question,
+            "answer": row[0],
+            "citations": json.loads(row[1])
+        }
+
+    def set(self, question: str, model: str, system_message: str, answer: str, citations: List[Any]) -> None:
+        """
+        Store an answer and evict the least recently used entries beyond max_entries.
+
+        Args:
+            question: The research question
+            model: The model the answer was produced by
+            system_message: The system message sent with the question
+            answer: The answer text
+            citations: The citations returned with the answer
+        """
+        key = self.make_key(question, model, system_message)
+        now = time.time()
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO research_cache VALUES (?, ?, ?, ?, ?, ?)",
+                (key, question, answer, json.dumps(citations, default=str), now, now)
+            )
+            self._conn.execute(
+                """DELETE FROM research_cache WHERE key IN (
+                    SELECT key FROM research_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )""",
+                (self.max_entries,)
+            )
+
+    def purge_expired(self) -> int:
+        """Delete every expired entry and return how many were removed."""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM research_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+        return cursor.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the hit/miss counters and the current number of entries."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM research_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries
+        }
+
+
+_research_cache: Optional[ResearchCache] = None
+_research_cache_lock = threading.Lock()
+
+
+def get_research_cache() -> Optional[ResearchCache]:
+    """
+    Return the process-wide research cache, opening it and purging expired entries on first use.
+
+    Returns:
+        The shared ResearchCache, or None when caching is disabled in config
+    """
+    global _research_cache
+    if not RESEARCH_CACHE_ENABLED:
+        return None
+    if _research_cache is None:
+        with _research_cache_lock:
+            if _research_cache is None:
+                cache = ResearchCache(
+                    RESEARCH_CACHE_PATH,
+                    ttl_seconds=RESEARCH_CACHE_TTL_SECONDS,
+                    max_entries=RESEARCH_CACHE_MAX_ENTRIES
+                )
+                # Expired entries are otherwise only dropped when looked up again
+                purged = cache.purge_expired()
+                if purged:
+                    print(f"🧹 Research cache: {purged} expired entries purged")
+                _research_cache = cache
+    return _research_cache
@@ -0,0 +1,259 @@
+import math
+import re
+from collections import Counter
+from typing import Any, Dict, List, Tuple
+
+# Import from config
+from config import RESEARCH_CONTEXT_TOKEN_BUDGET, RESEARCH_FACT_DEDUP_THRESHOLD
+from utils.question_dedup import jaccard, shingles
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(\[])")
+_CITATION_REF = re.compile(r"\[(\d+)\]")
+# A reference with the spaces before it, so a dropped one leaves no gap ("often [7]." -> "often.")
+_SPACED_CITATION_REF = re.compile(r"(\s*)\[(\d+)\]")
+# Rounds of shrinking the facts' budget until headers and sources fit too
+_MAX_FIT_ROUNDS = 5
+_MARKDOWN = re.compile(r"^\s*(?:#+|[-*•]|\d+\.)\s*")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for English text (about four characters per token)."""
+    return max(1, len(text) // 4)
+
+
+def normalize_research_results(research_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Bring research entries to the {question, answer, citations} shape and drop failed ones.
+
+    Accepts the entries produced by perplexity_search as well as the older
+    {topic, result} shape.
+
+    Args:
+        research_results: Raw research entries
+
+    Returns:
+        Normalized entries
+    """
+    normalized = []
+    for item in research_results or []:
+        if item.get("error"):
+            continue
+        question = item.get("question") or item.get("topic") or ""
+        answer = item.get("answer") or item.get("result") or ""
+        if not answer.strip():
+            continue
+        normalized.append({
+            "question": question,
+            "answer": answer,
+            "citations": [str(citation) for citation in item.get("citations") or []]
+        })
+    return normalized
+
+
+def _split_sentences(answer: str) -> List[str]:
+    """Split an answer into sentences, dropping markdown bullets and headings."""
+    sentences = []
+    for line in answer.splitlines():
+        line = _MARKDOWN.sub("", line).replace("**", "").strip()
+        if line:
+            sentences.extend(sentence.strip() for sentence in _SENTENCE_END.split(line) if sentence.strip())
+    return sentences
+
+
+def _collect_facts(results: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Gather the sentences of every answer, renumbering citations and dropping repeated facts.
+
+    Args:
+        results: Normalized research entries
+
+    Returns:
+        Tuple of (facts in answer order, de-duplicated citation list)
+    """
+    citations: List[str] = []
+    citation_numbers: Dict[str, int] = {}
+    facts: List[Dict[str, Any]] = []
+    kept_shingles = []
+
+    for result_index, result in enumerate(results):
+        # Map this answer's local [n] references onto one shared, de-duplicated source list
+        local_to_global = {}
+        for local_number, citation in enumerate(result["citations"], start=1):
+            if citation not in citation_numbers:
+                citations.append(citation)
+                citation_numbers[citation] = len(citations)
+            local_to_global[str(local_number)] = str(citation_numbers[citation])
+
+        for sentence in _split_sentences(result["answer"]):
+            # A reference without a citation in its own answer would point at another answer's source
+            sentence = _SPACED_CITATION_REF.sub(
+                lambda match: f"{match.group(1)}[{local_to_global[match.group(2)]}]"
+                if match.group(2) in local_to_global else "",
+                sentence
+            )
+            sentence_shingles = shingles(_CITATION_REF.sub("", sentence))
+            if not sentence_shingles:
+                continue
+            # The same fact often comes back from several questions
+            if any(jaccard(sentence_shingles, kept) >= RESEARCH_FACT_DEDUP_THRESHOLD for kept in kept_shingles):
+                continue
+            kept_shingles.append(sentence_shingles)
+            facts.append({"result": result_index, "text": sentence, "shingles": sentence_shingles})
+
+    return facts, citations
+
+
+def _select_facts(facts: List[Dict[str, Any]], results: List[Dict[str, Any]], token_budget: int) -> List[Dict]:
+    """
+    Extractive summary: keep the most informative facts that fit in the token budget.
+
+    Facts are scored by how common their words are across all the research
+    (a centrality measure) plus their overlap with the question they answer,
+    normalized by length. The selection is returned in the original order.
+
+    Args:
+        facts: Facts from _collect_facts
+        results: Normalized research entries
+        token_budget: Maximum tokens for the selected facts
+
+    Returns:
+        The selected facts, in answer order
+    """
+    if sum(estimate_tokens(fact["text"]) for fact in facts) <= token_budget:
+        return facts
+
+    frequencies = Counter(shingle for fact in facts for shingle in fact["shingles"])
+    question_shingles = [shingles(result["question"]) for result in results]
+
+    def score(fact):
+        centrality = sum(frequencies[shingle] for shingle in fact["shingles"])
+        relevance = 2 * len(fact["shingles"] & question_shingles[fact["result"]])
+        return (centrality + relevance) / math.sqrt(len(fact["shingles"]))
+
+    selected, used = set(), 0
+    # Make sure every question keeps its best fact before filling the rest by score
+    by_result: Dict[int, List[int]] = {}
+    for index, fact in enumerate(facts):
+        by_result.setdefault(fact["result"], []).append(index)
+    ranked = [max(indices, key=lambda i: score(facts[i])) for indices in by_result.values()]
+    ranked += sorted(range(len(facts)), key=lambda i: score(facts[i]), reverse=True)
+
+    for index in ranked:
+        if index in selected:
+            continue
+        cost = estimate_tokens(facts[index]["text"])
+        if used + cost > token_budget:
+            continue
+        selected.add(index)
+        used += cost
+
+    return [fact for index, fact in enumerate(facts) if index in selected]
+
+
+def _raw_research_context(results: List[Dict[str, Any]]) -> str:
+    """The answers as they are, each with the sources its own references point at (dangling ones dropped)."""
+    sections = []
+    for result in results:
+        answer = _SPACED_CITATION_REF.sub(
+            lambda match: match.group(0) if 1 <= int(match.group(2)) <= len(result["citations"]) else "",
+            result["answer"].strip()
+        )
+        section = f"RESEARCH ON: {result['question']}\n{answer}"
+        referenced = sorted({int(number) for number in _CITATION_REF.findall(answer)})
+        if referenced:
+            section += "\nSOURCES: " + " ".join(f"[{n}] {result['citations'][n - 1]}" for n in referenced)
+        sections.append(section)
+    return "\n\n".join(sections)
+
+
+def _compact_research_context(results: List[Dict[str, Any]], citations: List[str],
+                              selected: List[Dict[str, Any]]) -> str:
+    """Selected facts grouped by question, followed by the sources they reference."""
+    sections = []
+    for result_index, result in enumerate(results):
+        lines = [f"- {fact['text']}" for fact in selected if fact["result"] == result_index]
+        if lines:
+            sections.append(f"RESEARCH ON: {result['question']}\n" + "\n".join(lines))
+
+    # Only list the sources still referenced after compression
+    referenced = {int(number) for fact in selected for number in _CITATION_REF.findall(fact["text"])}
+    sources = [f"[{number}] {citations[number - 1]}" for number in sorted(referenced) if number <= len(citations)]
+    if sources:
+        sections.append("SOURCES:\n" + "\n".join(sources))
+
+    return "\n\n".join(sections)
+
+
+def format_research_context(research_results: List[Dict[str, Any]],
+                            token_budget: int = RESEARCH_CONTEXT_TOKEN_BUDGET) -> str:
+    """
+    Build the compact research context used by every downstream prompt.
+
+    When the answers already fit in the budget they are used as they are.
+    Otherwise repeated facts are dropped and the most informative ones kept,
+    with the question headers and the source list counted against the budget.
+
+    Args:
+        research_results: Raw research entries
+        token_budget: Maximum tokens for the whole context
+
+    Returns:
+        Research grouped by question, with its sources
+    """
+    results = normalize_research_results(research_results)
+    raw_context = _raw_research_context(results)
+    if estimate_tokens(raw_context) <= token_budget:
+        return raw_context
+
+    facts, citations = _collect_facts(results)
+    # Headers, bullets and sources of the context with every fact; fewer facts need no more
+    full_context = _compact_research_context(results, citations, facts)
+    overhead = estimate_tokens(full_context) - sum(estimate_tokens(fact["text"]) for fact in facts)
+    if estimate_tokens(full_context) <= token_budget:
+        return full_context
+    facts_budget = token_budget - max(0, overhead)
+    context = ""
+    for _ in range(_MAX_FIT_ROUNDS):
+        context = _compact_research_context(results, citations, _select_facts(facts, results, facts_budget))
+        excess = estimate_tokens(context) - token_budget
+        if excess <= 0 or facts_budget <= 0:
+            break
+        # Headers, bullets and sources took the rest; give the facts that much less
+        facts_budget -= excess
+    return context
+
+
+def get_research_context(state: Dict[str, Any]) -> str:
+    """
+    Return the research context stored in the state, building it if the stage has not run.
+
+    Args:
+        state: Current state
+
+    Returns:
+        The compact research context
+    """
+    if state.get("research_context") is None:
+        return format_research_context(state.get("research_results", []))
+    return state["research_context"]
+
+
+def build_research_context(state: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Graph node: compress the research results once per story and store them in the state.
+
+    Args:
+        state: Current state with research results
+
+    Returns:
+        Updated state with research_context
+    """
+    research_context = format_research_context(state.get("research_results", []))
+    # Measured on the answers with their headers and sources, as they would be used uncompressed
+    raw_tokens = estimate_tokens(_raw_research_context(normalize_research_results(state.get("research_results", []))))
+    print(f"📚 Research context: {estimate_tokens(research_context)} tokens (from {raw_tokens})")
+
+    return {
+        **state,
+        "research_context": research_context
+    }
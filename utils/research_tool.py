@@ -1,22 +1,152 @@
-from typing import Dict, List, Any, Optional, TypedDict
+import contextvars
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Any, Optional, Tuple, TypedDict
+from typing_extensions import NotRequired
 from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_community.chat_models import ChatPerplexity
 
 # Import from config and modules
 import os
 import sys
 
-from config import PPLX_API_KEY, PPLX_MODEL_NAME
+from config import PPLX_MODEL_NAME, QUESTION_DEDUP_THRESHOLD, RESEARCH_MAX_CONCURRENCY, RESEARCH_QUESTION_TIMEOUT
+from utils.llm_factory import get_chat_model
+from utils.llm_usage import record_llm_usage, tracks_llm_usage
 from utils.question_generator import generate_research_questions_dynamic
+from utils.question_dedup import collapse_near_duplicates
+from utils.research_cache import ResearchCache, get_research_cache
 
 class ResearchResult(TypedDict):
     question: str
     answer: str
     citations: List[Any]
+    error: NotRequired[bool]  # Set when the answer is an error message rather than research
+    merged_into: NotRequired[str]  # The question whose answer was reused, if this one was a near-duplicate
 
+RESEARCH_SYSTEM_MESSAGE = "You are a helpful research assistant. Provide detailed, factual answers with historical accuracy."
+
+
+def _research_question(chat_perplexity, question: str, cache: Optional[ResearchCache] = None) -> ResearchResult:
+    """
+    Ask Perplexity a single research question, answering from the cache when possible.
+
+    Args:
+        chat_perplexity: The Perplexity chat client
+        question: The question to research
+        cache: Research answer cache, or None to always call Perplexity
+
+    Returns:
+        Research result entry, with the error message as the answer if the call failed
+    """
+    if cache is not None:
+        cached = cache.get(question, PPLX_MODEL_NAME, RESEARCH_SYSTEM_MESSAGE)
+        if cached is not None:
+            print(f"\n♻️ Cached answer for: {question}")
+            return cached
+
+    message = [
+        SystemMessage(content=RESEARCH_SYSTEM_MESSAGE),
+        HumanMessage(content=question)
+    ]
+
+    try:
+        response = chat_perplexity.invoke(message)
+        record_llm_usage(response, "historical_research")
+        print(f"\n🔍 Question: {question}")
+        print(f"💬 Answer: {response.content[:100]}...")
+
+        research_result = {
+            "question": question,
+            "answer": response.content,
+            "citations": response.additional_kwargs.get('citations', []) if hasattr(response, 'additional_kwargs') else []
+        }
+
+        # Only successful answers are cached
+        if cache is not None:
+            cache.set(question, PPLX_MODEL_NAME, RESEARCH_SYSTEM_MESSAGE,
+                      research_result["answer"], research_result["citations"])
+
+        return research_result
+    except Exception as e:
+        print(f"🚨 Error researching the question: {question}: {str(e)}")
+
+        return {
+            "question": question,
+            "answer": str(e),
+            "citations": [],
+            "error": True
+        }
+
+
+def _research_concurrently(chat_perplexity, questions: List[str],
+                           cache: Optional[ResearchCache] = None) -> List[ResearchResult]:
+    """
+    Research questions concurrently, each within its own RESEARCH_QUESTION_TIMEOUT.
+
+    At most RESEARCH_MAX_CONCURRENCY calls run at a time, and a question's
+    deadline counts from when its call starts, so questions queued behind a
+    slow one keep their full timeout. A call past its deadline, client retries
+    included, is given up on: its thread finishes in the background and its
+    slot goes to the next question.
+
+    Args:
+        chat_perplexity: The Perplexity chat client
+        questions: The questions to research
+        cache: Research answer cache, or None to always call Perplexity
+
+    Returns:
+        One research result per question, in question order
+    """
+    results: List[Optional[ResearchResult]] = [None] * len(questions)
+    max_running = max(1, RESEARCH_MAX_CONCURRENCY)
+    # A thread per question, as abandoned calls may still hold theirs
+    executor = ThreadPoolExecutor(max_workers=len(questions), thread_name_prefix="research")
+    queued = deque(range(len(questions)))
+    running: Dict[Future, Tuple[int, float]] = {}
+    try:
+        while queued or running:
+            while queued and len(running) < max_running:
+                index = queued.popleft()
+                # Copy the context per task so usage records and callbacks follow the calls into the workers
+                future = executor.submit(contextvars.copy_context().run, _research_question, chat_perplexity,
+                                         questions[index], cache)
+                running[future] = (index, time.monotonic() + RESEARCH_QUESTION_TIMEOUT)
+
+            next_deadline = min(deadline for _, deadline in running.values())
+            done, _ = wait(running, timeout=max(0.0, next_deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            for future in done:
+                index, _ = running.pop(future)
+                results[index] = future.result()
+
+            now = time.monotonic()
+            for future, (index, deadline) in list(running.items()):
+                if deadline <= now:
+                    del running[future]
+                    print(f"🚨 Timed out researching the question: {questions[index]}")
+                    results[index] = {
+                        "question": questions[index],
+                        "answer": f"Timed out after {RESEARCH_QUESTION_TIMEOUT:g} seconds",
+                        "citations": [],
+                        "error": True
+                    }
+    finally:
+        # Do not block the graph on calls that already timed out
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
+
+
+@tracks_llm_usage
 def perplexity_search(state):
     """
-    Seach in perplexity to obtain more information
+    Seach in perplexity to obtain more information.
+
+    The questions are dispatched concurrently with a bounded number of calls in
+    flight and a timeout per question (see _research_concurrently), so the
+    phase takes roughly as long as the slowest single answer. Results are kept
+    in question order. Near-duplicate questions are researched once and share
+    the answer. Answers are served from the research cache unless the state
+    sets "bypass_research_cache".
 
     Args:
         State: Current state containing the questions for the research
@@ -24,65 +154,48 @@ def perplexity_search(state):
     Return:
         Update state with research results
     """
-
-
     current_iteration = state.get('iteration', 0)
     print(f"\n🔍 PERPLEXITY SEARCH PHASE - Iteration {current_iteration}")
 
-    chat_perplexity = ChatPerplexity(
-        api_key = PPLX_API_KEY,
-        model = PPLX_MODEL_NAME,
-        temperature = 0.1
+    chat_perplexity = get_chat_model(
+        "perplexity",
+        PPLX_MODEL_NAME,
+        temperature=0.1,
+        request_timeout=RESEARCH_QUESTION_TIMEOUT
     )
 
     questions = state.get("questions", [])
     research_history = state.get("research_history", {})
-    current_search = []
-
-    for question in questions:
-        message = [
-            SystemMessage(content="You are a helpful research assistant. Provide detailed, factual answers with historical accuracy."),
-            HumanMessage(content=question)
-        ]
-
-        try:
-            response = chat_perplexity.invoke(message)
-            print(f"\n🔍 Question: {question}")
-            print(f"💬 Answer: {response.content[:100]}...")
-
-            # Create research result entry
-            research_result = {
-                "question": question,
-                "answer": response.content,
-                "citations": response.additional_kwargs.get('citations', []) if hasattr(response, 'additional_kwargs') else []
-            }
-
-            # Add to current search
-            current_search.append(research_result)
-        except Exception as e:
-            print(f"🚨 Error researching the question: {question}: {str(e)}")
-
-            # add error entry
-            research_result = {
-                "question": question,
-                "answer": str(e),
-                "citations": []
-            }
-
-            # Add to current search
-            current_search.append(research_result)
-
-       # Update research history with current findings
-        updated_research_history = {
-            **research_history,
-            current_iteration: current_research
-        }
-        
-        return {
-            **state,  # Preserve existing state
-            "research_results": current_research,  # Current iteration results
-            "research_history": updated_research_history  # Historical record
-        }
+    current_research: List[ResearchResult] = []
+
+    # Skip the cache for this request when asked to, e.g. to refresh stale answers
+    cache = None if state.get("bypass_research_cache") else get_research_cache()
+
+    # Research each near-duplicate group once and share its answer
+    unique_questions, assignments = collapse_near_duplicates(questions, QUESTION_DEDUP_THRESHOLD)
+    unique_research = _research_concurrently(chat_perplexity, unique_questions, cache) if unique_questions else []
+
+    # Expand back to one entry per original question, in question order
+    for question, unique_index in zip(questions, assignments):
+        research_result = {**unique_research[unique_index], "question": question}
+        if question != unique_questions[unique_index]:
+            research_result["merged_into"] = unique_questions[unique_index]
+        current_research.append(research_result)
+
+    if cache is not None:
+        print(f"♻️ Research cache: {cache.stats()}")
+
+    # Update research history with current findings
+    updated_research_history = {
+        **research_history,
+        current_iteration: current_research
+    }
+
+    return {
+        **state,  # Preserve existing state
+        "research_results": current_research,  # Current iteration results
+        "research_history": updated_research_history  # Historical record
+    }
 
 
 def generate_research_questions(state: Dict[str, Any]) -> Dict[str, Any]:
@@ -0,0 +1,14 @@
+import functools
+import json
+from pathlib import Path
+from typing import Any, Dict
+
+# Sample stories shipped with the repo, used as style examples and fallbacks
+SAMPLE_STORIES_PATH = Path(__file__).resolve().parent.parent / "SAMPLE_STORIES.json"
+
+
+@functools.lru_cache(maxsize=1)
+def get_sample_stories() -> Dict[str, Any]:
+    """Load the sample stories on first use, wherever the app is started from."""
+    with open(SAMPLE_STORIES_PATH, "r") as f:
+        return json.load(f)
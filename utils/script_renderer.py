@@ -0,0 +1,160 @@
+import hashlib
+import math
+import random
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+# Import from config
+from config import SCRIPT_CACHE_MAX_ENTRIES, SCRIPT_EMPHASIS_RATE, SCRIPT_PAUSE_MS
+from utils.chapter_index import find_chapter_spans, spans_match
+
+# Output formats
+SCRIPT, SSML = "script", "ssml"
+
+# Paragraphs are separated by a blank line, as in the generated stories
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_ENDS = (".", "!", "?")
+_NEEDS_ESCAPE = re.compile(r"[&<>]")
+
+# (story digest, format, seed, given chapter titles and times) -> rendered text
+_rendered: "OrderedDict[Tuple[str, str, Optional[int], Tuple], str]" = OrderedDict()
+_rendered_lock = threading.Lock()
+
+
+def story_digest(story: str) -> str:
+    """Hash identifying a story's text, used for the render cache and the default emphasis seed."""
+    return hashlib.blake2b(story.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def render_script(story: str, output_format: str = SCRIPT, seed: Optional[int] = None,
+                  spans: Optional[List[Dict[str, Any]]] = None) -> str:
+    """
+    Render a story as a narration script.
+
+    The script numbers each paragraph as a section, marks a breathing pause
+    after every sentence and emphasizes a few longer words. Chapter headings
+    are replaced by a marker with the chapter's timestamp (see utils.chapter_index). Emphasis is
+    seeded, by default from the story itself, so the same story always
+    renders the same way. Results are memoized by story hash.
+
+    Args:
+        story: The story text
+        output_format: "script" for the voiceover script, "ssml" for SSML to feed a TTS engine
+        seed: Seed for the emphasized words; defaults to one derived from the story
+        spans: The story's chapter spans (state["chapter_spans"]); found from its headings
+            when not given or when they do not belong to this text (e.g. after an edit)
+
+    Returns:
+        The rendered script
+    """
+    if not story:
+        return ""
+    if output_format not in (SCRIPT, SSML):
+        raise ValueError(f"Unknown script format: {output_format}")
+
+    if not spans_match(story, spans):
+        spans = None
+    digest = story_digest(story)
+    # Given span titles may come from the outline rather than the headings, so they are part of the key
+    key = (digest, output_format, seed, spans and tuple((span["title"], span["time"]) for span in spans))
+    with _rendered_lock:
+        if key in _rendered:
+            _rendered.move_to_end(key)
+            return _rendered[key]
+
+    rng = random.Random(int(digest[:16], 16) if seed is None else seed)
+    render = _render_script if output_format == SCRIPT else _render_ssml
+    rendered = render(_segments(story, spans if spans is not None else find_chapter_spans(story)), rng)
+
+    with _rendered_lock:
+        _rendered[key] = rendered
+        while len(_rendered) > SCRIPT_CACHE_MAX_ENTRIES:
+            _rendered.popitem(last=False)
+    return rendered
+
+
+def _segments(story: str, spans: List[Dict[str, Any]]) -> List[Tuple[Optional[Dict[str, Any]], List[str]]]:
+    """
+    Split a story into (chapter span, paragraphs) segments by slicing at its chapter spans.
+
+    Text before the first chapter, or the whole story when it has no chapter
+    headings, forms a segment without a span.
+    """
+    pieces = [(None, story[:spans[0]["start"]] if spans else story)]
+    pieces += [(span, story[span["body_start"]:span["end"]]) for span in spans]
+    return [(span, _PARAGRAPH_BREAK.split(text.strip())) for span, text in pieces if text.strip()]
+
+
+def _add_pauses(paragraph: str, marker: str) -> str:
+    """Insert a pause marker after every sentence followed by more text."""
+    for end in _SENTENCE_ENDS:
+        paragraph = paragraph.replace(f"{end} ", f"{end} {marker} ")
+    return paragraph
+
+
+def _emphasized(words: List[str], rng: random.Random) -> Iterator[int]:
+    """
+    Indices of the words to emphasize: each word longer than 4 letters with probability SCRIPT_EMPHASIS_RATE.
+
+    Rather than drawing once per word, the gap to the next drawn word is
+    sampled from the matching geometric distribution, so only about one word
+    in 1 / SCRIPT_EMPHASIS_RATE costs any Python work.
+    """
+    if SCRIPT_EMPHASIS_RATE <= 0:
+        return
+    if SCRIPT_EMPHASIS_RATE >= 1:
+        yield from (index for index, word in enumerate(words) if len(word) > 4)
+        return
+    log_miss = math.log(1.0 - SCRIPT_EMPHASIS_RATE)
+    index = int(math.log(1.0 - rng.random()) / log_miss)
+    while index < len(words):
+        if len(words[index]) > 4:
+            yield index
+        index += 1 + int(math.log(1.0 - rng.random()) / log_miss)
+
+
+def _render_script(segments, rng: random.Random) -> str:
+    """Voiceover script: [CHAPTER n] markers, [SECTION n] headers, // pauses and *emphasis*."""
+    parts = []
+    number = 0
+    for span, paragraphs in segments:
+        if span:
+            parts.append(f"[CHAPTER {span['chapter']}: {span['title']} | {span['time']}]\n\n")
+        for paragraph in paragraphs:
+            number += 1
+            words = _add_pauses(paragraph, "//").split()
+            for index in _emphasized(words, rng):
+                words[index] = f"*{words[index]}*"
+            parts += [f"[SECTION {number}]\n", " ".join(words), "\n\n"]
+    parts.append("[END NARRATION]")
+    return "".join(parts)
+
+
+def _render_ssml(segments, rng: random.Random) -> str:
+    """SSML: a <mark> per chapter, one <p> per paragraph, <break> after sentences and <emphasis>."""
+    pause = f'<break time="{SCRIPT_PAUSE_MS}ms"/>'
+    parts = ["<speak>\n"]
+    for span, paragraphs in segments:
+        if span:
+            parts.append(f'<mark name="chapter-{span["chapter"]}"/>\n')
+        parts += _ssml_paragraphs(paragraphs, rng, pause)
+    parts.append("</speak>")
+    return "".join(parts)
+
+
+def _ssml_paragraphs(paragraphs: List[str], rng: random.Random, pause: str) -> List[str]:
+    """SSML <p> elements for a chapter's paragraphs."""
+    parts = []
+    for paragraph in paragraphs:
+        # A short placeholder keeps the word positions, and so the emphasis, identical to the script
+        words = _add_pauses(paragraph, "\x00").split()
+        emphasized = list(_emphasized(words, rng))
+        if _NEEDS_ESCAPE.search(paragraph):
+            words = [escape(word) for word in words]
+        for index in emphasized:
+            words[index] = f'<emphasis level="moderate">{words[index]}</emphasis>'
+        parts += ["<p>", " ".join(words).replace("\x00", pause), "</p>\n"]
+    return parts
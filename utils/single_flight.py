@@ -0,0 +1,131 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Import from config
+from config import STORY_CACHE_MAX_ENTRIES, STORY_CACHE_TTL_SECONDS
+from utils.job_queue import Job, JobQueue
+from utils.metrics import STORY_REQUESTS
+
+# Where a request's result comes from
+CACHED, JOINED, NEW = "cache", "joined", "new"
+
+
+def request_key(*parts: Any) -> str:
+    """
+    Key identifying a request, e.g. its (prompt, story_type, length, style).
+
+    Whitespace in strings is normalized so re-typed prompts still match.
+    """
+    normalized = [" ".join(part.split()) if isinstance(part, str) else part for part in parts]
+    return hashlib.sha256(json.dumps(normalized, default=str).encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Coalesce identical requests in front of a JobQueue and memoize their results.
+
+    Identical requests submitted while one is queued or running share that
+    job. Successful results are kept in a bounded LRU cache with a TTL, so a
+    repeat request is answered without running anything; regenerate bypasses
+    both and replaces the cached result.
+    """
+
+    def __init__(self, jobs: JobQueue, ttl_seconds: float = STORY_CACHE_TTL_SECONDS,
+                 max_entries: int = STORY_CACHE_MAX_ENTRIES):
+        """
+        Initialize the layer.
+
+        Args:
+            jobs: Queue the work is submitted to
+            ttl_seconds: Seconds a result stays cached
+            max_entries: Maximum cached results, least recently used evicted first
+        """
+        self.jobs = jobs
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._in_flight: Dict[str, Job] = {}
+        # key -> (result, stored_at)
+        self._results: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, key: str) -> Optional[Any]:
+        """Cached result for a key, or None if missing or expired. Called with the lock held."""
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+        result, stored_at = entry
+        if time.time() - stored_at > self.ttl_seconds:
+            del self._results[key]
+            return None
+        self._results.move_to_end(key)
+        return result
+
+    def _store(self, key: str, result: Any) -> None:
+        """Cache a result, evicting the least recently used ones. Called with the lock held."""
+        self._results[key] = (result, time.time())
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    def submit(self, key: str, fn: Callable, *args: Any, regenerate: bool = False) -> Tuple[Job, str]:
+        """
+        Return a job for the request, reusing a cached result or an identical job in flight.
+
+        Args:
+            key: Request key from request_key()
+            fn: Job function, called as fn(job, *args) like JobQueue.submit
+            *args: Further arguments for fn
+            regenerate: Skip the cache and in-flight jobs and run the request again
+
+        Returns:
+            Tuple of (job, source) where source is "cache", "joined" or "new"
+
+        Raises:
+            QueueFullError: When the queue refuses a new job
+        """
+        with self._lock:
+            if not regenerate:
+                result = self._cached(key)
+                if result is not None:
+                    STORY_REQUESTS.inc(CACHED)
+                    return Job.completed(f"cached-{key[:8]}", result), CACHED
+
+                job = self._in_flight.get(key)
+                if job is not None and not job.done:
+                    STORY_REQUESTS.inc(JOINED)
+                    return job, JOINED
+
+            # Submitted under the lock so a concurrent identical request finds it in flight
+            job = self.jobs.submit(self._run, key, fn, args)
+            self._in_flight[key] = job
+        STORY_REQUESTS.inc(NEW)
+        return job, NEW
+
+    def _run(self, job: Job, key: str, fn: Callable, args: tuple) -> Any:
+        """Run the request and cache its result before releasing the in-flight slot."""
+        try:
+            result = fn(job, *args)
+            with self._lock:
+                self._store(key, result)
+            return result
+        finally:
+            with self._lock:
+                if self._in_flight.get(key) is job:
+                    del self._in_flight[key]
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Drop one cached result, or all of them when key is None."""
+        with self._lock:
+            if key is None:
+                self._results.clear()
+            else:
+                self._results.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        """Number of cached results and requests in flight."""
+        with self._lock:
+            return {"cached": len(self._results), "in_flight": len(self._in_flight)}
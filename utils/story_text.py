@@ -0,0 +1,57 @@
+import re
+from typing import Dict, List, Tuple
+
+# Chapter headings as written by StoryBuilder, e.g. "## Chapter 2: The Siege"
+CHAPTER_HEADING = re.compile(r"^(#{1,6}\s*Chapter\b[^\n]*)$", re.MULTILINE | re.IGNORECASE)
+
+
+def chapter_heading(index: int, chapter: Dict) -> str:
+    """
+    Format the heading for a chapter of the outline.
+
+    Args:
+        index: Position of the chapter in the outline
+        chapter: Chapter dictionary with a "title"
+
+    Returns:
+        Heading such as "## Chapter 2: The Siege"
+    """
+    return f"## Chapter {index + 1}: {chapter['title']}"
+
+
+def join_chapters(chapters: List[Dict], chapter_texts: List[str]) -> str:
+    """
+    Assemble the story text from the outline and the prose of each chapter.
+
+    Args:
+        chapters: The chapter outline
+        chapter_texts: Prose of each chapter, in outline order, without headings
+
+    Returns:
+        The complete story text
+    """
+    return "\n\n".join(
+        f"{chapter_heading(i, chapter)}\n\n{text}"
+        for i, (chapter, text) in enumerate(zip(chapters, chapter_texts))
+    )
+
+
+def split_chapters(story: str) -> List[Tuple[str, str]]:
+    """
+    Split a story on its chapter headings.
+
+    Args:
+        story: The story text
+
+    Returns:
+        List of (heading, body) pairs in story order. Text before the first
+        heading is returned with an empty heading. Empty if the story has no headings.
+    """
+    parts = CHAPTER_HEADING.split(story)
+    if len(parts) < 3:
+        return []
+
+    # re.split with a capturing group gives [preamble, heading, body, heading, body, ...]
+    sections = [("", parts[0].strip())] if parts[0].strip() else []
+    sections.extend((parts[i].strip(), parts[i + 1].strip()) for i in range(1, len(parts), 2))
+    return sections
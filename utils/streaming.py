@@ -0,0 +1,51 @@
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage
+
+# Import from config
+from config import STREAM_TOKENS
+
+
+def get_token_writer() -> Optional[Callable[[Dict[str, Any]], None]]:
+    """
+    Return the LangGraph custom stream writer for the running node.
+
+    Returns:
+        The writer, or None when called outside a graph run (e.g. from a notebook)
+    """
+    try:
+        from langgraph.config import get_stream_writer
+        return get_stream_writer()
+    except (ImportError, RuntimeError):
+        return None
+
+
+def stream_llm_response(llm, messages: List[BaseMessage], node: str, writer=None) -> BaseMessage:
+    """
+    Call the LLM and forward every token to the graph's "custom" stream as it arrives.
+
+    Each token is written as {"node": node, "token": text}, preceded by a
+    {"node": node, "event": "start"} marker so consumers know to reset their buffer.
+
+    Args:
+        llm: The chat model to call
+        messages: The prompt messages
+        node: Name of the graph node producing the tokens
+        writer: Stream writer to use, defaults to the running node's writer
+
+    Returns:
+        The complete response message, as invoke() would return it
+    """
+    writer = writer or get_token_writer()
+    if not STREAM_TOKENS or writer is None:
+        return llm.invoke(messages)
+
+    writer({"node": node, "event": "start"})
+    response = None
+    for chunk in llm.stream(messages):
+        response = chunk if response is None else response + chunk
+        if chunk.content:
+            writer({"node": node, "token": chunk.content})
+    writer({"node": node, "event": "end"})
+
+    return response if response is not None else AIMessage(content="")
@@ -0,0 +1,276 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple, Type, TypeVar
+
+from langchain_core.messages import HumanMessage
+from pydantic import BaseModel, ValidationError, field_validator
+
+# Import from config
+from config import STRUCTURED_OUTPUT_JSON_MODE, STRUCTURED_OUTPUT_RETRIES
+from utils.llm_usage import record_llm_usage
+from utils.metrics import STRUCTURED_OUTPUT_FAILURES, STRUCTURED_OUTPUT_REPAIRED
+
+Schema = TypeVar("Schema", bound=BaseModel)
+
+_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+_WORD = re.compile(r"\w+")
+_OPENERS = re.compile(r"[{\[]")
+# Python literals models sometimes write instead of JSON ones
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+# Truncated output is cut back to an earlier comma at most this many times
+_MAX_CUTS = 20
+# Brackets in the prose before the JSON are skipped at most this many times
+_MAX_STARTS = 20
+
+
+class StructuredOutputError(ValueError):
+    """Raised when an LLM response cannot be parsed into its schema."""
+
+
+# ===== SCHEMAS =====
+
+class ChapterVerdict(BaseModel):
+    """The critic's verdict on one chapter."""
+    chapter: int
+    approved: bool = True
+    feedback: str = ""
+
+
+class Evaluation(BaseModel):
+    """The critic's evaluation of a draft (or of the revised chapters)."""
+    scores: Dict[str, float]
+    strengths: List[str] = []
+    weaknesses: List[str] = []
+    feedback: str = ""
+    approved: bool = False
+    chapters: List[ChapterVerdict] = []
+
+
+class OutlineChapter(BaseModel):
+    """One chapter of the story outline."""
+    title: str
+    description: str = ""
+    characters: List[str] = []
+
+    @field_validator("characters", mode="before")
+    @classmethod
+    def _character_lines(cls, value: Any) -> Any:
+        """Accept {"name": ..., "description": ...} objects as "Name - description" lines."""
+        if isinstance(value, list):
+            return [
+                " - ".join(str(part) for part in (item.get("name"), item.get("description")) if part)
+                if isinstance(item, dict) else item
+                for item in value
+            ]
+        return value
+
+
+class ChapterOutline(BaseModel):
+    """The chapter outline of a story."""
+    chapters: List[OutlineChapter]
+
+
+# ===== PARSING =====
+
+def repair_json(text: str) -> Any:
+    """
+    Parse the first JSON object or array in a model response, repairing common defects.
+
+    Handles code fences and prose around the JSON (brackets in the prose
+    included), trailing commas, raw newlines inside strings, Python literals
+    (True, False, None) and output truncated mid-way, which is closed off at
+    the last complete element.
+
+    Args:
+        text: The raw response text
+
+    Returns:
+        The parsed value
+
+    Raises:
+        ValueError: When no JSON value can be recovered
+    """
+    fenced = _FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    starts = [match.start() for match in _OPENERS.finditer(text)][:_MAX_STARTS]
+    if not starts:
+        raise ValueError("No JSON object or array in the response")
+
+    # Prose before the JSON may contain brackets of its own ("see [1]: {...}"), so try the next opener on failure
+    for start in starts:
+        try:
+            return _repair_from(text, start)
+        except ValueError:
+            continue
+    raise ValueError("Could not repair the JSON in the response")
+
+
+def _repair_from(text: str, index: int) -> Any:
+    """
+    Parse and repair the JSON value starting at text[index] (see repair_json).
+
+    Raises:
+        ValueError: When no JSON value can be recovered from this position
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    # (length of out, closers needed) at every comma, to cut truncated output back to
+    cuts: List[Tuple[int, str]] = []
+    in_string = escaped = False
+    while index < len(text):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            elif char == "\n":
+                char = "\\n"
+            out.append(char)
+            index += 1
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            _drop_trailing_comma(out)
+            if not stack:
+                break
+            out.append(stack.pop())
+            index += 1
+            if not stack:
+                return json.loads("".join(out))
+            continue
+        elif char == ",":
+            cuts.append((len(out), "".join(reversed(stack))))
+        elif char.isalpha():
+            word = _WORD.match(text, index).group()
+            out.append(_LITERALS.get(word, word))
+            index += len(word)
+            continue
+        out.append(char)
+        index += 1
+
+    # Truncated: close the open string and containers, cutting back to earlier commas if needed
+    attempts = [("".join(out) + ('"' if in_string else ""), "".join(reversed(stack)))]
+    attempts += [("".join(out[:length]), closers) for length, closers in reversed(cuts[-_MAX_CUTS:])]
+    for body, closers in attempts:
+        body = body.rstrip()
+        if body.endswith(","):
+            body = body[:-1]
+        try:
+            return json.loads(body + closers)
+        except json.JSONDecodeError:
+            continue
+    raise ValueError("Could not repair the JSON in the response")
+
+
+def _drop_trailing_comma(out: List[str]) -> None:
+    """Remove a comma (and the whitespace after it) right before a closing bracket."""
+    end = len(out)
+    while end and out[end - 1].isspace():
+        end -= 1
+    if end and out[end - 1] == ",":
+        del out[end - 1:]
+
+
+def parse_structured(content: str, schema: Type[Schema], node: str, list_field: Optional[str] = None) -> Schema:
+    """
+    Parse and validate a model response against a schema.
+
+    Args:
+        content: The raw response text
+        schema: Pydantic model the response must match
+        node: Graph node the response belongs to, for the metrics
+        list_field: Field to put a bare JSON array in, for prompts that used to ask for one
+
+    Returns:
+        The validated schema instance
+
+    Raises:
+        StructuredOutputError: When the response cannot be parsed or does not match the schema
+    """
+    try:
+        data = json.loads(content)
+    except json.JSONDecodeError:
+        try:
+            data = repair_json(content)
+        except ValueError as e:
+            raise StructuredOutputError(str(e)) from e
+        STRUCTURED_OUTPUT_REPAIRED.inc(node)
+
+    if list_field and isinstance(data, list):
+        data = {list_field: data}
+    try:
+        return schema.model_validate(data)
+    except ValidationError as e:
+        raise StructuredOutputError(f"Response does not match {schema.__name__}: {e}") from e
+
+
+def json_mode(llm, model_name: str):
+    """
+    Ask the model for a JSON object natively (OpenAI JSON mode), when it supports it.
+
+    Args:
+        llm: The chat model
+        model_name: Its model name; o1 models do not accept response_format
+
+    Returns:
+        The model bound to JSON mode, or the model itself
+    """
+    if not STRUCTURED_OUTPUT_JSON_MODE or model_name.startswith("o1"):
+        return llm
+    return llm.bind(response_format={"type": "json_object"})
+
+
+def invoke_structured(llm, messages: List, schema: Type[Schema], node: str,
+                      list_field: Optional[str] = None) -> Schema:
+    """
+    Call the model and parse its response into a schema.
+
+    A response that cannot be parsed is sent back once with the schema and
+    the error, a small call instead of another full draft and critique round.
+
+    Args:
+        llm: The chat model, ideally bound with json_mode()
+        messages: The prompt messages
+        schema: Pydantic model the response must match
+        node: Graph node making the call, for usage and metrics
+        list_field: See parse_structured
+
+    Returns:
+        The validated schema instance
+
+    Raises:
+        StructuredOutputError: When the response and its re-asks all fail to parse
+    """
+    response = llm.invoke(messages)
+    record_llm_usage(response, node)
+    content = response.content
+
+    for attempt in range(STRUCTURED_OUTPUT_RETRIES + 1):
+        try:
+            return parse_structured(content, schema, node, list_field)
+        except StructuredOutputError as e:
+            STRUCTURED_OUTPUT_FAILURES.inc(node)
+            print(f"⚠️ {node}: unparseable {schema.__name__} response ({e})")
+            if attempt == STRUCTURED_OUTPUT_RETRIES:
+                raise
+            fix = llm.invoke([HumanMessage(content=f"""Rewrite the response below as a single valid JSON object
+matching this JSON schema. Keep its content; return only the JSON.
+
+SCHEMA:
+{json.dumps(schema.model_json_schema())}
+
+ERROR: {e}
+
+RESPONSE:
+{content}
+""")])
+            record_llm_usage(fix, node)
+            content = fix.content
@@ -0,0 +1,265 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+# Import from config
+from config import DIAGRAM_CACHE_DIR
+
+# Layout of the built-in renderer, in pixels
+NODE_HEIGHT = 36
+NODE_PADDING = 16
+LAYER_GAP = 56
+NODE_GAP = 28
+MARGIN = 40
+
+NODE_FILL = (242, 240, 255)
+TERMINAL_FILL = (255, 255, 255)
+NODE_OUTLINE = (120, 110, 200)
+EDGE_COLOR = (60, 60, 60)
+CONDITIONAL_EDGE_COLOR = (130, 130, 130)
+LOOP_EDGE_COLOR = (200, 110, 60)
+
+_render_lock = threading.Lock()
+
+
+def graph_fingerprint(graph) -> str:
+    """
+    Hash of a drawable graph's structure: its nodes and (conditional, labelled) edges.
+
+    Args:
+        graph: Graph returned by a compiled workflow's get_graph()
+
+    Returns:
+        Hex digest that changes only when the structure does
+    """
+    structure = {
+        "nodes": sorted(graph.nodes),
+        "edges": sorted([edge.source, edge.target, str(edge.data or ""), bool(edge.conditional)]
+                        for edge in graph.edges)
+    }
+    return hashlib.sha256(json.dumps(structure).encode("utf-8")).hexdigest()
+
+
+def render_workflow_diagram(workflow, cache_dir: str = DIAGRAM_CACHE_DIR) -> Optional[str]:
+    """
+    Render a workflow diagram to PNG locally, reusing the cached file for an unchanged graph.
+
+    The Mermaid source is written next to the image. Graphviz is used when
+    pygraphviz is installed, otherwise a simple layered layout drawn with Pillow;
+    nothing is sent over the network.
+
+    Args:
+        workflow: The compiled workflow
+        cache_dir: Directory holding the rendered diagrams
+
+    Returns:
+        Path of the PNG, or None if no local renderer is available
+    """
+    graph = workflow.get_graph()
+    digest = graph_fingerprint(graph)[:16]
+    png_path = os.path.join(cache_dir, f"workflow-{digest}.png")
+    if os.path.exists(png_path):
+        return png_path
+
+    with _render_lock:
+        if os.path.exists(png_path):
+            return png_path
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(os.path.join(cache_dir, f"workflow-{digest}.mmd"), "w") as f:
+            f.write(graph.draw_mermaid())
+
+        png = _render_graphviz(graph) or _render_pillow(graph)
+        if png is None:
+            print("⚠️ No local diagram renderer: install pygraphviz or Pillow (Mermaid source saved)")
+            return None
+
+        # Written aside and renamed, so a concurrent reader never sees a partial file
+        tmp_path = f"{png_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(png)
+        os.replace(tmp_path, png_path)
+
+    print(f"✓ Workflow diagram saved to {png_path}")
+    return png_path
+
+
+def _render_graphviz(graph) -> Optional[bytes]:
+    """PNG drawn by Graphviz, or None when pygraphviz is not installed."""
+    try:
+        # Optional: pip install pygraphviz (needs the graphviz system package)
+        import pygraphviz  # noqa: F401
+    except ImportError:
+        return None
+    return graph.draw_png()
+
+
+def _layers(graph) -> Tuple[List[List[str]], set]:
+    """
+    Assign every node to a layer by its longest path from the start node.
+
+    Returns:
+        Tuple of (node ids per layer, (source, target) pairs of edges that loop back)
+    """
+    successors: Dict[str, List[str]] = {node: [] for node in graph.nodes}
+    for edge in graph.edges:
+        successors[edge.source].append(edge.target)
+
+    # Edges closing a cycle (found depth-first from the start node) are drawn as loops
+    back_edges, visiting, visited = set(), set(), set()
+
+    def visit(node):
+        visiting.add(node)
+        for target in successors[node]:
+            if target in visiting:
+                back_edges.add((node, target))
+            elif target not in visited:
+                visit(target)
+        visiting.discard(node)
+        visited.add(node)
+
+    start = graph.first_node().id if graph.first_node() else next(iter(graph.nodes))
+    visit(start)
+    for node in graph.nodes:
+        if node not in visited:
+            visit(node)
+
+    depth = {node: 0 for node in graph.nodes}
+    order = []
+    marked = set()
+
+    def topological(node):
+        marked.add(node)
+        for target in successors[node]:
+            if (node, target) not in back_edges and target not in marked:
+                topological(target)
+        order.append(node)
+
+    for node in [start, *graph.nodes]:
+        if node not in marked:
+            topological(node)
+    for node in reversed(order):
+        for target in successors[node]:
+            if (node, target) not in back_edges:
+                depth[target] = max(depth[target], depth[node] + 1)
+
+    layers: List[List[str]] = [[] for _ in range(max(depth.values()) + 1)]
+    for node in graph.nodes:
+        layers[depth[node]].append(node)
+    return layers, back_edges
+
+
+def _render_pillow(graph) -> Optional[bytes]:
+    """PNG of a top-down layered layout drawn with Pillow, or None when Pillow is not installed."""
+    try:
+        from PIL import Image, ImageDraw, ImageFont
+    except ImportError:
+        return None
+    import io
+
+    font = ImageFont.load_default()
+    measure = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+
+    def text_size(text):
+        left, top, right, bottom = measure.textbbox((0, 0), text, font=font)
+        return right - left, bottom - top
+
+    layers, back_edges = _layers(graph)
+    layer_of = {node: index for index, layer in enumerate(layers) for node in layer}
+    widths = {node: text_size(graph.nodes[node].name)[0] + 2 * NODE_PADDING for node in graph.nodes}
+
+    # Edges spanning several layers pass through a narrow placeholder in each layer between,
+    # so they are routed around the nodes instead of through them
+    routes = []
+    predecessors: Dict[str, List[str]] = {}
+    for index, edge in enumerate(graph.edges):
+        if (edge.source, edge.target) in back_edges:
+            continue
+        route = [edge.source]
+        for layer in range(layer_of[edge.source] + 1, layer_of[edge.target]):
+            waypoint = f"{index}:{layer}"
+            layers[layer].append(waypoint)
+            widths[waypoint] = 0
+            route.append(waypoint)
+        route.append(edge.target)
+        for previous, current in zip(route, route[1:]):
+            predecessors.setdefault(current, []).append(previous)
+        routes.append((edge, route))
+
+    # Order each layer by the mean position of its predecessors to limit crossings
+    for index in range(1, len(layers)):
+        position = {node: order for order, node in enumerate(layers[index - 1])}
+
+        def barycenter(node):
+            above = [position[p] for p in predecessors.get(node, []) if p in position]
+            return sum(above) / len(above) if above else float("inf")
+        layers[index].sort(key=barycenter)
+
+    layer_widths = [sum(widths[node] for node in layer) + NODE_GAP * (len(layer) - 1) for layer in layers]
+    content_width = max(layer_widths)
+    # Room on the right for loop edges
+    width = content_width + 2 * MARGIN + NODE_GAP * (len(back_edges) + 1)
+    height = len(layers) * NODE_HEIGHT + (len(layers) - 1) * LAYER_GAP + 2 * MARGIN
+
+    boxes: Dict[str, Tuple[int, int, int, int]] = {}
+    for index, layer in enumerate(layers):
+        x = MARGIN + (content_width - layer_widths[index]) // 2
+        y = MARGIN + index * (NODE_HEIGHT + LAYER_GAP)
+        for node in layer:
+            boxes[node] = (x, y, x + widths[node], y + NODE_HEIGHT)
+            x += widths[node] + NODE_GAP
+
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+
+    def center_x(node):
+        return (boxes[node][0] + boxes[node][2]) // 2
+
+    loop_x = MARGIN + content_width + NODE_GAP
+    for source, target in sorted(back_edges):
+        # Out of the source's right side, up the margin, into the target's right side
+        source_box, target_box = boxes[source], boxes[target]
+        start_y = (source_box[1] + source_box[3]) // 2
+        end_y = (target_box[1] + target_box[3]) // 2
+        draw.line([(source_box[2], start_y), (loop_x, start_y), (loop_x, end_y), (target_box[2] + 9, end_y)],
+                  fill=LOOP_EDGE_COLOR, width=2)
+        draw.polygon([(target_box[2], end_y), (target_box[2] + 9, end_y - 5), (target_box[2] + 9, end_y + 5)],
+                     fill=LOOP_EDGE_COLOR)
+        loop_x += NODE_GAP
+
+    for edge, route in routes:
+        color = CONDITIONAL_EDGE_COLOR if edge.conditional else EDGE_COLOR
+        points = [(center_x(route[0]), boxes[route[0]][3])]
+        for waypoint in route[1:-1]:
+            points += [(center_x(waypoint), boxes[waypoint][1]), (center_x(waypoint), boxes[waypoint][3])]
+        end = (center_x(route[-1]), boxes[route[-1]][1])
+        points.append(end)
+        draw.line(points, fill=color, width=2, joint="curve")
+        x, y = end
+        draw.polygon([(x, y), (x - 5, y - 9), (x + 5, y - 9)], fill=color)
+
+        if edge.data:
+            # Labelled on the last segment, near the target, where edges from one source have spread out
+            label = str(edge.data)
+            label_width, label_height = text_size(label)
+            (x0, y0), (x1, y1) = points[-2], points[-1]
+            middle = (x0 + (x1 - x0) * 2 // 3, y0 + (y1 - y0) * 2 // 3)
+            label_box = (middle[0] - label_width // 2 - 3, middle[1] - label_height // 2 - 2,
+                         middle[0] + label_width // 2 + 3, middle[1] + label_height // 2 + 2)
+            draw.rectangle(label_box, fill="white")
+            draw.text((label_box[0] + 3, label_box[1] + 1), label, fill=color, font=font)
+
+    for node in graph.nodes:
+        box = boxes[node]
+        terminal = node in ("__start__", "__end__")
+        draw.rounded_rectangle(box, radius=NODE_HEIGHT // 2 if terminal else 6,
+                               fill=TERMINAL_FILL if terminal else NODE_FILL, outline=NODE_OUTLINE, width=2)
+        name = graph.nodes[node].name
+        text_width, text_height = text_size(name)
+        draw.text(((box[0] + box[2] - text_width) // 2, (box[1] + box[3] - text_height) // 2 - 1),
+                  name, fill="black", font=font)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()